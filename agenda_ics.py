@@ -0,0 +1,122 @@
+"""
+Agenda de eventos em iCalendar (ICS), para assinatura em calendários de celular.
+
+Cada usuário gera um link secreto (/calendario/<token>.ics); o banco guarda só o SHA-256 do
+token (users.ics_token, migração 0014). O arquivo cobre uma janela móvel (ICS_DIAS_ANTES dias
+para trás, ICS_DIAS_DEPOIS para frente) e é gerado em fluxo: as linhas saem à medida que os
+eventos são lidos, em lotes de ICS_LOTE, sem montar o arquivo inteiro em memória.
+
+Os clientes de calendário consultam o link de tempos em tempos. A resposta leva ETag e
+Last-Modified tirados da versão 'eventos' (tabela versoes, incrementada a cada gravação de
+evento) e do dia da janela: enquanto nada mudar, a consulta responde 304 com uma leitura
+de uma linha.
+"""
+import hashlib
+import os
+import secrets
+from datetime import datetime, time, timedelta, timezone
+
+from disponibilidade import como_datetime
+
+ICS_DIAS_ANTES = int(os.getenv('ICS_DIAS_ANTES', 30))      # Dias passados incluídos no arquivo
+ICS_DIAS_DEPOIS = int(os.getenv('ICS_DIAS_DEPOIS', 365))   # Dias futuros incluídos no arquivo
+ICS_LOTE = int(os.getenv('ICS_LOTE', 200))                 # Eventos lidos por vez
+
+# Situação do evento no padrão iCalendar (RFC 5545, STATUS de VEVENT)
+_STATUS_ICS = {'Pendente': 'TENTATIVE', 'Confirmado': 'CONFIRMED', 'Em Montagem': 'CONFIRMED',
+               'Finalizado': 'CONFIRMED', 'Finalização Parcial': 'CONFIRMED'}
+
+
+def novo_token():
+    """(token, hash): o token vai no link do usuário; o hash, para users.ics_token."""
+    token = secrets.token_urlsafe(32)
+    return token, hash_do_token(token)
+
+
+def hash_do_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def janela(agora=None):
+    """(inicio, fim) da janela móvel do arquivo, alinhada ao início do dia."""
+    hoje = datetime.combine((agora or datetime.now()).date(), time.min)
+    return hoje - timedelta(days=ICS_DIAS_ANTES), hoje + timedelta(days=ICS_DIAS_DEPOIS + 1)
+
+
+def validadores(versao, alterado_em, agora=None):
+    """
+    (etag, last_modified) do arquivo. A janela anda um dia por dia, então o dia também
+    entra: o arquivo muda à meia-noite mesmo sem nenhum evento alterado. last_modified
+    sai em UTC (com fuso); as datas do banco e a meia-noite são hora local.
+    """
+    hoje = datetime.combine((agora or datetime.now()).date(), time.min)
+    etag = f"ics-{versao}-{hoje:%Y%m%d}-{ICS_DIAS_ANTES}-{ICS_DIAS_DEPOIS}"
+    return etag, max(como_datetime(alterado_em) or hoje, hoje).astimezone(timezone.utc)
+
+
+def _escapar(texto):
+    """Escapa um valor TEXT do iCalendar (barra, ponto e vírgula, vírgula e quebras de linha)."""
+    return (str(texto or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _linha(conteudo):
+    """Linha terminada em CRLF e dobrada em 75 octetos (sem partir caracteres UTF-8)."""
+    partes, atual, tamanho = [], '', 0
+    for caractere in conteudo:
+        octetos = len(caractere.encode('utf-8'))
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual, tamanho = ' ', 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes) + '\r\n'
+
+
+def _data(valor):
+    return como_datetime(valor).strftime('%Y%m%dT%H%M%S')  # Hora local, sem fuso (floating)
+
+
+def gerar_ics(cursor, inicio, fim, dominio, carimbo):
+    """
+    Gera o arquivo em pedaços de texto: cabeçalho, um VEVENT por evento que cruza
+    [inicio, fim) e o rodapé. `carimbo` (a última alteração da agenda) vai em DTSTAMP.
+    """
+    dtstamp = como_datetime(carimbo).astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')  # RFC 5545: UTC de fato
+    yield ''.join(_linha(l) for l in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:-//{dominio}//Agenda de eventos//PT-BR',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', 'X-WR-CALNAME:Eventos',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H', 'X-PUBLISHED-TTL:PT1H'))
+
+    cursor.execute("""
+        SELECT e.id, e.nome_evento, e.tipo_evento, e.data_evento, e.recolhimento_evento, e.status,
+               c.nome AS cliente_nome
+        FROM eventos e
+        JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.recolhimento_evento >= %s AND e.data_evento < %s
+        ORDER BY e.data_evento, e.id
+    """, (inicio, fim))
+    while True:
+        eventos = cursor.fetchmany(ICS_LOTE)
+        if not eventos:
+            break
+        pedaco = []
+        for evento in eventos:
+            fim_evento = evento['recolhimento_evento'] or evento['data_evento']
+            descricao = f"Cliente: {evento['cliente_nome']}\nStatus: {evento['status']}"
+            if evento['tipo_evento']:
+                descricao += f"\nTipo: {evento['tipo_evento']}"
+            for l in ('BEGIN:VEVENT',
+                      f"UID:evento-{evento['id']}@{dominio}",
+                      f'DTSTAMP:{dtstamp}',
+                      f"DTSTART:{_data(evento['data_evento'])}",
+                      f'DTEND:{_data(fim_evento)}',
+                      f"SUMMARY:{_escapar(evento['nome_evento'])} ({_escapar(evento['cliente_nome'])})",
+                      f'DESCRIPTION:{_escapar(descricao)}',
+                      f"STATUS:{_STATUS_ICS.get(evento['status'], 'CONFIRMED')}",
+                      'END:VEVENT'):
+                pedaco.append(_linha(l))
+        yield ''.join(pedaco)
+
+    yield _linha('END:VCALENDAR')
@@ -10,14 +10,37 @@ import bcrypt
 import mysql.connector
 import pandas as pd
 import requests
-from flask import (Flask, abort, flash, jsonify, make_response, redirect,
-                   render_template, request, session, url_for)
+from flask import (Flask, Response, abort, flash, jsonify, make_response, redirect,
+                   render_template, request, session, stream_with_context, url_for)
 from flask_cors import CORS
-from flask_mail import Mail, Message
+from flask_mail import Mail
 from mysql.connector import errors as mysql_errors
 from werkzeug.utils import secure_filename
 import collections
-from db import close_connection, create_initial_admin_user, get_db
+from agenda_ics import gerar_ics, hash_do_token, janela, novo_token, validadores
+from atividades import (ATIVIDADES_POR_PAGINA, CADASTRO_CLIENTE, CADASTRO_KIT, CADASTRO_PRODUTO, EVENTO_CRIADO, EXCLUSAO,
+                        MUDANCA_STATUS_EVENTO, ORCAMENTO_APROVADO, ORCAMENTO_CRIADO, PAGAMENTO, listar_atividades,
+                        registrar_atividade)
+from cache_catalogo import (ESTOQUE, EVENTOS, KITS, PRECOS, cache_stats, carregar, consultar, invalidar_catalogo,
+                            ultima_alteracao, versao_atual)
+from catalogo import (capacidade_kits, gravar_itens_orcamento, gravar_materiais_evento, itens_do_orcamento,
+                      listar_estoque, nome_do_item, primeiro_indisponivel, resolver_itens)
+from db import (close_connection, create_initial_admin_user, get_db, instrumentar_app,
+                pool_stats, verificar_schema)
+from disponibilidade import (STATUS_LIBERADOS, como_datetime, disponibilidade_carrinho, materiais_do_evento,
+                             periodo_do_evento, reservas_no_periodo)
+from emails import detalhes_orcamento, renderizar_email_orcamento
+from estatisticas import (TOTAL_CLIENTES, TOTAL_ITENS_ESTOQUE, ajustar_estatisticas, descartar_se_alterado,
+                          ler_estatisticas, recalcular_receita, registrar_lancamento)
+from imagens import agendar_variantes, miniatura, srcset
+from importacao import ErroImportacao, importar_estoque, ler_planilha
+from listagem_eventos import (EVENTOS_POR_PAGINA, contar_eventos, eventos_na_janela, janela_do_feed, janela_do_mes,
+                              listar_eventos)
+from movimentos import (COMPRA, EVENTO_EXCLUIDO, KIT_DESFEITO, PERDA, conciliar_estoque, movimentar_estoque,
+                        movimentos_do_material, saldo_em)
+from outbox import OutboxWorker, enfileirar_email, reenfileirar, resumo_outbox
+from reservas import EstoqueInsuficiente, reservar
+from uploads import VarredorUploads, liberar_upload, salvar_upload
 from dotenv import load_dotenv
 
 
@@ -41,6 +64,18 @@ CORS(app)
 app.secret_key = os.urandom(24)
 app.config["MAX_CONTENT_LENGTH"] = 6 * 1024 * 1024
 
+# Confere a versão do esquema (aplica migrações pendentes, se DB_AUTO_MIGRATE estiver ativo)
+verificar_schema()
+
+# Devolve a conexão ao pool ao fim de cada contexto. Registrado antes de qualquer uso de
+# get_db() (inclusive carregar_configuracoes_email abaixo) para não vazar conexões do pool.
+app.teardown_appcontext(close_connection)
+# Descarta o resumo do painel em memória depois do commit das requisições que o alteraram
+app.teardown_appcontext(lambda exception: descartar_se_alterado())
+
+# Cabeçalhos X-DB-Queries/X-DB-Time, aviso de consultas N+1 e painel de SQL opcional (DB_DEBUG_PANEL=1)
+instrumentar_app(app)
+
 # ==============================================================================
 # CARREGAR CONFIGURAÇÕES DE E-MAIL DO BANCO DE DADOS
 # ==============================================================================
@@ -77,17 +112,39 @@ def carregar_configuracoes_email():
 # Carregar as configurações de e-mail ao iniciar
 carregar_configuracoes_email()
 
-# Configuração do Flask-Mail
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 465  # Usando 465 para SSL
-app.config['MAIL_USE_SSL'] = True  # Usar SSL para segurança
+# Configuração do Flask-Mail (servidor/porta/SSL podem vir do .env, ex.: um SMTP local de testes)
+app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 465))  # Usando 465 para SSL
+app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', '1').lower() in ('1', 'true', 'yes', 'on')  # Usar SSL para segurança
 
 mail = Mail(app)  # Inicializa o Flask-Mail com as configurações carregadas
 
-# ==============================================================================
-# FINALIZANDO - ASSOCIAÇÃO DA FUNÇÃO DE FECHAMENTO DE CONEXÃO COM O CONTEXTO DA APLICAÇÃO
-# ==============================================================================
-app.teardown_appcontext(close_connection)  # Fechar a conexão com o banco de dados quando a aplicação terminar
+# Remetente dos e-mails de orçamento
+REMETENTE_EMAIL = "GESTÃO DE EVENTOS <gestao.eventos@example.com>"
+
+
+def configuracao_smtp():
+    """Configuração SMTP atual do app, no formato usado pelo worker da outbox."""
+    return {
+        'servidor': app.config['MAIL_SERVER'],
+        'porta': app.config['MAIL_PORT'],
+        'ssl': app.config['MAIL_USE_SSL'],
+        'usuario': app.config.get('MAIL_USERNAME'),
+        'senha': app.config.get('MAIL_PASSWORD'),
+    }
+
+
+# Worker da caixa de saída: envia em segundo plano os e-mails gravados em email_outbox.
+# Vários processos podem rodá-lo ao mesmo tempo (a reserva de cada e-mail é atômica);
+# OUTBOX_WORKER=0 desliga a thread neste processo (ex.: quando roda `python outbox.py` à parte).
+outbox_worker = OutboxWorker(configuracao_smtp)
+if os.getenv('OUTBOX_WORKER', '1').lower() in ('1', 'true', 'yes', 'on'):
+    outbox_worker.iniciar()
+
+# Varredura periódica dos uploads sem referência (UPLOADS_VARREDOR=0 desliga neste processo)
+varredor_uploads = VarredorUploads()
+if os.getenv('UPLOADS_VARREDOR', '1').lower() in ('1', 'true', 'yes', 'on'):
+    varredor_uploads.iniciar()
 
 
 
@@ -104,6 +161,22 @@ os.makedirs(PRODUTOS_DIR, exist_ok=True)
 os.makedirs(KITS_DIR, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+UPLOADS_CACHE_MAX_AGE = 365 * 24 * 3600  # Nomes únicos: o conteúdo de uma URL de upload nunca muda
+
+@app.context_processor
+def imagens_responsivas():
+    """srcset(foto_path) e miniatura(foto_path) nos templates (variantes WebP de imagens.py)."""
+    return {'srcset': lambda rel_path: srcset(rel_path, url_for),
+            'miniatura': lambda rel_path: miniatura(rel_path, url_for)}
+
+@app.after_request
+def cache_de_uploads(response):
+    if request.path.startswith("/static/uploads/") and response.status_code in (200, 304):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = UPLOADS_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
 
 # ========================
 # Funções Utilitárias
@@ -120,23 +193,30 @@ def save_image(file_storage, subdir: str) -> str | None:
     
     fname = secure_filename(file_storage.filename)
     ext = fname.rsplit(".", 1)[1].lower()
-    unique = f"{uuid4().hex}.{ext}"
-    
-    folder = KITS_DIR if subdir == "kits" else PRODUTOS_DIR
-    rel_path = f"uploads/{subdir}/{unique}"
-    
-    file_path = os.path.join(folder, unique)
-    file_storage.save(file_path)
+    ext = "jpg" if ext == "jpeg" else ext
+
+    # Nome = SHA-256 do conteúdo: a mesma foto é gravada uma vez só (ver uploads.py)
+    rel_path, novo = salvar_upload(file_storage, "kits" if subdir == "kits" else "produtos", ext)
+    if novo:
+        agendar_variantes(rel_path)  # Miniatura e versão média em WebP, em segundo plano
     return rel_path
 
 def remove_file_if_exists(rel_path: str):
+    """
+    Apaga o upload se nenhum produto/kit o usa mais. Chamar depois do commit/rollback.
+    Arquivos recém-enviados ficam (podem estar em outra transação); a varredura os recolhe.
+    """
     if not rel_path: return
-    full_path = os.path.join(STATIC_DIR, rel_path.replace("\\", "/"))
+    db = get_db()
+    if db is None:
+        return
+    cursor = db.cursor(dictionary=True)
     try:
-        if os.path.exists(full_path):
-            os.remove(full_path)
-    except Exception:
-        pass
+        liberar_upload(cursor, rel_path)
+    except Exception as e:
+        print(f"Erro ao liberar o arquivo {rel_path}: {e}")
+    finally:
+        cursor.close()
 
 # ========================
 # Rotas
@@ -155,29 +235,23 @@ def index():
         return render_template("dashboard.html")
 
     cursor = db.cursor(dictionary=True)
-    stats = {}
+    # Indicadores do resumo mantido pelas gravações (uma leitura pela chave, em cache por alguns
+    # segundos); eventos em cache pela versão da agenda, só os do mês corrente
+    stats = ler_estatisticas(cursor)
+    proximo_evento = carregar(cursor, [EVENTOS], ('proximo_evento', datetime.now().date()), lambda: _buscar_um(
+        cursor, "SELECT nome_evento, data_evento FROM eventos WHERE data_evento >= CURDATE() ORDER BY data_evento ASC LIMIT 1"))
+    eventos_recentes = consultar(cursor, [EVENTOS], "SELECT e.nome_evento, c.nome as cliente_nome FROM eventos e JOIN clientes c ON e.cliente_id = c.id ORDER BY e.id DESC LIMIT 5")
+    todos_eventos = consultar(cursor, [EVENTOS], "SELECT e.nome_evento, e.data_evento, c.nome as cliente_nome, e.status FROM eventos e JOIN clientes c ON e.cliente_id = c.id "
+                                                 "WHERE e.recolhimento_evento >= %s AND e.data_evento < %s ORDER BY e.data_evento", janela_do_mes())
     
-    cursor.execute("SELECT nome_evento, data_evento FROM eventos WHERE data_evento >= CURDATE() ORDER BY data_evento ASC LIMIT 1")
-    proximo_evento = cursor.fetchone()
-
-    cursor.execute("SELECT SUM(valor) as total FROM fluxo_caixa WHERE tipo = 'Receita' AND MONTH(data) = MONTH(CURDATE()) AND YEAR(data) = YEAR(CURDATE())")
-    receita_mes_result = cursor.fetchone()
-    stats['receita_mes'] = receita_mes_result['total'] if receita_mes_result else 0
-
-    cursor.execute("SELECT COUNT(id) as total FROM clientes")
-    stats['total_clientes'] = cursor.fetchone()['total'] or 0
-
-    cursor.execute("SELECT SUM(quantidade_estoque) as total FROM estoque")
-    stats['total_itens_estoque'] = cursor.fetchone()['total'] or 0
+    cursor.close()
+    return render_template("dashboard.html", stats=stats, proximo_evento=proximo_evento, eventos_recentes=eventos_recentes,
+                           todos_eventos=todos_eventos, feed_url=url_for('api_eventos_feed'))
 
-    cursor.execute("SELECT e.nome_evento, c.nome as cliente_nome FROM eventos e JOIN clientes c ON e.cliente_id = c.id ORDER BY e.id DESC LIMIT 5")
-    eventos_recentes = cursor.fetchall()
 
-    cursor.execute("SELECT e.nome_evento, e.data_evento, c.nome as cliente_nome, e.status FROM eventos e JOIN clientes c ON e.cliente_id = c.id ORDER BY e.data_evento")
-    todos_eventos = cursor.fetchall()
-    
-    cursor.close()
-    return render_template("dashboard.html", stats=stats, proximo_evento=proximo_evento, eventos_recentes=eventos_recentes, todos_eventos=todos_eventos)
+def _buscar_um(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchone()
 
 
 
@@ -189,21 +263,6 @@ from datetime import datetime
 
 
 
-def registrar_log_status(db, id_evento, novo_status, nome_evento, nome_cliente):
-    """Insere um novo registro de mudança de status na tabela log_atividades."""
-    cursor = db.cursor()
-    descricao = f"Status alterado para '{novo_status}' no evento '{nome_evento}' do cliente {nome_cliente}."
-    
-    cursor.execute("""
-        INSERT INTO log_atividades (tipo, id_referencia, descricao)
-        VALUES (%s, %s, %s)
-    """, ('MUDANCA_STATUS_EVENTO', id_evento, descricao))
-    db.commit()
-
-
-
-
-
 @app.route("/dashboard")
 def dashboard():
     if not session.get("logged_in"):
@@ -212,96 +271,65 @@ def dashboard():
     db = get_db()
     cursor = db.cursor(dictionary=True)
     
-    # 1. BUSCAR LOGS DE MUDANÇA DE STATUS (NOVO)
-    cursor.execute("""
-        SELECT 
-            descricao, 
-            'LOG_STATUS' as tipo_atividade,
-            data_log as data_criacao -- Usamos data_log para ordenação
-        FROM log_atividades
-        WHERE tipo = 'MUDANCA_STATUS_EVENTO'
-        ORDER BY data_log DESC
-        LIMIT 5
-    """)
-    logs_status = cursor.fetchall()
-
-    # 2. BUSCAR EVENTOS RECENTES (Criados - Status Pendente)
-    # Mostra os eventos NOVOS (os logs de status já cobrem os avanços)
-    cursor.execute("""
-        SELECT 
-            id, nome_evento, status, data_evento, 
-            (SELECT nome FROM clientes WHERE id = cliente_id) as cliente_nome,
-            'Evento' as tipo_atividade,
-            data_criacao 
-        FROM eventos
-        WHERE status = 'Pendente' -- Filtra apenas os orçamentos/eventos novos (Pendente)
-        ORDER BY data_criacao DESC
-        LIMIT 5
-    """)
-    eventos_recentes = cursor.fetchall()
-
-    # 3. BUSCAR PRODUTOS RECENTES (Cadastrados)
-    cursor.execute("""
-        SELECT 
-            nome AS nome_produto, 
-            quantidade_estoque, 
-            'Produto' as tipo_atividade,
-            data_cadastro as data_criacao -- Alias para unificar a chave de ordenação
-        FROM estoque
-        ORDER BY data_cadastro DESC
-        LIMIT 5
-    """)
-    produtos_recentes = cursor.fetchall()
-    
-    # 4. UNIR E ORDENAR
-    # Unimos os 3 tipos de atividades.
-    todas_atividades = logs_status + eventos_recentes + produtos_recentes
-
-    # Função de ordenação: Usa 'data_criacao' (que agora é data_log para logs e data_cadastro para produtos)
-    def get_sort_key(atividade):
-        return atividade.get('data_criacao')
-    
-    atividades_validas = [a for a in todas_atividades if get_sort_key(a) is not None]
-    
-    atividades_validas.sort(key=get_sort_key, reverse=True)
-    
-    ultimas_atividades = atividades_validas[:10]
+    # Últimas atividades de todos os tipos (eventos, orçamentos, pagamentos, status, cadastros e
+    # exclusões), registradas por quem grava: uma consulta pelo índice de data do log (atividades.py).
+    # Todas as linhas são de log, com a descrição pronta (tipo_atividade 'LOG_STATUS' no template)
+    pagina_atividades = listar_atividades(cursor, limite=ATIVIDADES_POR_PAGINA)
+    ultimas_atividades = [{**atividade, 'tipo_atividade': 'LOG_STATUS'} for atividade in pagina_atividades['itens']]
 
-    # --- CÓDIGO PARA OBTER VARIÁVEIS DO CONTEXTO DO TEMPLATE (Mantido) ---
-    cursor.execute("SELECT id, nome_evento, data_evento, cliente_id, status FROM eventos")
-    todos_eventos = cursor.fetchall()
+    # --- CÓDIGO PARA OBTER VARIÁVEIS DO CONTEXTO DO TEMPLATE ---
+    # Eventos do mês corrente (os demais vêm de /api/eventos/feed) e resumo mantido pelas gravações
+    todos_eventos = consultar(cursor, [EVENTOS], "SELECT id, nome_evento, data_evento, cliente_id, status FROM eventos "
+                                                 "WHERE recolhimento_evento >= %s AND data_evento < %s", janela_do_mes())
 
-    cursor.execute("""
+    proximo_evento = carregar(cursor, [EVENTOS], ('proximo_evento_confirmado', datetime.now().date()), lambda: _buscar_um(cursor, """
         SELECT nome_evento, data_evento 
         FROM eventos 
         WHERE data_evento >= CURDATE() AND status = 'Confirmado'
         ORDER BY data_evento ASC
         LIMIT 1
-    """)
-    proximo_evento = cursor.fetchone()
+    """))
     
-    cursor.execute("SELECT COUNT(id) AS total_clientes FROM clientes")
-    total_clientes = cursor.fetchone().get('total_clientes', 0)
-
-    cursor.execute("SELECT SUM(quantidade_estoque) AS total_itens_estoque FROM estoque")
-    total_itens_estoque = cursor.fetchone().get('total_itens_estoque', 0)
-    
-    stats = {
-        'receita_mes': 0.00, # Adapte com a sua consulta real
-        'total_clientes': total_clientes,
-        'total_itens_estoque': total_itens_estoque
-    }
+    stats = ler_estatisticas(cursor)
     # --- FIM do código de contexto ---
     
+    cursor.close()
     return render_template(
         "dashboard.html", 
         ultimas_atividades=ultimas_atividades, 
+        atividades_proximo=pagina_atividades['proximo'],
         todos_eventos=todos_eventos, 
         stats=stats,
-        proximo_evento=proximo_evento
+        proximo_evento=proximo_evento,
+        feed_url=url_for('api_eventos_feed')
     )
 
 
+@app.route("/api/atividades")
+def api_atividades():
+    """Feed de atividades do painel (JSON), mais recentes primeiro: ?apos=<proximo da página anterior>&limite=10"""
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        pagina = listar_atividades(cursor, apos=request.args.get("apos") or None,
+                                   limite=request.args.get("limite") or ATIVIDADES_POR_PAGINA)
+    except ValueError as e:
+        return jsonify({"erro": True, "mensagem": f"Parâmetro inválido: {e}"}), 400
+    finally:
+        cursor.close()
+
+    return jsonify({
+        "itens": [{**atividade, 'data_criacao': como_datetime(atividade['data_criacao']).isoformat()}
+                  for atividade in pagina['itens']],
+        "proximo": pagina['proximo'],
+    })
+
+
 
 
 
@@ -372,6 +400,72 @@ def cadastro_usuario():
     return render_template("cadastro_usuario.html", users=users)
 
 
+@app.route("/status/pool")
+def status_pool():
+    """Contadores do pool de conexões do processo (para dimensionar DB_POOL_SIZE/OVERFLOW)."""
+    if not session.get("logged_in") or session.get("role") != "admin":
+        return redirect(url_for("index"))
+    return jsonify(pool_stats())
+
+
+@app.route("/status/catalogo")
+def status_catalogo():
+    """Contadores do cache do catálogo do processo (acertos, faltas, versões vistas)."""
+    if not session.get("logged_in") or session.get("role") != "admin":
+        return redirect(url_for("index"))
+    return jsonify(cache_stats())
+
+
+@app.route("/email_outbox")
+def email_outbox():
+    """Fila de e-mails: contagem por status, últimos envios e falhas definitivas."""
+    if not session.get("logged_in") or session.get("role") != "admin":
+        return redirect(url_for("index"))
+
+    db = get_db()
+    if db is None:
+        flash("Erro ao conectar ao banco de dados.", "error")
+        return redirect(url_for("index"))
+
+    status = request.args.get("status")
+    cursor = db.cursor(dictionary=True)
+    try:
+        contagem, emails = resumo_outbox(cursor, status=status)
+    finally:
+        cursor.close()
+
+    if request.args.get("formato") == "json":
+        return jsonify({'contagem': contagem, 'emails': emails, 'smtp': outbox_worker.smtp.stats()})
+    return render_template("email_outbox.html", contagem=contagem, emails=emails, status=status,
+                           smtp=outbox_worker.smtp.stats())
+
+
+@app.route("/email_outbox/<int:email_id>/reenfileirar", methods=["POST"])
+def reenfileirar_email(email_id):
+    if not session.get("logged_in") or session.get("role") != "admin":
+        return redirect(url_for("index"))
+
+    db = get_db()
+    if db is None:
+        flash("Erro ao conectar ao banco de dados.", "error")
+        return redirect(url_for("email_outbox"))
+
+    cursor = db.cursor()
+    try:
+        if reenfileirar(cursor, email_id):
+            db.commit()
+            outbox_worker.acordar()
+            flash("E-mail colocado de volta na fila de envio.", "success")
+        else:
+            flash("Só e-mails com falha definitiva podem ser reenfileirados.", "warning")
+    except Exception as e:
+        db.rollback()
+        flash(f"Erro ao reenfileirar o e-mail: {e}", "error")
+    finally:
+        cursor.close()
+    return redirect(url_for("email_outbox", status="falhou"))
+
+
 
 
 
@@ -508,10 +602,15 @@ def estoque_evento():
                 """
                 INSERT INTO estoque 
                     (nome, tipo_material, unidade_medida, quantidade_venda, quantidade_estoque, preco_compra, preco_repasse, foto_path) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, 0, %s, %s, %s)
                 """,
-                (nome, tipo_material, unidade_medida, quantidade_venda, quantidade_estoque, preco_compra, preco_repasse, foto_path)
+                (nome, tipo_material, unidade_medida, quantidade_venda, preco_compra, preco_repasse, foto_path)
             )
+            material_id = cursor.lastrowid
+            # A quantidade inicial entra pelo livro de movimentos (que também atualiza quantidade_estoque)
+            movimentar_estoque(cursor, [(material_id, quantidade_estoque)], COMPRA)
+            invalidar_catalogo(cursor, ESTOQUE)  # Material novo, mesmo sem quantidade inicial
+            registrar_atividade(cursor, CADASTRO_PRODUTO, material_id, f"Produto '{nome}' cadastrado com {quantidade_estoque:g} em estoque.")
 
             # Se o preço de compra for maior que zero, lança como despesa no fluxo de caixa
             if preco_compra > 0 and quantidade_estoque > 0:
@@ -542,11 +641,52 @@ def estoque_evento():
         return redirect(url_for('estoque_evento'))
 
     # GET - Carrega a página
+    # Só a primeira página; as seguintes (e os filtros) vêm de /api/estoque
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM estoque ORDER BY id DESC")
-    materiais = cursor.fetchall()
+    pagina = carregar(cursor, [ESTOQUE], "estoque_primeira_pagina", lambda: listar_estoque(cursor))
     cursor.close()
-    return render_template('estoque_evento.html', materiais=materiais)
+    return render_template('estoque_evento.html', materiais=pagina['itens'], proximo=pagina['proximo'])
+
+
+@app.route("/importar_estoque", methods=["POST"])
+def importar_estoque_planilha():
+    """
+    Cadastro em lote a partir de uma planilha de fornecedor (.xlsx ou .csv), em lotes
+    transacionais (ver importacao.py). Com ?formato=json devolve o relatório completo.
+    """
+    if not session.get("logged_in"):
+        return redirect(url_for("login"))
+    como_json = request.args.get("formato") == "json"
+
+    db = get_db()
+    if db is None:
+        if como_json:
+            return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+        flash("Erro ao conectar ao banco de dados.", 'error')
+        return redirect(url_for('estoque_evento'))
+
+    planilha = request.files.get('planilha')
+    try:
+        if not planilha or not planilha.filename:
+            raise ErroImportacao("Selecione uma planilha .xlsx ou .csv.")
+        relatorio = importar_estoque(db, ler_planilha(planilha.stream, planilha.filename))
+    except ErroImportacao as e:
+        db.rollback()
+        if como_json:
+            return jsonify({"erro": True, "mensagem": str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('estoque_evento'))
+
+    if como_json:
+        return jsonify(relatorio)
+    erros = relatorio['erros']
+    flash(f"{relatorio['importados']} de {relatorio['linhas']} material(is) importado(s).",
+          'success' if not erros else 'warning')
+    for erro in erros[:10]:
+        flash(f"Linha {erro['linha']} ({erro['nome']}): {erro['erro']}", 'error')
+    if len(erros) > 10:
+        flash(f"... e mais {len(erros) - 10} linha(s) com erro.", 'error')
+    return redirect(url_for('estoque_evento'))
 
 
 
@@ -578,7 +718,7 @@ def reenviar_orcamento(orcamento_id):
         # 1. Buscar detalhes do orçamento e cliente
         cursor.execute("""
             SELECT 
-                o.nome_evento, o.data_evento, o.mao_de_obra, o.frete, o.valor_total, o.itens_json, o.token, o.status,
+                o.id, o.nome_evento, o.data_evento, o.mao_de_obra, o.frete, o.valor_total, o.itens_json, o.token, o.status,
                 c.nome AS cliente_nome, c.email AS cliente_email
             FROM orcamentos o
             JOIN clientes c ON o.cliente_id = c.id
@@ -596,135 +736,21 @@ def reenviar_orcamento(orcamento_id):
             return redirect(url_for("orcamento_eventos"))
 
         cliente_email = orcamento['cliente_email']
-        cliente_nome = orcamento['cliente_nome']
-        nome_evento = orcamento['nome_evento']
-        data_evento = orcamento['data_evento']
-        mao_de_obra = Decimal(orcamento['mao_de_obra'])
-        frete = Decimal(orcamento['frete'])
-        valor_total = Decimal(orcamento['valor_total'])
-        itens_selecionados = json.loads(orcamento['itens_json'])
-        token = orcamento['token']
-
-        # 2. Reconstruir detalhes dos itens para o corpo do e-mail
-        itens_detalhados_email = ""
-        valor_total_itens = Decimal(0)
-        
-        # ... (O código de reconstrução dos itens e envio de e-mail permanece o mesmo) ...
-        
-        for item in itens_selecionados:
-            # ... (Lógica de busca de itens) ...
-            item_id = item['id']
-            item_tipo = item['tipo']
-            quantidade = item['quantidade']
-            
-            # ... (Definição de nome e valor_unitario) ...
-            nome = ""
-            valor_unitario = Decimal(0)
-
-            if item_tipo == 'produto':
-                cursor.execute("SELECT nome, preco_repasse FROM estoque WHERE id = %s", (item_id,))
-                material_db = cursor.fetchone()
-                if material_db:
-                    nome = material_db['nome']
-                    valor_unitario = Decimal(material_db['preco_repasse'])
-            elif item_tipo == 'kit':
-                cursor.execute("SELECT nome, valor FROM kits WHERE id = %s", (item_id,))
-                material_db = cursor.fetchone()
-                if material_db:
-                    nome = material_db['nome']
-                    valor_unitario = Decimal(material_db['valor'])
-            
-            if not nome:
-                 nome = f"ITEM ID {item_id} ({item_tipo.upper()}) (Removido ou Inválido)"
-
 
-            valor_total_item = valor_unitario * quantidade
-            valor_total_itens += valor_total_item
-            
-            # Formato HTML do item (reutilizado do envio original)
-            itens_detalhados_email += f"""
-                <tr>
-                    <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">{nome}</td>
-                    <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">R$ {valor_unitario:.2f}</td>
-                    <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">{quantidade}</td>
-                    <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">R$ {valor_total_item:.2f}</td>
-                </tr>
-            """
-
-        # 3. Gerar Link de Aprovação
-        link_aprovacao = url_for('aprovar_orcamento', token=token, _external=True)
-
-        # 4. Formatar data
-        data_formatada = ""
-        if isinstance(data_evento, datetime):
-            data_formatada = data_evento.strftime('%d/%m/%Y às %H:%M')
-        else:
-             # Tentativa de formatar string se o MySQL não retornar um objeto datetime
-             data_formatada = datetime.strptime(str(data_evento).split('.')[0], '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y às %H:%M')
+        # 2. Gerar Link de Aprovação
+        link_aprovacao = url_for('aprovar_orcamento', token=orcamento['token'], _external=True)
 
+        # 3. Corpo do e-mail: reaproveita os itens e o HTML já renderizados para esta versão do orçamento
+        assunto = f"[REENVIO] Orçamento para seu evento: {orcamento['nome_evento']}"
+        corpo_html = renderizar_email_orcamento(cursor, orcamento, link_aprovacao, reenvio=True)
 
-        # 5. Re-criar e enviar e-mail
-        msg = Message(
-            subject=f"[REENVIO] Orçamento para seu evento: {nome_evento}",
-            sender="GESTÃO DE EVENTOS <gestao.eventos@example.com>",
-            recipients=[cliente_email]
-        )
-        
-        # ... (Corpo do e-mail HTML idêntico ao original) ...
-        msg.html = f"""
-            <h2 style="font-family: Arial, sans-serif; color: #333;">Olá, {cliente_nome}!</h2>
-            <p style="font-family: Arial, sans-serif; color: #555;">Este é um <strong>reenvio</strong> do orçamento para o seu evento <strong>{nome_evento}</strong>, que ocorrerá em <strong>{data_formatada}</strong>. Por favor, revise e aprove abaixo.</p>
-
-            <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead style="background-color: #f8f9fa;">
-            <tr>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Produto/Kits</th>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Valor Unitário</th>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Quantidade</th>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Valor Total</th>
-            </tr>
-            </thead>
-            <tbody>
-                {itens_detalhados_email}
-            </tbody>
-            </table>
-
-            <hr style="border-top: 2px solid #ddd; margin-top: 20px;">
-
-            <h3 style="font-family: Arial, sans-serif; color: #333;">Resumo do Orçamento</h3>
-            <table style="width: 100%; border-collapse: collapse;">
-            <tr>
-                <td style="padding: 10px; font-family: Arial, sans-serif; color: #333;">Valor Total dos Itens:</td>
-                <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333;">R$ {valor_total_itens:.2f}</td>
-            </tr>
-            <tr>
-                <td style="padding: 10px; font-family: Arial, sans-serif; color: #333;">Mão de Obra:</td>
-                <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333;">R$ {mao_de_obra:.2f}</td>
-            </tr>
-            <tr>
-            <td style="padding: 10px; font-family: Arial, sans-serif; color: #333;">Frete:</td>
-            <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333;">R$ {frete:.2f}</td>
-        </tr>
-        <tr style="border-top: 2px solid #ddd;">
-            <td style="padding: 10px; font-family: Arial, sans-serif; color: #333; font-weight: bold;">Total Geral:</td>
-            <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333; font-weight: bold;">R$ {valor_total:.2f}</td>
-        </tr>
-        </table>
-
-        <div style="margin-top: 30px; text-align: center;">
-            <a href="{link_aprovacao}" style="background-color: #28a745; color: white; padding: 15px 25px; text-decoration: none; border-radius: 5px; font-size: 16px; font-family: Arial, sans-serif; font-weight: bold;">Aprovar Orçamento</a>
-        </div>
-
-        <p style="font-family: Arial, sans-serif; color: #555; margin-top: 20px;">Caso tenha alguma dúvida, não hesite em entrar em contato conosco. Aguardamos sua aprovação para seguir com o processo.</p>
-
-        <p style="font-family: Arial, sans-serif; color: #555;">Atenciosamente,</p>
-        <p style="font-family: Arial, sans-serif; color: #555;">Equipe de Gestão de Eventos</p>
-        """
-
-        mail.send(msg)
-        flash(f"E-mail de orçamento reenviado com sucesso para {cliente_email}!", 'success')
+        enfileirar_email(cursor, REMETENTE_EMAIL, cliente_email, assunto, corpo_html, orcamento_id)
+        db.commit()
+        outbox_worker.acordar()
+        flash(f"E-mail de orçamento colocado na fila de reenvio para {cliente_email}!", 'success')
 
     except Exception as e:
+        db.rollback()
         flash(f"Erro ao reenviar o e-mail do orçamento {orcamento_id}: {e}", 'error')
     finally:
         cursor.close()
@@ -759,43 +785,10 @@ def ver_orcamento(orcamento_id):
             flash("Orçamento não encontrado.", "error")
             return redirect(url_for("orcamento_eventos"))
 
-        # Deserializa os itens
-        itens_selecionados = json.loads(orcamento['itens_json'])
-        itens_detalhados = []
-        valor_total_itens = Decimal(0)
-        
-        # Busca detalhes adicionais para os itens
-        for item in itens_selecionados:
-            item_id = item['id']
-            item_tipo = item['tipo']
-            quantidade = item['quantidade']
-            
-            nome = ""
-            valor_unitario = Decimal(0)
-
-            if item_tipo == 'produto':
-                cursor.execute("SELECT nome, preco_repasse FROM estoque WHERE id = %s", (item_id,))
-                material_db = cursor.fetchone()
-                if material_db:
-                    nome = material_db['nome']
-                    valor_unitario = Decimal(material_db['preco_repasse'])
-            elif item_tipo == 'kit':
-                cursor.execute("SELECT nome, valor FROM kits WHERE id = %s", (item_id,))
-                material_db = cursor.fetchone()
-                if material_db:
-                    nome = material_db['nome']
-                    valor_unitario = Decimal(material_db['valor'])
-
-            valor_total_item = valor_unitario * quantidade
-            valor_total_itens += valor_total_item
-
-            itens_detalhados.append({
-                'nome': nome or f"ITEM ID {item_id} ({item_tipo.upper()}) (Inválido)",
-                'quantidade': quantidade,
-                'valor_unitario': valor_unitario,
-                'valor_total_item': valor_total_item,
-                'tipo': item_tipo
-            })
+        # Itens com nome e preço (em cache por versão do orçamento, compartilhado com o e-mail)
+        detalhes = detalhes_orcamento(cursor, orcamento)
+        itens_detalhados = detalhes['itens']
+        valor_total_itens = detalhes['valor_total_itens']
 
         # Formatar datas para exibição
         orcamento['data_evento_str'] = orcamento['data_evento'].strftime('%d/%m/%Y às %H:%M')
@@ -883,52 +876,42 @@ def aprovar_orcamento(token):
         if not orcamento:
             return "Orçamento inválido, já aprovado ou não encontrado.", 404
 
-        # 2. Verificar a disponibilidade de estoque para os itens
-        itens_selecionados = json.loads(orcamento['itens_json'])
-        for item in itens_selecionados:
-            if item['tipo'] == 'produto':
-                cursor.execute("SELECT nome, quantidade_estoque FROM estoque WHERE id = %s", (item['id'],))
-                produto_db = cursor.fetchone()
-                if not produto_db or item['quantidade'] > produto_db['quantidade_estoque']:
-                    # Corrigido o erro de referenciar orcamento_id na linha 110. O correto é orcamento['id']
-                    flash(f"Não foi possível aprovar: Estoque do produto '{produto_db['nome']}' se tornou insuficiente.", 'error')
-                    return redirect(url_for('index'))
-            elif item['tipo'] == 'kit':
-                cursor.execute("SELECT nome, status FROM kits WHERE id = %s", (item['id'],))
-                kit_db = cursor.fetchone()
-                if not kit_db or kit_db['status'] != 'disponivel':
-                    flash(f"Não foi possível aprovar: O kit '{kit_db['nome']}' não está mais disponível.", 'error')
-                    return redirect(url_for('index'))
+        # 2. Marcar o orçamento como aprovado de forma condicional: se duas aprovações do mesmo
+        #    link chegarem juntas, só uma altera a linha; a outra desiste sem tocar no estoque
+        cursor.execute("UPDATE orcamentos SET status = 'aprovado' WHERE id = %s AND status = 'pendente'", (orcamento['id'],))
+        if cursor.rowcount != 1:
+            db.rollback()
+            return "Orçamento inválido, já aprovado ou não encontrado.", 404
 
         # 3. Criar o evento oficial e incluir os valores de mão de obra, frete E O ID DO ORÇAMENTO (AJUSTADO AQUI)
+        inicio, fim = periodo_do_evento(orcamento['data_evento'], orcamento['recolhimento_evento'])
         cursor.execute(
             "INSERT INTO eventos (nome_evento, cliente_id, tipo_evento, data_evento, recolhimento_evento, observacoes, valor_total, mao_de_obra, frete, orcamento_id) "
             "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
             (
                 orcamento['nome_evento'], orcamento['cliente_id'], orcamento['tipo_evento'], 
-                orcamento['data_evento'], orcamento['data_evento'], orcamento['observacoes'], 
+                inicio, fim, orcamento['observacoes'], 
                 orcamento['valor_total'], orcamento['mao_de_obra'], orcamento['frete'], orcamento['id'] # <-- orcamento['id'] é o ID do orçamento aprovado
             )
         )
         evento_id = cursor.lastrowid
+        invalidar_catalogo(cursor, EVENTOS)
 
-        # 4. Inserir os itens do orçamento como materiais do evento
-        for item in itens_selecionados:
-            material_id = item['id'] if item['tipo'] == 'produto' else None
-            kit_id = item['id'] if item['tipo'] == 'kit' else None
-            cursor.execute(
-                "INSERT INTO montagem_materiais (evento_id, material_id, kit_id, quantidade) "
-                "VALUES (%s, %s, %s, %s)",
-                (evento_id, material_id, kit_id, item['quantidade'])
-            )
-            if item['tipo'] == 'produto':
-                cursor.execute("UPDATE estoque SET quantidade_estoque = quantidade_estoque - %s WHERE id = %s", (item['quantidade'], item['id']))
-            elif item['tipo'] == 'kit':
-                cursor.execute("UPDATE kits SET status = 'em_uso' WHERE id = %s", (item['id'],))
+        # 4. Reservar o estoque de todos os itens de uma vez para o período do evento
+        #    (linhas travadas, baixa condicional dos consumíveis, registrada no livro de movimentos)
+        itens_orcamento = itens_do_orcamento(cursor, orcamento['id'])
+        try:
+            reservar(cursor, itens_orcamento, inicio, fim, evento_id=evento_id)
+        except EstoqueInsuficiente as e:
+            db.rollback()
+            flash(f"Não foi possível aprovar: {e}", 'error')
+            return redirect(url_for('index'))
+
+        # 5. Inserir os itens do orçamento como materiais do evento (com o preço fotografado no orçamento)
+        gravar_materiais_evento(cursor, evento_id, itens_orcamento)
+        registrar_atividade(cursor, ORCAMENTO_APROVADO, evento_id,
+                            f"Orçamento '{orcamento['nome_evento']}' aprovado pelo cliente; evento criado para {inicio:%d/%m/%Y}.")
 
-        # 5. Atualizar o status do orçamento para aprovado
-        cursor.execute("UPDATE orcamentos SET status = 'aprovado' WHERE id = %s", (orcamento['id'],))
-        
         db.commit()
 
     except Exception as e:
@@ -968,6 +951,7 @@ def kits():
         nome_kit = (request.form.get("nome_kit") or "").strip()
         valor_kit = request.form.get("valor_kit")
         foto = request.files.get("foto_kit")
+        modelo = bool(request.form.get("modelo"))  # Kit-modelo: montado do estoque a cada evento
         
         itens_selecionados = []
         i = 0
@@ -992,29 +976,44 @@ def kits():
         foto_path = None
         try:
             cursor = db.cursor(dictionary=True)
-            # Validação de estoque dos componentes
-            for item in itens_selecionados:
-                cursor.execute("SELECT nome, quantidade_estoque FROM estoque WHERE id = %s", (item['id'],))
-                produto_db = cursor.fetchone()
-                if not produto_db or item['quantidade'] > produto_db['quantidade_estoque']:
-                    flash(f"Estoque insuficiente para o item '{produto_db['nome']}'. Solicitado: {item['quantidade']}, Disponível: {produto_db['quantidade_estoque']}.", 'error')
-                    return redirect(url_for('kits'))
-            
             # Salva imagem
             if foto and foto.filename:
                 foto_path = save_image(foto, subdir="kits")
 
             # Cria o kit com status 'disponivel'
-            cursor.execute("INSERT INTO kits (nome, valor, foto_path, status) VALUES (%s, %s, %s, 'disponivel')", (nome_kit, valor_kit, foto_path))
-            kit_id = cursor.lastrowid
+            cursor.execute("INSERT INTO kits (nome, valor, foto_path, status, modelo) VALUES (%s, %s, %s, 'disponivel', %s)",
+                           (nome_kit, valor_kit, foto_path, modelo))
+            kit_id = cursor.lastrowid  # Antes de qualquer outro comando: no MySQL o lastrowid é o do último
+            invalidar_catalogo(cursor, KITS)
+
+            if modelo:
+                # Kit-modelo não separa peças: só confere, numa consulta, que os componentes existem
+                ids = sorted({item['id'] for item in itens_selecionados})
+                cursor.execute(f"SELECT id FROM estoque WHERE id IN ({', '.join(['%s'] * len(ids))})", tuple(ids))
+                faltando = set(ids) - {row['id'] for row in cursor.fetchall()}
+                if faltando or any(item['quantidade'] <= 0 for item in itens_selecionados):
+                    db.rollback()
+                    if foto_path: remove_file_if_exists(foto_path)
+                    flash("Componentes inválidos para o kit.", 'error')
+                    return redirect(url_for('kits'))
+            else:
+                # Reserva (trava e dá baixa) do estoque dos componentes, registrada no livro de movimentos
+                try:
+                    reservar(cursor, itens_selecionados, kit_id=kit_id)
+                except EstoqueInsuficiente as e:
+                    db.rollback()
+                    if foto_path: remove_file_if_exists(foto_path)
+                    flash(str(e), 'error')
+                    return redirect(url_for('kits'))
 
-            # Vincula itens e DÁ BAIXA no estoque dos componentes
+            # Vincula itens (a baixa no estoque já foi feita na reserva)
             for item in itens_selecionados:
                 cursor.execute("INSERT INTO kit_itens (kit_id, material_id, quantidade) VALUES (%s, %s, %s)", (kit_id, item['id'], item['quantidade']))
-                cursor.execute("UPDATE estoque SET quantidade_estoque = quantidade_estoque - %s WHERE id = %s", (item['quantidade'], item['id']))
+            registrar_atividade(cursor, CADASTRO_KIT, kit_id, f"{'Kit-modelo' if modelo else 'Kit'} '{nome_kit}' cadastrado.")
             
             db.commit()
-            flash("Kit cadastrado com sucesso! Itens foram deduzidos do estoque.", "success")
+            flash("Kit-modelo cadastrado com sucesso!" if modelo else
+                  "Kit cadastrado com sucesso! Itens foram deduzidos do estoque.", "success")
         except Exception as e:
             db.rollback()
             if foto_path: remove_file_if_exists(foto_path)
@@ -1025,20 +1024,21 @@ def kits():
 
     # GET
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT id, nome, tipo_material, unidade_medida, quantidade_estoque FROM estoque ORDER BY nome")
-    todos_materiais = cursor.fetchall()
+    todos_materiais = consultar(cursor, [ESTOQUE], "SELECT id, nome, tipo_material, unidade_medida, quantidade_estoque FROM estoque ORDER BY nome")
     
     # Busca kits e seu status
-    cursor.execute("SELECT id, nome, valor, created_at, foto_path, status FROM kits ORDER BY created_at DESC")
-    kits_list = cursor.fetchall()
-
-    kits_itens_map = {}
-    if kits_list:
-        kit_ids = [k["id"] for k in kits_list]
-        in_clause = ",".join(["%s"] * len(kit_ids))
-        cursor.execute(f"SELECT ki.kit_id, e.nome, ki.quantidade FROM kit_itens ki JOIN estoque e ON e.id = ki.material_id WHERE ki.kit_id IN ({in_clause})", tuple(kit_ids))
-        for row in cursor.fetchall():
-            kits_itens_map.setdefault(row["kit_id"], []).append(f"{row['nome']} ({row['quantidade']}x)")
+    kits_list = consultar(cursor, [KITS], "SELECT id, nome, valor, created_at, foto_path, status, modelo FROM kits ORDER BY created_at DESC")
+
+    def itens_dos_kits():
+        mapa = {}
+        if kits_list:
+            kit_ids = [k["id"] for k in kits_list]
+            in_clause = ",".join(["%s"] * len(kit_ids))
+            cursor.execute(f"SELECT ki.kit_id, e.nome, ki.quantidade FROM kit_itens ki JOIN estoque e ON e.id = ki.material_id WHERE ki.kit_id IN ({in_clause})", tuple(kit_ids))
+            for row in cursor.fetchall():
+                mapa.setdefault(row["kit_id"], []).append(f"{row['nome']} ({row['quantidade']}x)")
+        return mapa
+    kits_itens_map = carregar(cursor, [ESTOQUE, KITS], "kits_itens_map", itens_dos_kits)
     cursor.close()
     
     return render_template("kit_cadastro.html", todos_materiais=todos_materiais, kits_list=kits_list, kits_itens_map=kits_itens_map)
@@ -1052,29 +1052,44 @@ def deletar_kit(kit_id):
     cursor = db.cursor(dictionary=True)
     try:
         # Verifica se o kit não está em uso
-        cursor.execute("SELECT status, foto_path FROM kits WHERE id = %s", (kit_id,))
+        cursor.execute("SELECT nome, status, foto_path, modelo FROM kits WHERE id = %s", (kit_id,))
         kit = cursor.fetchone()
         if not kit:
             flash("Kit não encontrado.", "error")
             return redirect(url_for("kits"))
         
-        if kit['status'] == 'em_uso':
-            flash("Não é possível excluir um kit que está atualmente em uso em um evento.", "error")
+        if kit['modelo']:
+            # Reservas de kit-modelo contam nos componentes: basta saber se há evento em aberto com ele
+            cursor.execute(f"""
+                SELECT COUNT(*) AS n FROM montagem_materiais mm JOIN eventos e ON e.id = mm.evento_id
+                WHERE mm.kit_id = %s AND e.recolhimento_evento >= %s
+                  AND e.status NOT IN ({', '.join(['%s'] * len(STATUS_LIBERADOS))})
+            """, (kit_id, datetime.now(), *STATUS_LIBERADOS))
+            reservado = cursor.fetchone()['n'] > 0
+        else:
+            _, reservas_kit = reservas_no_periodo(cursor, datetime.now(), None, kit_ids=[kit_id])
+            reservado = bool(reservas_kit)
+        if reservado:
+            flash("Não é possível excluir um kit reservado para um evento em aberto.", "error")
             return redirect(url_for("kits"))
 
-        # Busca os itens do kit para devolver ao estoque
-        cursor.execute("SELECT material_id, quantidade FROM kit_itens WHERE kit_id = %s", (kit_id,))
-        itens_do_kit = cursor.fetchall()
-        for item in itens_do_kit:
-            cursor.execute("UPDATE estoque SET quantidade_estoque = quantidade_estoque + %s WHERE id = %s", (item['quantidade'], item['material_id']))
+        if not kit['modelo']:
+            # Busca os itens do kit para devolver ao estoque (kit-modelo não tem peças separadas)
+            cursor.execute("SELECT material_id, quantidade FROM kit_itens WHERE kit_id = %s", (kit_id,))
+            itens_do_kit = cursor.fetchall()
+            movimentar_estoque(cursor, [(item['material_id'], item['quantidade']) for item in itens_do_kit],
+                               KIT_DESFEITO, kit_id=kit_id)
 
         # Deleta o kit e seus itens
         cursor.execute("DELETE FROM kit_itens WHERE kit_id = %s", (kit_id,))
         cursor.execute("DELETE FROM kits WHERE id = %s", (kit_id,))
+        invalidar_catalogo(cursor, KITS)
+        registrar_atividade(cursor, EXCLUSAO, kit_id, f"Kit '{kit['nome']}' excluído.")
         db.commit()
 
         if kit['foto_path']: remove_file_if_exists(kit['foto_path'])
-        flash("Kit excluído com sucesso! Itens retornaram ao estoque.", "success")
+        flash("Kit excluído com sucesso!" if kit['modelo'] else
+              "Kit excluído com sucesso! Itens retornaram ao estoque.", "success")
     except Exception as e:
         db.rollback()
         flash(f"Erro ao excluir kit: {e}", "error")
@@ -1095,26 +1110,81 @@ def consulta_estoque():
         flash("Erro ao conectar ao banco de dados.", 'error')
         return redirect(url_for("consulta_estoque"))
 
+    # Só a primeira página; as seguintes (e os filtros) vêm de /api/estoque
     cursor = db.cursor(dictionary=True)
-    # Inclui quantidade_venda; foto_path pode ser útil na listagem futura
-    cursor.execute("""
-        SELECT 
-            id, 
-            nome, 
-            tipo_material, 
-            unidade_medida, 
-            COALESCE(quantidade_venda, 0) AS quantidade_venda,
-            quantidade_estoque, 
-            preco_compra, 
-            preco_repasse,
-            foto_path
-        FROM estoque
-        ORDER BY id DESC
-    """)
-    materiais = cursor.fetchall()
+    pagina = carregar(cursor, [ESTOQUE], "estoque_primeira_pagina", lambda: listar_estoque(cursor))
     cursor.close()
     
-    return render_template("consulta_estoque.html", materiais=materiais)
+    return render_template("consulta_estoque.html", materiais=pagina['itens'], proximo=pagina['proximo'])
+
+
+@app.route("/api/estoque")
+def api_estoque():
+    """
+    Listagem paginada do estoque (JSON), para as telas carregarem sob demanda:
+      ?apos=<proximo da página anterior>&limite=50&tipo_material=&unidade_medida=&q=<prefixo do nome>
+    """
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        pagina = listar_estoque(
+            cursor,
+            apos=request.args.get("apos") or None,
+            limite=request.args.get("limite") or 50,
+            tipo_material=request.args.get("tipo_material") or None,
+            unidade_medida=request.args.get("unidade_medida") or None,
+            busca=request.args.get("q"),
+        )
+    except ValueError as e:
+        return jsonify({"erro": True, "mensagem": f"Parâmetro inválido: {e}"}), 400
+    finally:
+        cursor.close()
+
+    numericos = ('quantidade_venda', 'quantidade_estoque', 'preco_compra', 'preco_repasse')
+    return jsonify({
+        "itens": [{**item,
+                   **{campo: float(item[campo] or 0) for campo in numericos},
+                   'data_cadastro': item['data_cadastro'].isoformat() if item['data_cadastro'] else None}
+                  for item in pagina['itens']],
+        "proximo": pagina['proximo'],
+    })
+
+
+
+@app.route("/movimentos_estoque")
+def movimentos_estoque():
+    """
+    Livro de movimentos de estoque (JSON):
+      ?data=aaaa-mm-dd               -> saldo de cada material no fim do dia
+      ?material_id=N[&data_inicio=&data_fim=] -> movimentos do material no período
+      ?conciliar=1                   -> materiais cujo saldo não bate com o livro
+    """
+    if not session.get("logged_in"):
+        return redirect(url_for("login"))
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        if request.args.get("conciliar"):
+            divergentes = conciliar_estoque(cursor)
+            return jsonify({'ok': not divergentes, 'divergentes': divergentes})
+        if request.args.get("material_id"):
+            return jsonify({'movimentos': movimentos_do_material(
+                cursor, int(request.args["material_id"]),
+                request.args.get("data_inicio"), request.args.get("data_fim"))})
+        data = request.args.get("data") or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return jsonify({'data': data, 'saldos': saldo_em(cursor, data)})
+    except ValueError as e:
+        return jsonify({"erro": True, "mensagem": f"Parâmetro inválido: {e}"}), 400
+    finally:
+        cursor.close()
 
 @app.route("/deletar_material/<int:material_id>", methods=["POST"])
 def deletar_material(material_id):
@@ -1130,10 +1200,11 @@ def deletar_material(material_id):
     try:
         # Busca foto_path para apagar caso delete
         cur = db.cursor(dictionary=True)
-        cur.execute("SELECT foto_path, nome FROM estoque WHERE id = %s", (material_id,))
+        cur.execute("SELECT foto_path, nome, quantidade_estoque FROM estoque WHERE id = %s", (material_id,))
         row = cur.fetchone()
         foto_path = row["foto_path"] if row else None
         nome_material = row["nome"] if row else None
+        quantidade_material = row["quantidade_estoque"] if row else 0
         cur.close()
 
         # Buscar se o material tem algum valor de despesa no fluxo de caixa
@@ -1152,6 +1223,10 @@ def deletar_material(material_id):
 
         # Agora exclui o material do estoque
         cursor.execute("DELETE FROM estoque WHERE id = %s", (material_id,))
+        invalidar_catalogo(cursor, ESTOQUE)
+        ajustar_estatisticas(cursor, {TOTAL_ITENS_ESTOQUE: -(quantidade_material or 0)})
+        if row:
+            registrar_atividade(cursor, EXCLUSAO, material_id, f"Produto '{nome_material}' excluído.")
         db.commit()
         cursor.close()
 
@@ -1225,6 +1300,8 @@ def cadastro_cliente():
                 """,
                 (nome, telefone, email, cpf, cep, endereco, bairro, cidade, uf, numero, complemento)
             )
+            registrar_atividade(cursor, CADASTRO_CLIENTE, cursor.lastrowid, f"Cliente {nome} cadastrado.")
+            ajustar_estatisticas(cursor, {TOTAL_CLIENTES: 1})
             db.commit()
             flash("Cliente cadastrado com sucesso!", "success")
         except mysql.connector.IntegrityError as e:
@@ -1269,6 +1346,9 @@ def deletar_cliente(cliente_id):
     try:
         cur = db.cursor()
         cur.execute("DELETE FROM clientes WHERE id = %s", (cliente_id,))
+        if cur.rowcount:
+            ajustar_estatisticas(cur, {TOTAL_CLIENTES: -cur.rowcount})
+            registrar_atividade(cur, EXCLUSAO, cliente_id, f"Cliente (ID {cliente_id}) excluído.")
         db.commit()
         cur.close()
         flash("Cliente excluído com sucesso!", "success")
@@ -1339,6 +1419,7 @@ def tabela_precos():
             cursor = db.cursor()
             cursor.execute("INSERT INTO precos (nome, tipo, preco) VALUES (%s, %s, %s)",
                            (nome, tipo, preco))
+            invalidar_catalogo(cursor, PRECOS)
             db.commit()
             cursor.close()
             flash("Preço cadastrado com sucesso!", 'success')
@@ -1348,8 +1429,7 @@ def tabela_precos():
             flash(f"Ocorreu um erro: {e}", 'error')
             
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM precos")
-    precos = cursor.fetchall()
+    precos = consultar(cursor, [PRECOS], "SELECT * FROM precos")
     cursor.close()
     return render_template("tabela_precos.html", precos=precos)
 
@@ -1358,6 +1438,41 @@ def tabela_precos():
 # ========================
 # No seu arquivo app.py, substitua a função /eventos por esta:
 
+@app.route("/disponibilidade", methods=["POST"])
+def disponibilidade():
+    """
+    Disponibilidade de um carrinho inteiro num período, numa chamada só (para os formulários
+    de evento e orçamento conferirem antes de enviar).
+    JSON: {"data_evento": ..., "recolhimento_evento": ..., "itens": [{"id", "tipo", "quantidade"}]}
+    """
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+
+    dados = request.get_json(silent=True) or {}
+    try:
+        inicio, fim = periodo_do_evento(dados.get("data_evento"), dados.get("recolhimento_evento"))
+        itens = [{'id': int(item['id']), 'tipo': item['tipo'], 'quantidade': int(item.get('quantidade', 1))}
+                 for item in dados.get("itens") or []]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"erro": True, "mensagem": f"Requisição inválida: {e}"}), 400
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        resolvidos = disponibilidade_carrinho(cursor, itens, inicio, fim)
+    finally:
+        cursor.close()
+    return jsonify({
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "disponivel": all(item['disponivel'] for item in resolvidos),
+        "itens": [{'id': item['id'], 'tipo': item['tipo'], 'nome': item['nome'], 'quantidade': item['quantidade'],
+                   'livre': float(item['livre']), 'disponivel': item['disponivel']} for item in resolvidos],
+    })
+
+
 
 
 
@@ -1411,40 +1526,19 @@ def eventos():
 
             cursor = db.cursor(dictionary=True)
 
-            # --- VALIDAÇÃO DE ESTOQUE E DISPONIBILIDADE DE KITS (Lógica mantida) ---
-            for item in itens_selecionados:
-                if item['tipo'] == 'produto':
-                    cursor.execute("SELECT nome, quantidade_estoque FROM estoque WHERE id = %s", (item['id'],))
-                    produto_db = cursor.fetchone()
-                    if not produto_db or item['quantidade'] > produto_db['quantidade_estoque']:
-                        flash(f"Erro de estoque para o produto '{produto_db['nome']}'. Solicitado: {item['quantidade']}, Disponível: {produto_db['quantidade_estoque']}.", 'error')
-                        return redirect(url_for('eventos'))
-                
-                elif item['tipo'] == 'kit':
-                    cursor.execute("SELECT nome, status FROM kits WHERE id = %s", (item['id'],))
-                    kit_db = cursor.fetchone()
-                    if not kit_db or kit_db['status'] != 'disponivel':
-                        flash(f"O kit '{kit_db['nome'] if kit_db else 'ID ' + str(item['id'])}' não está disponível para uso.", 'error')
-                        return redirect(url_for('eventos'))
-
-            # Cálculo do valor total (Lógica mantida)
-            valor_total_evento = Decimal(0)
-            itens_para_salvar = []
-            for item in itens_selecionados:
-                valor_item_unitario = Decimal(0)
-                if item['tipo'] == 'produto':
-                    cursor.execute("SELECT preco_repasse FROM estoque WHERE id = %s", (item['id'],))
-                    produto = cursor.fetchone()
-                    if produto: valor_item_unitario = Decimal(produto['preco_repasse'])
-                elif item['tipo'] == 'kit':
-                    cursor.execute("SELECT valor FROM kits WHERE id = %s", (item['id'],))
-                    kit = cursor.fetchone()
-                    if kit: valor_item_unitario = Decimal(kit['valor'])
-                valor_total_evento += valor_item_unitario * item['quantidade']
-                itens_para_salvar.append({**item, 'valor_item': valor_item_unitario})
-
-            # Adicionando Mão de Obra e Frete ao valor total do evento
-            valor_total_evento += mao_de_obra + frete
+            # Período da reserva dos itens de aluguel e kits (sem recolhimento: o próprio horário do evento)
+            try:
+                inicio, fim = periodo_do_evento(data_evento, recolhimento_evento or None)
+            except ValueError as e:
+                flash(str(e), 'error')
+                return redirect(url_for('eventos'))
+
+            # Preços numa só resolução do carrinho (no máximo duas consultas); a conferência de
+            # estoque fica com a reserva, que relê as mesmas linhas travadas
+            itens_resolvidos = resolver_itens(cursor, itens_selecionados)
+
+            # Valor total: itens + Mão de Obra e Frete
+            valor_total_evento = sum((item['valor_total_item'] for item in itens_resolvidos), Decimal(0)) + mao_de_obra + frete
 
             # ✅ ATUALIZAÇÃO DO INSERT: Incluindo orcamento_id
             cursor.execute(
@@ -1452,25 +1546,22 @@ def eventos():
                 INSERT INTO eventos (nome_evento, cliente_id, tipo_evento, data_evento, recolhimento_evento, observacoes, valor_total, mao_de_obra, frete, status_pagamento, orcamento_id) 
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'Pendente', %s)
                 """,
-                (nome_evento, cliente_id, tipo_evento, data_evento, recolhimento_evento or None, observacoes, valor_total_evento, mao_de_obra, frete, orcamento_id)
+                (nome_evento, cliente_id, tipo_evento, inicio, fim, observacoes, valor_total_evento, mao_de_obra, frete, orcamento_id)
             )
             evento_id = cursor.lastrowid
+            invalidar_catalogo(cursor, EVENTOS)
 
-            # --- LÓGICA DE BAIXA DE ESTOQUE E ATUALIZAÇÃO DE STATUS (Mantida) ---
-            for item_final in itens_para_salvar:
-                material_id = item_final['id'] if item_final['tipo'] == 'produto' else None
-                kit_id = item_final['id'] if item_final['tipo'] == 'kit' else None
-                cursor.execute(
-                    "INSERT INTO montagem_materiais (evento_id, material_id, kit_id, quantidade, valor_item) VALUES (%s, %s, %s, %s, %s)",
-                    (evento_id, material_id, kit_id, item_final['quantidade'], item_final['valor_item'])
-                )
-                
-                if item_final['tipo'] == 'produto':
-                    # Baixa no estoque apenas para produtos avulsos
-                    cursor.execute("UPDATE estoque SET quantidade_estoque = quantidade_estoque - %s WHERE id = %s", (item_final['quantidade'], item_final['id']))
-                elif item_final['tipo'] == 'kit':
-                    # Para kits, apenas muda o status para 'em_uso'
-                    cursor.execute("UPDATE kits SET status = 'em_uso' WHERE id = %s", (item_final['id'],))
+            # --- RESERVA DE ESTOQUE E DE KITS NO PERÍODO (trava as linhas, confere e dá baixa de uma vez) ---
+            try:
+                reservar(cursor, itens_selecionados, inicio, fim, evento_id=evento_id)
+            except EstoqueInsuficiente as e:
+                db.rollback()
+                flash(str(e), 'error')
+                return redirect(url_for('eventos'))
+
+            # --- MATERIAIS DO EVENTO, num só executemany (a baixa de estoque já foi feita na reserva) ---
+            gravar_materiais_evento(cursor, evento_id, itens_resolvidos)
+            registrar_atividade(cursor, EVENTO_CRIADO, evento_id, f"Evento '{nome_evento}' cadastrado para {inicio:%d/%m/%Y}.")
 
             db.commit()
             flash("Evento cadastrado com sucesso, aguardando pagamento!", 'success')
@@ -1490,15 +1581,14 @@ def eventos():
     clientes = cursor.fetchall()
     cursor.execute("SELECT e.id, e.nome_evento, e.data_evento, c.nome as cliente_nome, e.status, e.valor_total, e.status_pagamento FROM eventos e JOIN clientes c ON e.cliente_id = c.id ORDER BY e.data_evento DESC")
     eventos_cadastrados = cursor.fetchall() # Isso garante que o novo evento apareça na lista
-    cursor.execute("SELECT id, nome, preco_repasse, quantidade_estoque FROM estoque ORDER BY nome")
-    produtos = cursor.fetchall()
+    produtos = consultar(cursor, [ESTOQUE], "SELECT id, nome, preco_repasse, quantidade_estoque FROM estoque ORDER BY nome")
     
     # --- AJUSTE NA LÓGICA DE BUSCA DE KITS ---
-    cursor.execute("SELECT id, nome, valor FROM kits WHERE status = 'disponivel' ORDER BY nome")
-    kits_disponiveis = cursor.fetchall()
+    kits_disponiveis = consultar(cursor, [KITS], "SELECT id, nome, valor, modelo FROM kits WHERE status = 'disponivel' ORDER BY nome")
+    capacidade = carregar(cursor, [ESTOQUE, KITS], "capacidade_kits", lambda: capacidade_kits(cursor))
     for kit in kits_disponiveis:
-        # Define que cada kit disponível representa 1 unidade em estoque
-        kit['estoque_disponivel'] = 1 
+        # Kit comum é 1 unidade; kit-modelo, quantos os componentes em estoque permitem montar
+        kit['estoque_disponivel'] = capacidade.get(kit['id'], 0) if kit['modelo'] else 1
 
     cursor.close()
     
@@ -1519,22 +1609,120 @@ def calendario_eventos():
         flash("Erro ao conectar ao banco de dados.", 'error')
         return redirect(url_for('index'))
     
+    # Só o mês corrente vai no HTML; ao navegar, o calendário busca cada janela em /api/eventos/feed
+    inicio, fim = janela_do_mes()
     cursor = db.cursor(dictionary=True)
-    
-    # Busca TODOS os eventos com os dados necessários
-    cursor.execute("""
-        SELECT 
-            e.nome_evento, 
-            e.data_evento, 
-            e.status, 
-            c.nome as cliente_nome 
-        FROM eventos e 
-        JOIN clientes c ON e.cliente_id = c.id
-    """)
-    eventos = cursor.fetchall()
+    eventos = carregar(cursor, [EVENTOS], ('feed', inicio, fim), lambda: eventos_na_janela(cursor, inicio, fim))
     cursor.close()
 
-    return render_template("calendario_eventos.html", eventos=eventos)
+    return render_template("calendario_eventos.html", eventos=eventos, feed_url=url_for('api_eventos_feed'))
+
+
+@app.route("/api/eventos/feed")
+def api_eventos_feed():
+    """
+    Eventos que cruzam a janela visível do calendário (JSON compacto): ?start=&end= (ISO 8601).
+    O ETag é a versão da agenda + a janela: enquanto nenhum evento mudar, a revalidação
+    responde 304 sem consultar os eventos.
+    """
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+    try:
+        inicio, fim = janela_do_feed(request.args.get("start"), request.args.get("end"))
+    except ValueError as e:
+        return jsonify({"erro": True, "mensagem": f"Parâmetro inválido: {e}"}), 400
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        etag = f"eventos-{versao_atual(cursor, EVENTOS)}-{inicio:%Y%m%dT%H%M%S}-{fim:%Y%m%dT%H%M%S}"
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+        else:
+            eventos = carregar(cursor, [EVENTOS], ('feed', inicio, fim), lambda: eventos_na_janela(cursor, inicio, fim))
+            response = app.response_class(json.dumps(eventos, ensure_ascii=False, separators=(',', ':')),
+                                          mimetype='application/json')
+    finally:
+        cursor.close()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'  # Sempre revalida (barato: 304)
+    return response
+
+
+@app.route("/calendario/assinatura", methods=["POST"])
+def assinatura_calendario():
+    """
+    Gera (ou troca) o link secreto da agenda em ICS do usuário logado; o link anterior deixa
+    de funcionar. O link só é mostrado agora: o banco guarda apenas o hash do token.
+    Com ?revogar=1, apaga o link sem gerar outro.
+    """
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    token, token_hash = (None, None) if request.args.get("revogar") else novo_token()
+    cursor = db.cursor()
+    try:
+        cursor.execute("UPDATE users SET ics_token = %s WHERE username = %s", (token_hash, session.get("username")))
+        if cursor.rowcount != 1:
+            # O MySQL conta só as linhas alteradas: revogar um link já revogado também dá 0
+            cursor.execute("SELECT id FROM users WHERE username = %s", (session.get("username"),))
+            if cursor.fetchone() is None:
+                db.rollback()
+                return jsonify({"erro": True, "mensagem": "Usuário não encontrado."}), 404
+        db.commit()
+    finally:
+        cursor.close()
+    if token is None:
+        return jsonify({"revogado": True})
+    return jsonify({"url": url_for("agenda_ics", token=token, _external=True)})
+
+
+@app.route("/calendario/<token>.ics")
+def agenda_ics(token):
+    """
+    Agenda em ICS para assinatura (sem sessão: o token do link identifica o usuário).
+    Gerada em fluxo, numa janela móvel, com ETag/Last-Modified da última alteração de evento.
+    """
+    db = get_db()
+    if db is None:
+        return "Erro de banco de dados.", 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id FROM users WHERE ics_token = %s", (hash_do_token(token),))
+        if cursor.fetchone() is None:
+            abort(404)
+        versao, alterado_em = ultima_alteracao(cursor, EVENTOS)
+    finally:
+        cursor.close()
+
+    etag, ultima_modificacao = validadores(versao, alterado_em)
+    if request.if_none_match:
+        nao_mudou = request.if_none_match.contains(etag)
+    else:
+        nao_mudou = request.if_modified_since is not None and \
+            ultima_modificacao.replace(microsecond=0) <= request.if_modified_since
+    if nao_mudou:
+        response = make_response("", 304)
+    else:
+        dominio = request.host.split(':')[0]
+
+        def conteudo():
+            cursor_ics = get_db().cursor(dictionary=True)
+            try:
+                yield from gerar_ics(cursor_ics, *janela(), dominio, ultima_modificacao)
+            finally:
+                cursor_ics.close()
+        response = Response(stream_with_context(conteudo()), mimetype='text/calendar')
+        response.headers['Content-Disposition'] = 'inline; filename="eventos.ics"'
+    response.set_etag(etag)
+    response.last_modified = ultima_modificacao
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @app.route("/controle_eventos")
@@ -1550,21 +1738,20 @@ def controle_eventos():
         flash("Erro ao conectar ao banco de dados.", 'error')
         return redirect(url_for("index"))
         
-    eventos = []
+    filtros = _filtros_de_eventos()
     cursor = None # Inicializa o cursor fora do try
     
     try:
         cursor = db.cursor(dictionary=True)
-        # Execução da consulta dentro do bloco try
-        cursor.execute("""
-            SELECT 
-                e.id, e.nome_evento, e.data_evento, e.recolhimento_evento, 
-                e.observacoes, c.nome as cliente_nome, e.status, e.valor_total, e.status_pagamento, e.valor_pago
-            FROM eventos e 
-            JOIN clientes c ON e.cliente_id = c.id 
-            ORDER BY e.data_evento DESC, e.id DESC
-        """)
-        eventos = cursor.fetchall()
+        # Uma página por vez (keyset em data_evento, id) e as contagens por status, com os
+        # filtros resolvidos no banco; as páginas seguintes vêm de ?apos= ou de /api/eventos
+        pagina = listar_eventos(cursor, apos=request.args.get("apos") or None,
+                                limite=request.args.get("limite") or EVENTOS_POR_PAGINA, **filtros)
+        contagem = contar_eventos(cursor, **filtros)
+
+    except ValueError as e:
+        flash(f"Filtro inválido: {e}", 'error')
+        return redirect(url_for("controle_eventos"))
 
     except Exception as e:
         # Tratamento de erro caso a consulta falhe
@@ -1577,11 +1764,68 @@ def controle_eventos():
         # 3. Garante que o cursor seja fechado (CRÍTICO)
         if cursor:
             cursor.close()
-        # Nota: Se o seu `get_db()` não usa o teardown do Flask, você também precisará
-        # fechar a conexão db aqui (db.close()). Assumo que o Flask esteja gerenciando.
     
     # 4. Renderização
-    return render_template("controle_eventos.html", eventos=eventos)
+    return render_template("controle_eventos.html", eventos=pagina['itens'], proximo=pagina['proximo'],
+                           contagem=contagem, filtros=filtros)
+
+
+def _filtros_de_eventos():
+    """Filtros da listagem de eventos a partir da query string (vazios ficam de fora)."""
+    return {campo: request.args.get(campo) for campo in ('status', 'status_pagamento', 'cliente_id', 'data_inicio', 'data_fim')
+            if request.args.get(campo)}
+
+
+@app.route("/api/eventos")
+def api_eventos():
+    """
+    Listagem paginada dos eventos (JSON):
+      ?apos=<proximo da página anterior>&limite=50&status=&status_pagamento=&cliente_id=&data_inicio=&data_fim=
+    """
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        pagina = listar_eventos(cursor, apos=request.args.get("apos") or None,
+                                limite=request.args.get("limite") or EVENTOS_POR_PAGINA, **_filtros_de_eventos())
+    except ValueError as e:
+        return jsonify({"erro": True, "mensagem": f"Parâmetro inválido: {e}"}), 400
+    finally:
+        cursor.close()
+
+    return jsonify({
+        "itens": [{**evento,
+                   'valor_total': float(evento['valor_total'] or 0),
+                   'valor_pago': float(evento['valor_pago'] or 0),
+                   'data_evento': como_datetime(evento['data_evento']).isoformat(),
+                   'recolhimento_evento': (como_datetime(evento['recolhimento_evento']).isoformat()
+                                           if evento['recolhimento_evento'] else None)}
+                  for evento in pagina['itens']],
+        "proximo": pagina['proximo'],
+    })
+
+
+@app.route("/api/eventos/contagem")
+def api_eventos_contagem():
+    """Contagem dos eventos por status (JSON), com os mesmos filtros de /api/eventos."""
+    if not session.get("logged_in"):
+        return jsonify({"erro": True, "mensagem": "Não autenticado."}), 401
+
+    db = get_db()
+    if db is None:
+        return jsonify({"erro": True, "mensagem": "Erro ao conectar ao banco de dados."}), 500
+    cursor = db.cursor(dictionary=True)
+    try:
+        contagem = contar_eventos(cursor, **_filtros_de_eventos())
+    except ValueError as e:
+        return jsonify({"erro": True, "mensagem": f"Parâmetro inválido: {e}"}), 400
+    finally:
+        cursor.close()
+    return jsonify(contagem)
 
 
 
@@ -1634,35 +1878,38 @@ def finalizar_evento(evento_id):
         
     cursor = db.cursor(dictionary=True)
     try:
-        # Busca todos os itens do evento (produtos e kits)
-        cursor.execute("SELECT material_id, kit_id, quantidade FROM montagem_materiais WHERE evento_id = %s", (evento_id,))
-        itens_do_evento = cursor.fetchall()
+        # Busca os itens de aluguel avulsos do evento, inclusive os componentes de kits-modelo
+        # (kits comuns e consumíveis não mudam o estoque aqui)
+        itens_aluguel = [item for item in materiais_do_evento(cursor, evento_id) if item['tipo_material'] == 'aluguel']
+        cursor.execute("SELECT status, nome_evento FROM eventos WHERE id = %s", (evento_id,))
+        evento = cursor.fetchone()
+        ja_liberado = evento is not None and evento['status'] in STATUS_LIBERADOS
         
         if recolhimento_status == "Total":
-            for item in itens_do_evento:
-                # Se for um material de aluguel avulso, devolve ao estoque
-                if item['material_id']:
-                    cursor.execute("SELECT tipo_material FROM estoque WHERE id = %s", (item['material_id'],))
-                    produto = cursor.fetchone()
-                    if produto and produto['tipo_material'] == 'aluguel':
-                        cursor.execute("UPDATE estoque SET quantidade_estoque = quantidade_estoque + %s WHERE id = %s", (item['quantidade'], item['material_id']))
-                
-                # Se for um kit, muda o status para 'disponivel'
-                elif item['kit_id']:
-                    cursor.execute("UPDATE kits SET status = 'disponivel' WHERE id = %s", (item['kit_id'],))
-
+            # Itens de aluguel e kits não tiveram baixa: finalizar o evento encerra a reserva
+            # do período (ver disponibilidade.py), e eles voltam a contar como livres
             cursor.execute("UPDATE eventos SET status = 'Finalizado', observacoes = %s WHERE id = %s", ("Recolhimento total.", evento_id))
+            invalidar_catalogo(cursor, EVENTOS)
+            novo_status = 'Finalizado'
             flash("Evento finalizado! Itens de aluguel e kits retornaram ao estado disponível.", 'success')
 
         elif recolhimento_status == "Parcial":
-            # Para finalização parcial, também liberamos os kits
-            for item in itens_do_evento:
-                if item['kit_id']:
-                    cursor.execute("UPDATE kits SET status = 'disponivel' WHERE id = %s", (item['kit_id'],))
+            # Os kits são liberados com o fim da reserva; as peças de aluguel avulsas não voltaram
+            # (avariadas/perdidas) e saem do total de peças (uma vez só, se o evento ainda estava em aberto)
+            perdas = {}
+            for item in itens_aluguel if not ja_liberado else []:
+                perdas[item['material_id']] = min(perdas.get(item['material_id'], 0) + item['quantidade'], item['quantidade_estoque'])
+            movimentar_estoque(cursor, [(material_id, -quantidade) for material_id, quantidade in perdas.items()],
+                               PERDA, evento_id=evento_id)
             
             cursor.execute("UPDATE eventos SET status = 'Finalização Parcial', observacoes = %s WHERE id = %s", (observacoes, evento_id))
+            invalidar_catalogo(cursor, EVENTOS)
+            novo_status = 'Finalização Parcial'
             flash("Status do evento atualizado. Kits foram liberados, mas itens avariados não retornaram ao estoque.", 'warning')
 
+        if evento and recolhimento_status in ("Total", "Parcial"):
+            registrar_atividade(cursor, MUDANCA_STATUS_EVENTO, evento_id,
+                                f"Status alterado para '{novo_status}' no evento '{evento['nome_evento']}'.")
         db.commit()
     except Exception as e:
         db.rollback()
@@ -1675,36 +1922,6 @@ def finalizar_evento(evento_id):
 
 
 
-def registrar_log_atividade(db, tipo, id_referencia, descricao):
-    """
-    Insere um novo registro de log genérico na tabela log_atividades.
-    Usa uma transação isolada e usa a coluna 'data_log'.
-    """
-    cursor = db.cursor() 
-    try:
-        # Insere a descrição e tipo fornecidos, confiando no DEFAULT CURRENT_TIMESTAMP do MySQL.
-        cursor.execute("""
-            INSERT INTO log_atividades (tipo, id_referencia, descricao)
-            VALUES (%s, %s, %s)
-        """, (tipo, id_referencia, descricao))
-        
-        db.commit() # Confirma a inserção do log separadamente
-        print(f"DEBUG: Log registrado com sucesso para Tipo: {tipo}, ID: {id_referencia}")
-        
-    except Exception as e:
-        # Tenta dar rollback apenas na transação do log
-        try:
-            db.rollback()
-        except:
-            pass
-            
-        # Imprime o erro crítico no console para depuração
-        print("-" * 50)
-        print(f"ERRO CRÍTICO no SQL ao registrar log para {tipo} ID {id_referencia}: {e}")
-        print("-" * 50)
-    finally:
-        cursor.close()
-
 # ----------------------------------------------------------------------
 # ROTA DE ORÇAMENTO 
 # ----------------------------------------------------------------------
@@ -1742,7 +1959,6 @@ def orcamento_eventos():
                 flash("Cliente não encontrado ou sem e-mail cadastrado.", "error")
                 return redirect(url_for('orcamento_eventos'))
             cliente_email = cliente['email']
-            cliente_nome = cliente['nome']
 
             # Itens selecionados
             itens_selecionados = []
@@ -1764,44 +1980,21 @@ def orcamento_eventos():
             # Calcular o valor total incluindo mão de obra e frete
             valor_total = Decimal(0)
             valor_total_itens = Decimal(0)  # Para calcular o valor total dos itens
-            itens_detalhados_email = ""
-            for item in itens_selecionados:
-                if item['tipo'] == 'produto':
-                    cursor.execute("SELECT nome, quantidade_estoque, preco_repasse FROM estoque WHERE id = %s", (item['id'],))
-                    produto_db = cursor.fetchone()
-                    if not produto_db or item['quantidade'] > produto_db['quantidade_estoque']:
-                        flash(f"Estoque insuficiente para o produto '{produto_db['nome']}'.", 'error')
-                        return redirect(url_for('orcamento_eventos'))
-                    valor_unitario = Decimal(produto_db['preco_repasse'])
-                    valor_total_item = valor_unitario * item['quantidade']
-                    valor_total_itens += valor_total_item
-                    valor_total += valor_total_item
-                    itens_detalhados_email += f"""
-                        <tr>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">{produto_db['nome']}</td>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">R$ {valor_unitario:.2f}</td>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">{item['quantidade']}</td>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">R$ {valor_total_item:.2f}</td>
-                        </tr>
-                    """
-                elif item['tipo'] == 'kit':
-                    cursor.execute("SELECT nome, status, valor FROM kits WHERE id = %s", (item['id'],))
-                    kit_db = cursor.fetchone()
-                    if not kit_db or kit_db['status'] != 'disponivel':
-                        flash(f"O kit '{kit_db['nome']}' não está mais disponível.", 'error')
-                        return redirect(url_for('orcamento_eventos'))
-                    valor_unitario = Decimal(kit_db['valor'])
-                    valor_total_item = valor_unitario * item['quantidade']
-                    valor_total_itens += valor_total_item
-                    valor_total += valor_total_item
-                    itens_detalhados_email += f"""
-                        <tr>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">{kit_db['nome']}</td>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">R$ {valor_unitario:.2f}</td>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">{item['quantidade']}</td>
-                            <td style="padding: 10px; font-family: Arial, sans-serif; color: #555; border: 1px solid #ddd;">R$ {valor_total_item:.2f}</td>
-                        </tr>
-                    """
+            # Disponibilidade do carrinho inteiro no período do evento (três consultas)
+            inicio, fim = periodo_do_evento(data_evento, data_recolhimento)
+            itens_resolvidos = disponibilidade_carrinho(cursor, itens_selecionados, inicio, fim)
+            indisponivel = primeiro_indisponivel(itens_resolvidos)
+            if indisponivel:
+                if indisponivel['tipo'] == 'produto':
+                    flash(f"Estoque insuficiente para o produto '{nome_do_item(indisponivel)}' no período (disponível: {indisponivel['livre']}).", 'error')
+                else:
+                    flash(f"O kit '{nome_do_item(indisponivel)}' não está disponível no período.", 'error')
+                return redirect(url_for('orcamento_eventos'))
+
+            for item in itens_resolvidos:
+                if item['tipo'] in ('produto', 'kit'):
+                    valor_total_itens += item['valor_total_item']
+                    valor_total += item['valor_total_item']
 
             # Adicionando o valor de mão de obra e frete ao total
             valor_total += mao_de_obra + frete
@@ -1813,75 +2006,29 @@ def orcamento_eventos():
                 "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'Pendente')",  # Status 'Pendente' para o orçamento
                 (nome_evento, cliente_id, tipo_evento, data_evento, data_recolhimento, valor_total, observacoes, mao_de_obra, frete, json.dumps(itens_selecionados), token)
             )
-            db.commit()
+            orcamento_id = cursor.lastrowid
+            gravar_itens_orcamento(cursor, orcamento_id, itens_resolvidos)
 
             # Link para aprovação do orçamento
             link_aprovacao = url_for('aprovar_orcamento', token=token, _external=True)
 
-            # Configuração do e-mail com o nome da empresa como remetente
-            msg = Message(
-                subject=f"Orçamento para seu evento: {nome_evento}",
-                sender="GESTÃO DE EVENTOS <gestao.eventos@example.com>",  # Nome da empresa como remetente
-                recipients=[cliente_email]
+            # Relê o orçamento gravado (mesmos campos que reenvio e ver_orcamento usam) e renderiza
+            # o e-mail com os itens já resolvidos; o resultado fica em cache para reenvios
+            cursor.execute(
+                "SELECT o.*, c.nome AS cliente_nome FROM orcamentos o JOIN clientes c ON o.cliente_id = c.id WHERE o.id = %s",
+                (orcamento_id,)
             )
-
-            # Formatação da data para o corpo do e-mail
-            data_formatada = datetime.strptime(data_evento, '%Y-%m-%dT%H:%M').strftime('%d/%m/%Y às %H:%M')
-            
-            # Corpo do e-mail com tabela de detalhes
-            msg.html = f"""
-            <h2 style="font-family: Arial, sans-serif; color: #333;">Olá, {cliente_nome}!</h2>
-            <p style="font-family: Arial, sans-serif; color: #555;">Segue abaixo o orçamento para o seu evento <strong>{nome_evento}</strong>, que ocorrerá em <strong>{data_formatada}</strong>.</p>
-
-            <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-             <thead style="background-color: #f8f9fa;">
-            <tr>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Produto/Kits</th>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Valor Unitário</th>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Quantidade</th>
-                <th style="padding: 10px; text-align: left; font-family: Arial, sans-serif; color: #333; border: 1px solid #ddd;">Valor Total</th>
-            </tr>
-            </thead>
-            <tbody>
-                  {itens_detalhados_email}
-            </tbody>
-            </table>
-
-             <hr style="border-top: 2px solid #ddd; margin-top: 20px;">
-
-             <h3 style="font-family: Arial, sans-serif; color: #333;">Resumo do Orçamento</h3>
-            <table style="width: 100%; border-collapse: collapse;">
-            <tr>
-                 <td style="padding: 10px; font-family: Arial, sans-serif; color: #333;">Valor Total dos Itens:</td>
-                 <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333;">R$ {valor_total_itens:.2f}</td>
-             </tr>
-             <tr>
-                 <td style="padding: 10px; font-family: Arial, sans-serif; color: #333;">Mão de Obra:</td>
-                 <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333;">R$ {mao_de_obra:.2f}</td>
-                </tr>
-             <tr>
-            <td style="padding: 10px; font-family: Arial, sans-serif; color: #333;">Frete:</td>
-            <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333;">R$ {frete:.2f}</td>
-        </tr>
-        <tr style="border-top: 2px solid #ddd;">
-            <td style="padding: 10px; font-family: Arial, sans-serif; color: #333; font-weight: bold;">Total Geral:</td>
-            <td style="padding: 10px; text-align: right; font-family: Arial, sans-serif; color: #333; font-weight: bold;">R$ {valor_total:.2f}</td>
-        </tr>
-    </table>
-
-    <div style="margin-top: 30px; text-align: center;">
-        <a href="{link_aprovacao}" style="background-color: #28a745; color: white; padding: 15px 25px; text-decoration: none; border-radius: 5px; font-size: 16px; font-family: Arial, sans-serif; font-weight: bold;">Aprovar Orçamento</a>
-    </div>
-
-    <p style="font-family: Arial, sans-serif; color: #555; margin-top: 20px;">Caso tenha alguma dúvida, não hesite em entrar em contato conosco. Aguardamos sua aprovação para seguir com o processo.</p>
-
-    <p style="font-family: Arial, sans-serif; color: #555;">Atenciosamente,</p>
-    <p style="font-family: Arial, sans-serif; color: #555;">Equipe de Gestão de Eventos</p>
-"""
-
-            # Envio do e-mail
-            mail.send(msg)
-            flash(f"Orçamento salvo e e-mail enviado para {cliente_email}!", 'success')
+            orcamento = cursor.fetchone()
+            assunto = f"Orçamento para seu evento: {nome_evento}"
+            corpo_html = renderizar_email_orcamento(cursor, orcamento, link_aprovacao, itens_resolvidos=itens_resolvidos)
+
+            # O e-mail vai para a outbox na mesma transação do orçamento: ou os dois são
+            # gravados, ou nenhum. O envio SMTP fica com o worker em segundo plano.
+            enfileirar_email(cursor, REMETENTE_EMAIL, cliente_email, assunto, corpo_html, orcamento_id)
+            registrar_atividade(cursor, ORCAMENTO_CRIADO, orcamento_id, f"Orçamento '{nome_evento}' enviado para {cliente['nome']}.")
+            db.commit()
+            outbox_worker.acordar()
+            flash(f"Orçamento salvo e e-mail colocado na fila de envio para {cliente_email}!", 'success')
 
         except Exception as e:
             db.rollback()
@@ -1894,12 +2041,11 @@ def orcamento_eventos():
     cursor = db.cursor(dictionary=True)
     cursor.execute("SELECT id, nome FROM clientes ORDER BY nome")
     clientes = cursor.fetchall()
-    cursor.execute("SELECT id, nome, quantidade_estoque, preco_repasse, tipo_material FROM estoque ORDER BY nome")
-    produtos = cursor.fetchall()
-    cursor.execute("SELECT id, nome, valor, status FROM kits WHERE status = 'disponivel' ORDER BY nome")
-    kits = cursor.fetchall()
+    produtos = consultar(cursor, [ESTOQUE], "SELECT id, nome, quantidade_estoque, preco_repasse, tipo_material FROM estoque ORDER BY nome")
+    kits = consultar(cursor, [KITS], "SELECT id, nome, valor, status, modelo FROM kits WHERE status = 'disponivel' ORDER BY nome")
+    capacidade = carregar(cursor, [ESTOQUE, KITS], "capacidade_kits", lambda: capacidade_kits(cursor))
     for kit in kits:
-        kit['estoque_disponivel'] = 1
+        kit['estoque_disponivel'] = capacidade.get(kit['id'], 0) if kit['modelo'] else 1
 
     # Consulta para carregar TODOS os orçamentos (pendentes, aprovados, etc.)
     # O status 'aprovado' é importante para a lista de acompanhamento.
@@ -1951,35 +2097,25 @@ def deletar_evento(evento_id):
         # Assim, remove todos os pagamentos parciais e totais, sem afetar outros eventos
         descricao_like = f"%Receita do evento: {nome_evento}%"
         observacao_like = f"%Pagamento%{evento_id}%"
+        cursor.execute("""
+            SELECT DISTINCT data FROM fluxo_caixa 
+            WHERE (descricao LIKE %s OR observacoes LIKE %s)
+            AND tipo = 'Receita'
+        """, (descricao_like, observacao_like))
+        datas_receita = [row['data'] for row in cursor.fetchall()]
         cursor.execute("""
             DELETE FROM fluxo_caixa 
             WHERE (descricao LIKE %s OR observacoes LIKE %s)
             AND tipo = 'Receita'
         """, (descricao_like, observacao_like))
+        recalcular_receita(cursor, datas_receita)  # Receita dos meses afetados, no resumo do painel
 
-        # 3. Excluir os itens do evento (produtos e kits) e devolver ao estoque
-        cursor.execute("""
-            SELECT material_id, kit_id, quantidade 
-            FROM montagem_materiais 
-            WHERE evento_id = %s
-        """, (evento_id,))
-        itens_do_evento = cursor.fetchall()
-
-        for item in itens_do_evento:
-            if item['material_id']:
-                # Devolver produtos ao estoque
-                cursor.execute("""
-                    UPDATE estoque 
-                    SET quantidade_estoque = quantidade_estoque + %s 
-                    WHERE id = %s
-                """, (item['quantidade'], item['material_id']))
-            elif item['kit_id']:
-                # Liberar kits associados ao evento
-                cursor.execute("""
-                    UPDATE kits 
-                    SET status = 'disponivel' 
-                    WHERE id = %s
-                """, (item['kit_id'],))
+        # 3. Excluir os itens do evento (produtos e kits) e devolver ao estoque.
+        # Devolver produtos consumidos, avulsos ou componentes de kits-modelo (aluguel e kits
+        # comuns não tiveram baixa: a reserva do período some junto com as linhas de montagem)
+        movimentar_estoque(cursor, [(item['material_id'], item['quantidade']) for item in materiais_do_evento(cursor, evento_id)
+                                    if item['tipo_material'] != 'aluguel'],
+                           EVENTO_EXCLUIDO, evento_id=evento_id)
 
         # 4. Excluir os registros de montagem de materiais
         cursor.execute("DELETE FROM montagem_materiais WHERE evento_id = %s", (evento_id,))
@@ -1991,6 +2127,7 @@ def deletar_evento(evento_id):
 
         # 6. Excluir o evento da tabela principal
         cursor.execute("DELETE FROM eventos WHERE id = %s", (evento_id,))
+        invalidar_catalogo(cursor, EVENTOS)
 
         # 7. Registrar log da exclusão completa
         descricao_log = (
@@ -1998,7 +2135,7 @@ def deletar_evento(evento_id):
             f"Orçamento associado: {orcamento_id if orcamento_id else 'N/A'}. "
             f"Pagamentos parciais e totais removidos do fluxo de caixa."
         )
-        registrar_log_atividade(db, 'EXCLUSAO', evento_id, descricao_log)
+        registrar_atividade(cursor, EXCLUSAO, evento_id, descricao_log)
 
         # Commit final
         db.commit()
@@ -2077,6 +2214,7 @@ def registrar_pagamento(evento_id):
             SET status_pagamento = %s, valor_pago = %s 
             WHERE id = %s
         """, (pagamento_status, novo_valor_pago, evento_id))
+        invalidar_catalogo(cursor, EVENTOS)
 
         # 🔹 Registra apenas a diferença no fluxo de caixa
         if valor_a_registrar > 0:
@@ -2090,6 +2228,9 @@ def registrar_pagamento(evento_id):
                 valor_a_registrar,
                 f"Pagamento {pagamento_status} do evento (ID {evento_id})."
             ))
+            registrar_lancamento(cursor, datetime.now(), "Receita", valor_a_registrar)
+            registrar_atividade(cursor, PAGAMENTO, evento_id,
+                                f"Pagamento {pagamento_status} de R$ {valor_a_registrar:.2f} no evento '{evento['nome_evento']}'.")
 
         db.commit()
         flash(f"Pagamento {pagamento_status} registrado com sucesso!", 'success')
@@ -2294,6 +2435,7 @@ def fluxo_caixa():
             cursor = db.cursor()
             cursor.execute("INSERT INTO fluxo_caixa (data, descricao, tipo, valor, observacoes) VALUES (%s, %s, %s, %s, %s)",
                            (data, descricao, tipo, valor, observacoes))
+            registrar_lancamento(cursor, data, tipo, valor)
             db.commit()
             cursor.close()
             flash("Transação cadastrada com sucesso!", 'success')
@@ -2434,12 +2576,9 @@ def montagem_evento():
             flash(f"Ocorreu um erro: {e}", 'error')
             
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT id, nome FROM estoque WHERE tipo_material = 'descartavel'")
-    materiais_descartaveis = cursor.fetchall()
-    cursor.execute("SELECT id, nome FROM estoque WHERE tipo_material = 'aluguel'")
-    materiais_aluguel = cursor.fetchall()
-    cursor.execute("SELECT id, nome FROM estoque WHERE tipo_material = 'venda'")
-    materiais_venda = cursor.fetchall()
+    materiais_descartaveis = consultar(cursor, [ESTOQUE], "SELECT id, nome FROM estoque WHERE tipo_material = 'descartavel'")
+    materiais_aluguel = consultar(cursor, [ESTOQUE], "SELECT id, nome FROM estoque WHERE tipo_material = 'aluguel'")
+    materiais_venda = consultar(cursor, [ESTOQUE], "SELECT id, nome FROM estoque WHERE tipo_material = 'venda'")
     cursor.execute("SELECT id, nome_evento FROM eventos")
     eventos = cursor.fetchall()
     cursor.execute("""
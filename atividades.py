@@ -0,0 +1,55 @@
+"""
+Feed de atividades do painel (dashboard e /api/atividades).
+
+O painel montava as últimas atividades com três consultas (logs de status, eventos
+pendentes e produtos recentes), juntava e ordenava em Python, e não mostrava pagamentos,
+orçamentos nem exclusões. Agora cada gravação registra a sua atividade em log_atividades,
+na mesma transação (registrar_atividade(), sem commit), e o feed é uma consulta só, mais
+recentes primeiro, por (data_log, id) decrescente no índice idx_log_atividades_data
+(migração 0017), continuando a partir do cursor da página anterior, como listar_eventos().
+"""
+from listagem_eventos import codificar_cursor, decodificar_cursor
+
+ATIVIDADES_POR_PAGINA = 10
+ATIVIDADES_POR_PAGINA_MAX = 100
+
+# Tipos registrados (coluna log_atividades.tipo)
+EVENTO_CRIADO = 'EVENTO_CRIADO'
+MUDANCA_STATUS_EVENTO = 'MUDANCA_STATUS_EVENTO'
+ORCAMENTO_CRIADO = 'ORCAMENTO_CRIADO'
+ORCAMENTO_APROVADO = 'ORCAMENTO_APROVADO'
+PAGAMENTO = 'PAGAMENTO'
+CADASTRO_PRODUTO = 'CADASTRO_PRODUTO'
+CADASTRO_KIT = 'CADASTRO_KIT'
+CADASTRO_CLIENTE = 'CADASTRO_CLIENTE'
+EXCLUSAO = 'EXCLUSAO'
+
+
+def registrar_atividade(cursor, tipo, id_referencia, descricao):
+    """Registra uma atividade dentro da transação de quem grava (não faz commit)."""
+    cursor.execute("INSERT INTO log_atividades (tipo, id_referencia, descricao) VALUES (%s, %s, %s)",
+                   (tipo, id_referencia, descricao))
+
+
+def listar_atividades(cursor, apos=None, limite=ATIVIDADES_POR_PAGINA):
+    """
+    Uma página do feed, mais recentes primeiro. `apos` é o cursor devolvido pela página
+    anterior. Retorna {'itens': [{'id', 'tipo', 'id_referencia', 'descricao', 'data_criacao'}],
+    'proximo': cursor da próxima página ou None}.
+    """
+    limite = max(1, min(int(limite), ATIVIDADES_POR_PAGINA_MAX))
+    where, params = "", ()
+    if apos:
+        data, id_atividade = decodificar_cursor(apos)
+        where = "WHERE data_log <= %s AND (data_log < %s OR (data_log = %s AND id < %s))"
+        params = (data, data, data, id_atividade)
+    cursor.execute(f"""
+        SELECT id, tipo, id_referencia, descricao, data_log AS data_criacao
+        FROM log_atividades
+        {where}
+        ORDER BY data_log DESC, id DESC
+        LIMIT %s
+    """, params + (limite + 1,))
+    itens = cursor.fetchall()
+    proximo = codificar_cursor(itens[limite - 1], 'data_criacao') if len(itens) > limite else None
+    return {'itens': itens[:limite], 'proximo': proximo}
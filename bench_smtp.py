@@ -0,0 +1,129 @@
+"""
+Mede a vazão de envio de e-mails: uma sessão SMTP nova por mensagem (como o Flask-Mail
+fazia a cada mail.send) contra a sessão reaproveitada do SMTPConnectionManager.
+
+Sem --servidor, sobe um servidor SMTP de descarte dentro do próprio processo; use
+--latencia-ms para simular o custo de abrir a sessão (TCP + TLS + EHLO num servidor
+remoto). Com --servidor/--porta, mede contra um servidor de verdade (cuidado: envia
+as mensagens para --para).
+
+Uso:
+    python bench_smtp.py --mensagens 200 --latencia-ms 80
+    python bench_smtp.py --servidor localhost --porta 1025 --para teste@exemplo.com
+"""
+import socketserver
+import sys
+import threading
+import time
+
+from outbox import SMTPConnectionManager, montar_mensagem
+
+
+# --------------------------------------------------------------------------------
+# SERVIDOR SMTP DE DESCARTE (aceita tudo, não entrega nada)
+# --------------------------------------------------------------------------------
+class _SessaoDescarte(socketserver.StreamRequestHandler):
+    def _responder(self, linha):
+        self.wfile.write(linha.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        # A latência simula o custo de estabelecer a sessão (RTT + handshakes)
+        time.sleep(self.server.latencia)
+        self._responder("220 descarte ESMTP")
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            comando = linha.decode('ascii', 'replace').strip().upper()
+            if comando.startswith(('EHLO', 'HELO')):
+                self._responder("250-descarte")
+                self._responder("250 8BITMIME")
+            elif comando == 'DATA':
+                self._responder("354 fim com <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.recebidas += 1
+                self._responder("250 OK")
+            elif comando == 'QUIT':
+                self._responder("221 tchau")
+                return
+            else:  # MAIL, RCPT, NOOP, RSET
+                self._responder("250 OK")
+
+
+class ServidorDescarte(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latencia_ms=0):
+        super().__init__(('127.0.0.1', 0), _SessaoDescarte)
+        self.latencia = latencia_ms / 1000
+        self.recebidas = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def porta(self):
+        return self.server_address[1]
+
+
+# --------------------------------------------------------------------------------
+# MEDIÇÃO
+# --------------------------------------------------------------------------------
+def _mensagens(n, destinatario):
+    corpo = "<p>Orçamento de teste</p>" + "<tr><td>Item</td><td>R$ 10.00</td></tr>" * 20
+    return [montar_mensagem({'assunto': f"Teste de vazão {i}", 'remetente': "bench@exemplo.com",
+                             'destinatario': destinatario, 'corpo_html': corpo}) for i in range(n)]
+
+
+def medir(config, mensagens, reaproveitar, lote):
+    """Envia `mensagens` em lotes de `lote`; retorna (segundos, falhas, stats)."""
+    smtp = SMTPConnectionManager()
+    falhas = 0
+    inicio = time.perf_counter()
+    try:
+        for i in range(0, len(mensagens), lote):
+            if reaproveitar:
+                resultados = smtp.enviar(config, mensagens[i:i + lote])
+            else:
+                resultados = []
+                for msg in mensagens[i:i + lote]:
+                    resultados += smtp.enviar(config, [msg])
+                    smtp.fechar()  # Uma sessão por mensagem
+            falhas += sum(1 for _, erro in resultados if erro is not None)
+    finally:
+        smtp.fechar()
+    return time.perf_counter() - inicio, falhas, smtp.stats()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vazão de envio SMTP: sessão por mensagem x sessão reaproveitada.")
+    parser.add_argument('--mensagens', type=int, default=100)
+    parser.add_argument('--lote', type=int, default=20, help="Mensagens por lote do worker.")
+    parser.add_argument('--latencia-ms', type=float, default=50, help="Custo simulado de abrir a sessão (servidor local).")
+    parser.add_argument('--servidor', help="Servidor SMTP real (padrão: servidor de descarte no processo).")
+    parser.add_argument('--porta', type=int, default=25)
+    parser.add_argument('--ssl', action='store_true')
+    parser.add_argument('--usuario')
+    parser.add_argument('--senha')
+    parser.add_argument('--para', default="destino@exemplo.com")
+    args = parser.parse_args(argv)
+
+    if args.servidor:
+        config = {'servidor': args.servidor, 'porta': args.porta, 'ssl': args.ssl,
+                  'usuario': args.usuario, 'senha': args.senha}
+    else:
+        descarte = ServidorDescarte(args.latencia_ms)
+        config = {'servidor': '127.0.0.1', 'porta': descarte.porta, 'ssl': False}
+
+    mensagens = _mensagens(args.mensagens, args.para)
+    for rotulo, reaproveitar in (("sessão por mensagem", False), ("sessão reaproveitada", True)):
+        segundos, falhas, stats = medir(config, mensagens, reaproveitar, args.lote)
+        print(f"{rotulo:22s} {len(mensagens) / segundos:8.1f} msg/s  ({segundos:.2f} s, "
+              f"{stats['sessoes']} sessões, {falhas} falhas)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Cache em memória do catálogo (produtos, kits e tabela de preços).
+
+As telas de eventos, orçamentos, kits, estoque, montagem e preços releem as mesmas listas
+a cada carregamento, mas o catálogo muda poucas vezes por dia. Cada lista fica em cache
+identificada pelas versões das tabelas de que depende (tabela versoes, migração 0008):
+  - quem grava chama invalidar_catalogo(cursor, 'estoque' | 'kits' | 'precos') na mesma
+    transação da alteração (movimentar_estoque() já faz isso para o estoque). A versão só
+    muda para os outros quando a transação é confirmada; um rollback desfaz o incremento;
+  - quem lê faz uma consulta às versões (uma linha por tabela, lida de novo no máximo a cada
+    CATALOGO_VERSAO_TTL segundos) e reaproveita a lista se as versões forem as mesmas.
+Assim vários processos (workers) ficam coerentes sem se comunicar: um worker enxerga a
+alteração feita em outro em até CATALOGO_VERSAO_TTL segundos; no próprio processo, logo na
+requisição seguinte. Entradas saem do cache por LRU ou depois de CATALOGO_CACHE_TTL segundos.
+
+A versão 'eventos' (migração 0013) segue a mesma regra para a agenda: quem grava um evento
+a incrementa, e os feeds de calendário a usam como ETag (versao_atual()).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CATALOGO_CACHE_TAMANHO = int(os.getenv('CATALOGO_CACHE_TAMANHO', 64))    # Consultas mantidas em cache
+CATALOGO_CACHE_TTL = float(os.getenv('CATALOGO_CACHE_TTL', 600))         # Segundos de vida de uma entrada
+CATALOGO_VERSAO_TTL = float(os.getenv('CATALOGO_VERSAO_TTL', 2))         # Segundos entre leituras das versões
+
+ESTOQUE = 'estoque'
+KITS = 'kits'
+PRECOS = 'precos'
+EVENTOS = 'eventos'
+
+
+class CatalogCache:
+    """LRU thread-safe com validade por entrada e versões das tabelas lidas do banco."""
+
+    def __init__(self, tamanho=CATALOGO_CACHE_TAMANHO, ttl=CATALOGO_CACHE_TTL, ttl_versao=CATALOGO_VERSAO_TTL):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.ttl_versao = ttl_versao
+        self._itens = OrderedDict()   # chave -> (expira_em, valor)
+        self._versoes = {}
+        self._versoes_lidas_em = None
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.leituras_versao = 0
+
+    def versoes(self, cursor):
+        """{tabela: versão}, relido do banco se a leitura anterior tiver mais de ttl_versao segundos."""
+        with self._lock:
+            if self._versoes_lidas_em is not None and time.monotonic() - self._versoes_lidas_em < self.ttl_versao:
+                return self._versoes
+        cursor.execute("SELECT nome, versao FROM versoes")
+        versoes = {row['nome']: row['versao'] for row in cursor.fetchall()}
+        with self._lock:
+            self._versoes, self._versoes_lidas_em = versoes, time.monotonic()
+            self.leituras_versao += 1
+        return versoes
+
+    def expirar_versoes(self):
+        """Força a releitura das versões na próxima consulta (depois de uma gravação neste processo)."""
+        with self._lock:
+            self._versoes_lidas_em = None
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > time.monotonic():
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[1]
+            if item is not None:
+                del self._itens[chave]
+            self.faltas += 1
+            return None
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._versoes_lidas_em = None
+
+    def stats(self):
+        with self._lock:
+            return {'itens': len(self._itens), 'tamanho': self.tamanho, 'ttl': self.ttl,
+                    'acertos': self.acertos, 'faltas': self.faltas,
+                    'leituras_versao': self.leituras_versao, 'versoes': dict(self._versoes)}
+
+
+_cache = CatalogCache()
+
+def cache_stats():
+    return _cache.stats()
+
+
+def invalidar_catalogo(cursor, *tabelas):
+    """
+    Incrementa a versão das tabelas alteradas, dentro da transação de quem grava (não faz
+    commit). A linha de versoes fica travada até o commit, o que serializa as gravações do
+    catálogo entre si, mas não as leituras.
+    """
+    tabelas = sorted(set(tabelas))
+    cursor.execute(
+        f"UPDATE versoes SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP "
+        f"WHERE nome IN ({', '.join(['%s'] * len(tabelas))})",
+        tuple(tabelas)
+    )
+    _cache.expirar_versoes()
+
+
+def versao_atual(cursor, tabela):
+    """Versão de `tabela` vista por este processo (a mesma usada pelas chaves do cache)."""
+    return _cache.versoes(cursor).get(tabela)
+
+
+def ultima_alteracao(cursor, tabela):
+    """(versão, atualizado_em) de `tabela` lidos agora do banco, sem o atraso de CATALOGO_VERSAO_TTL."""
+    cursor.execute("SELECT versao, atualizado_em FROM versoes WHERE nome = %s", (tabela,))
+    row = cursor.fetchone()
+    return (row['versao'], row['atualizado_em']) if row else (None, None)
+
+
+def carregar(cursor, tabelas, chave, funcao):
+    """
+    Valor de `funcao()` em cache para a versão atual de `tabelas`. O valor é compartilhado
+    entre requisições: quem o recebe não deve alterá-lo (consultar() já devolve cópias).
+    """
+    versoes = _cache.versoes(cursor)
+    chave_versionada = (chave, tuple((tabela, versoes.get(tabela)) for tabela in sorted(tabelas)))
+    valor = _cache.get(chave_versionada)
+    if valor is None:
+        valor = _cache.set(chave_versionada, funcao())
+    return valor
+
+
+def consultar(cursor, tabelas, sql, params=()):
+    """fetchall() de `sql` em cache para a versão atual de `tabelas`; cada chamada recebe cópias das linhas."""
+    def executar():
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    return [dict(row) for row in carregar(cursor, tabelas, ('sql', sql, tuple(params)), executar)]
@@ -0,0 +1,274 @@
+"""
+Resolução do catálogo (produtos do estoque e kits) para carrinhos de orçamento/evento.
+
+Um carrinho é uma lista de itens {id, tipo, quantidade}, onde tipo é 'produto' (tabela
+estoque) ou 'kit' (tabela kits). resolver_itens() busca o carrinho inteiro com no máximo
+duas consultas IN (...) (uma por tabela), em vez de um SELECT por item.
+
+Os itens de um orçamento ficam em orcamento_itens, com nome e preço fotografados no
+momento do orçamento (gravar_itens_orcamento / itens_do_orcamento); os de um evento, em
+montagem_materiais (gravar_materiais_evento), sempre com um executemany só.
+
+listar_estoque() pagina a listagem do estoque por cursor (keyset: id < último id visto),
+com filtros por tipo_material/unidade_medida e busca por prefixo do nome.
+
+Kits-modelo (kits.modelo) não têm peças separadas: componentes_de_modelos() traz a receita
+de cada um e capacidade_kits() quantos cabem no estoque atual, numa consulta agregada.
+"""
+from decimal import Decimal
+
+TIPO_PRODUTO = 'produto'
+TIPO_KIT = 'kit'
+
+ESTOQUE_POR_PAGINA = 50
+ESTOQUE_POR_PAGINA_MAX = 200
+
+
+def _buscar_por_ids(cursor, sql, ids):
+    """Executa `sql` (com um '{in}' para a lista de ids) e indexa o resultado por id."""
+    if not ids:
+        return {}
+    in_clause = ', '.join(['%s'] * len(ids))
+    cursor.execute(sql.format(**{'in': in_clause}), tuple(ids))
+    return {row['id']: row for row in cursor.fetchall()}
+
+
+def resolver_itens(cursor, itens):
+    """
+    Resolve os itens de um carrinho. `cursor` precisa ser um cursor de dicionário.
+
+    Retorna uma lista na mesma ordem de `itens`, com cada item acrescido de:
+      - encontrado: False se o produto/kit não existe mais
+      - nome, valor_unitario (Decimal), valor_total_item (valor_unitario * quantidade)
+      - quantidade_estoque e tipo_material (produtos) ou status e modelo (kits); None no outro tipo
+      - disponivel: produto com estoque suficiente ou kit com status 'disponivel'
+        (para kits-modelo, a conferência dos componentes fica com disponibilidade_carrinho)
+    """
+    ids_produtos = sorted({int(item['id']) for item in itens if item['tipo'] == TIPO_PRODUTO})
+    ids_kits = sorted({int(item['id']) for item in itens if item['tipo'] == TIPO_KIT})
+
+    produtos = _buscar_por_ids(
+        cursor, "SELECT id, nome, preco_repasse, quantidade_estoque, tipo_material FROM estoque WHERE id IN ({in})", ids_produtos)
+    kits = _buscar_por_ids(
+        cursor, "SELECT id, nome, valor, status, modelo FROM kits WHERE id IN ({in})", ids_kits)
+
+    resolvidos = []
+    for item in itens:
+        item_id = int(item['id'])
+        quantidade = item['quantidade']
+        resolvido = {**item, 'encontrado': False, 'nome': None, 'valor_unitario': Decimal(0),
+                     'quantidade_estoque': None, 'tipo_material': None, 'status': None, 'modelo': None,
+                     'disponivel': False}
+
+        if item['tipo'] == TIPO_PRODUTO and item_id in produtos:
+            produto = produtos[item_id]
+            resolvido.update(
+                encontrado=True,
+                nome=produto['nome'],
+                valor_unitario=Decimal(produto['preco_repasse']),
+                quantidade_estoque=produto['quantidade_estoque'],
+                tipo_material=produto['tipo_material'],
+                disponivel=quantidade <= produto['quantidade_estoque'],
+            )
+        elif item['tipo'] == TIPO_KIT and item_id in kits:
+            kit = kits[item_id]
+            resolvido.update(
+                encontrado=True,
+                nome=kit['nome'],
+                valor_unitario=Decimal(kit['valor']),
+                status=kit['status'],
+                modelo=bool(kit['modelo']),
+                disponivel=kit['status'] == 'disponivel',
+            )
+
+        resolvido['valor_total_item'] = resolvido['valor_unitario'] * quantidade
+        resolvidos.append(resolvido)
+    return resolvidos
+
+
+def nome_do_item(item, sufixo="Inválido"):
+    """Nome para exibição; itens removidos do catálogo aparecem como 'ITEM ID n (TIPO) (sufixo)'."""
+    if item.get('nome'):
+        return item['nome']
+    return f"ITEM ID {item['id']} ({str(item['tipo']).upper()}) ({sufixo})"
+
+
+def primeiro_indisponivel(itens_resolvidos):
+    """Primeiro item sem estoque suficiente / kit fora de 'disponivel' (ou removido), ou None."""
+    for item in itens_resolvidos:
+        if item['tipo'] in (TIPO_PRODUTO, TIPO_KIT) and not item['disponivel']:
+            return item
+    return None
+
+
+# --------------------------------------------------------------------------------
+# KITS-MODELO
+# --------------------------------------------------------------------------------
+def componentes_de_modelos(cursor, kit_ids):
+    """
+    Receita dos kits-modelo entre `kit_ids` (os kits comuns ficam de fora), numa consulta:
+    {kit_id: [{'material_id', 'quantidade', 'nome', 'tipo_material', 'quantidade_estoque'}]}.
+    """
+    if not kit_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT ki.kit_id, ki.material_id, ki.quantidade, e.nome, e.tipo_material, e.quantidade_estoque
+        FROM kits k
+        JOIN kit_itens ki ON ki.kit_id = k.id
+        JOIN estoque e ON e.id = ki.material_id
+        WHERE k.id IN ({', '.join(['%s'] * len(kit_ids))}) AND k.modelo = TRUE
+        ORDER BY ki.kit_id, ki.material_id
+    """, tuple(kit_ids))
+    modelos = {}
+    for row in cursor.fetchall():
+        modelos.setdefault(row['kit_id'], []).append({k: row[k] for k in row if k != 'kit_id'})
+    return modelos
+
+
+def capacidade_kits(cursor):
+    """
+    {kit_id: quantos kits-modelo disponíveis dá para montar com o estoque atual}: o menor
+    FLOOR(quantidade_estoque / quantidade no kit) entre os componentes, para todos os kits
+    numa única consulta agregada. Não desconta reservas de aluguel por período.
+    """
+    cursor.execute("""
+        SELECT ki.kit_id, MIN(FLOOR(e.quantidade_estoque / ki.quantidade)) AS capacidade
+        FROM kit_itens ki
+        JOIN kits k ON k.id = ki.kit_id
+        JOIN estoque e ON e.id = ki.material_id
+        WHERE k.modelo = TRUE AND k.status = 'disponivel' AND ki.quantidade > 0
+        GROUP BY ki.kit_id
+    """)
+    return {row['kit_id']: max(int(row['capacidade'] or 0), 0) for row in cursor.fetchall()}
+
+
+# --------------------------------------------------------------------------------
+# ITENS DO ORÇAMENTO (tabela orcamento_itens)
+# --------------------------------------------------------------------------------
+def gravar_itens_orcamento(cursor, orcamento_id, itens_resolvidos):
+    """
+    Grava os itens de um orçamento com nome e preço fotografados (saída de resolver_itens).
+    Itens de tipo desconhecido ou que não estão no catálogo são ignorados.
+    """
+    linhas = [
+        (orcamento_id, posicao, item['tipo'],
+         item['id'] if item['tipo'] == TIPO_PRODUTO else None,
+         item['id'] if item['tipo'] == TIPO_KIT else None,
+         item['nome'], item['quantidade'], item['valor_unitario'])
+        for posicao, item in enumerate(itens_resolvidos)
+        if item['tipo'] in (TIPO_PRODUTO, TIPO_KIT) and item['encontrado']
+    ]
+    if linhas:
+        cursor.executemany(
+            "INSERT INTO orcamento_itens (orcamento_id, posicao, tipo, material_id, kit_id, nome, quantidade, valor_unitario) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            linhas
+        )
+
+
+def itens_do_orcamento(cursor, orcamento_id):
+    """
+    Itens de um orçamento numa única consulta (orcamento_itens + estoque + kits), no mesmo
+    formato de resolver_itens(): nome e valor_unitario são os do momento do orçamento;
+    quantidade_estoque/status e disponivel refletem o catálogo atual.
+    """
+    cursor.execute("""
+        SELECT oi.tipo, oi.material_id, oi.kit_id, oi.nome, oi.quantidade, oi.valor_unitario,
+               e.id AS estoque_id, e.quantidade_estoque, k.id AS kits_id, k.status
+        FROM orcamento_itens oi
+        LEFT JOIN estoque e ON e.id = oi.material_id
+        LEFT JOIN kits k ON k.id = oi.kit_id
+        WHERE oi.orcamento_id = %s
+        ORDER BY oi.posicao
+    """, (orcamento_id,))
+
+    itens = []
+    for row in cursor.fetchall():
+        valor_unitario = Decimal(row['valor_unitario'])
+        if row['tipo'] == TIPO_PRODUTO:
+            item_id, encontrado = row['material_id'], row['estoque_id'] is not None
+            disponivel = encontrado and row['quantidade'] <= row['quantidade_estoque']
+        else:
+            item_id, encontrado = row['kit_id'], row['kits_id'] is not None
+            disponivel = encontrado and row['status'] == 'disponivel'
+        itens.append({
+            'id': item_id,
+            'tipo': row['tipo'],
+            'quantidade': row['quantidade'],
+            'encontrado': encontrado,
+            'nome': row['nome'],
+            'valor_unitario': valor_unitario,
+            'valor_total_item': valor_unitario * row['quantidade'],
+            'quantidade_estoque': row['quantidade_estoque'],
+            'status': row['status'],
+            'disponivel': disponivel,
+        })
+    return itens
+
+
+# --------------------------------------------------------------------------------
+# MATERIAIS DO EVENTO (tabela montagem_materiais)
+# --------------------------------------------------------------------------------
+def gravar_materiais_evento(cursor, evento_id, itens_resolvidos):
+    """
+    Grava os itens do carrinho como materiais do evento, num único executemany, com o
+    valor_unitario de cada item (saída de resolver_itens ou itens_do_orcamento).
+    Itens de tipo desconhecido ou que não estão no catálogo são ignorados.
+    """
+    linhas = [
+        (evento_id,
+         item['id'] if item['tipo'] == TIPO_PRODUTO else None,
+         item['id'] if item['tipo'] == TIPO_KIT else None,
+         item['quantidade'], item['valor_unitario'])
+        for item in itens_resolvidos
+        if item['tipo'] in (TIPO_PRODUTO, TIPO_KIT) and item['encontrado']
+    ]
+    if linhas:
+        cursor.executemany(
+            "INSERT INTO montagem_materiais (evento_id, material_id, kit_id, quantidade, valor_item) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            linhas
+        )
+
+
+def _escapar_like(texto):
+    return texto.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+def listar_estoque(cursor, apos=None, limite=ESTOQUE_POR_PAGINA, tipo_material=None, unidade_medida=None, busca=None):
+    """
+    Uma página do estoque, mais recentes primeiro. `apos` é o cursor devolvido pela página
+    anterior (o último id visto): a consulta continua do índice a partir dele, sem OFFSET.
+    `busca` é um prefixo do nome (os nomes são gravados em minúsculas), resolvido no índice
+    único de estoque.nome. Retorna {'itens': [...], 'proximo': cursor da próxima página ou None}.
+    """
+    limite = max(1, min(int(limite), ESTOQUE_POR_PAGINA_MAX))
+    filtros, params = [], []
+    if apos is not None:
+        filtros.append("id < %s")
+        params.append(int(apos))
+    if tipo_material:
+        filtros.append("tipo_material = %s")
+        params.append(tipo_material)
+    if unidade_medida:
+        filtros.append("unidade_medida = %s")
+        params.append(unidade_medida)
+    busca = (busca or '').strip().lower()
+    if busca:
+        # O limite inferior deixa o SQLite usar o índice também (o LIKE sozinho, não)
+        filtros.append("nome >= %s AND nome LIKE %s ESCAPE '!'")
+        params += [busca, _escapar_like(busca) + '%']
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    cursor.execute(f"""
+        SELECT id, nome, tipo_material, unidade_medida, COALESCE(quantidade_venda, 0) AS quantidade_venda,
+               quantidade_estoque, preco_compra, preco_repasse, foto_path, data_cadastro
+        FROM estoque {where}
+        ORDER BY id DESC
+        LIMIT %s
+    """, tuple(params) + (limite + 1,))
+    itens = cursor.fetchall()
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo = itens[-1]['id']
+    return {'itens': itens, 'proximo': proximo}
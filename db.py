@@ -1,8 +1,20 @@
+import importlib.util
 import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 from dotenv import load_dotenv
 import mysql.connector
-from flask import g
+from flask import g, request
+from markupsafe import escape
 from mysql.connector import Error, errorcode
+from mysql.connector import errors as mysql_errors
 import bcrypt
 
 # Carregar as variáveis de ambiente do arquivo .env
@@ -32,242 +44,932 @@ MYSQL_CONFIG = {
     'port': DB_PORT
 }
 
+def _env_bool(nome, padrao):
+    """Lê uma variável de ambiente booleana ('1', 'true', 'sim' = verdadeiro)."""
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ('1', 'true', 'sim', 'yes', 'on')
+
+# Configurações do pool de conexões (dimensione de acordo com o número de workers/threads)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))                   # Conexões mantidas abertas
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))  # Conexões extras em picos (fechadas ao devolver)
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))          # Segundos aguardando uma conexão livre
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))  # Conexões ociosas além disso são recicladas
+DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)             # Testa a conexão antes de entregá-la
+DB_POOL_RESET_SESSION = _env_bool('DB_POOL_RESET_SESSION', True)   # Limpa a sessão (variáveis, transação) ao devolver
+
+# Instrumentação de SQL por requisição
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv('DB_N_PLUS_ONE_THRESHOLD', 5))  # Repetições do mesmo formato que geram aviso
+DB_DEBUG_PANEL = _env_bool('DB_DEBUG_PANEL', False)  # Injeta o painel de SQL nas páginas HTML (só em desenvolvimento)
+
+# Backend de banco de dados: 'mysql' (produção) ou 'sqlite' (embutido, para testes de carga/benchmarks)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').strip().lower()
+# Caminho do arquivo SQLite; use ':memory:' para um banco em memória compartilhado pelo processo
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{DB_NAME}.sqlite3'))
+
 # --------------------------------------------------------------------------------
-# DDL (Data Definition Language) - Esquema de Criação das Tabelas
+# BACKENDS DE BANCO DE DADOS
 # --------------------------------------------------------------------------------
-# A ordem é importante para respeitar as chaves estrangeiras.
-TABLES = {}
-
-# 1. Tabela: users
-TABLES['users'] = """
-CREATE TABLE users (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    username VARCHAR(80) NOT NULL UNIQUE,
-    password VARCHAR(255) NOT NULL, -- Armazena o hash bcrypt
-    role ENUM('admin', 'user') DEFAULT 'user' NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+# O restante do sistema fala o dialeto do MySQL (paramstyle %s, cursores dictionary=True,
+# erros de mysql.connector). O backend SQLite traduz esse dialeto na hora da execução.
 
-# 2. Tabela: clientes
-TABLES['clientes'] = """
-CREATE TABLE clientes (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    nome VARCHAR(255) NOT NULL,
-    telefone VARCHAR(20),
-    email VARCHAR(255) NOT NULL UNIQUE, -- Garante que cada cliente tenha um e-mail único
-    cpf VARCHAR(11) NOT NULL UNIQUE,
-    cep VARCHAR(8),
-    endereco VARCHAR(255),
-    bairro VARCHAR(100),
-    cidade VARCHAR(100),
-    uf VARCHAR(2),
-    numero VARCHAR(20),
-    complemento VARCHAR(255),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+class MySQLBackend:
+    """Servidor MySQL definido em MYSQL_CONFIG."""
+    nome = 'mysql'
 
-# 3. Tabela: configuracoes_email
-TABLES['configuracoes_email'] = """
-CREATE TABLE configuracoes_email (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    email VARCHAR(255) NOT NULL,
-    codigo_app VARCHAR(255) NOT NULL, -- Código/Senha de App do Gmail
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+    def connect(self):
+        return mysql.connector.connect(**MYSQL_CONFIG)
 
-# 4. Tabela: estoque
-TABLES['estoque'] = """
-CREATE TABLE estoque (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    nome VARCHAR(255) NOT NULL UNIQUE,
-    tipo_material ENUM('descartavel', 'aluguel', 'venda', 'kit_componente') NOT NULL,
-    unidade_medida VARCHAR(50) DEFAULT 'unidade',
-    quantidade_venda DECIMAL(10, 2), -- Quantidade em uma unidade de medida maior (ex: unidades em uma caixa)
-    quantidade_estoque DECIMAL(10, 2) NOT NULL,
-    preco_compra DECIMAL(10, 2) NOT NULL,
-    preco_repasse DECIMAL(10, 2) NOT NULL, -- Preço de venda/aluguel para o cliente
-    foto_path VARCHAR(255),
-    data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+    def ping(self, cnx):
+        cnx.ping(reconnect=False)
+        return True
 
-# 5. Tabela: kits
-TABLES['kits'] = """
-CREATE TABLE kits (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    nome VARCHAR(255) NOT NULL UNIQUE,
-    valor DECIMAL(10, 2) NOT NULL, -- Preço de repasse do kit
-    foto_path VARCHAR(255),
-    status ENUM('disponivel', 'em_uso', 'manutencao') DEFAULT 'disponivel' NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+    def reset(self, cnx, full=True):
+        """Desfaz qualquer transação pendente e, se `full`, reseta a sessão (COM_RESET_CONNECTION)."""
+        if not cnx.is_connected():
+            raise Error("Conexão perdida.")
+        if full:
+            cnx.reset_session()
+        else:
+            # Sem o reset completo, ao menos encerra a transação (e o snapshot) da requisição anterior
+            cnx.rollback()
 
-# 6. Tabela: kit_itens
-TABLES['kit_itens'] = """
-CREATE TABLE kit_itens (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    kit_id INT NOT NULL,
-    material_id INT NOT NULL, -- Componente do kit (referência à tabela 'estoque')
-    quantidade DECIMAL(10, 2) NOT NULL,
-    FOREIGN KEY (kit_id) REFERENCES kits(id) ON DELETE CASCADE,
-    FOREIGN KEY (material_id) REFERENCES estoque(id) ON DELETE RESTRICT, -- RESTRICT para evitar a exclusão de um produto que está em um kit
-    UNIQUE KEY uk_kit_material (kit_id, material_id) -- Garante que um kit não tenha o mesmo material duas vezes
-) ENGINE=InnoDB;
-"""
+    def pool_options(self):
+        return {}
 
-# 7. Tabela: orcamentos
-TABLES['orcamentos'] = """
-CREATE TABLE orcamentos (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    cliente_id INT NOT NULL,
-    nome_evento VARCHAR(255) NOT NULL,
-    tipo_evento VARCHAR(100),
-    data_evento DATETIME NOT NULL,
-    recolhimento_evento DATETIME,
-    observacoes TEXT,
-    valor_total DECIMAL(10, 2) NOT NULL,
-    mao_de_obra DECIMAL(10, 2) DEFAULT 0.00,
-    frete DECIMAL(10, 2) DEFAULT 0.00,
-    itens_json JSON NOT NULL, -- Armazena os itens selecionados como JSON
-    token VARCHAR(36) NOT NULL UNIQUE, -- Token de aprovação por e-mail
-    status ENUM('Pendente', 'Aprovado', 'Recusado') DEFAULT 'Pendente' NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE RESTRICT
-) ENGINE=InnoDB;
-"""
+    def garantir_banco(self):
+        """Cria o banco de dados se não existir (conexão sem o nome do DB)."""
+        cnx = mysql.connector.connect(**MYSQL_ROOT_CONFIG)
+        try:
+            cursor = cnx.cursor()
+            # Usa utf8mb4 e utf8mb4_unicode_ci para garantir suporte a emojis e caracteres complexos
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+            cursor.close()
+        finally:
+            cnx.close()
 
-# 8. Tabela: eventos
-TABLES['eventos'] = """
-CREATE TABLE eventos (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    orcamento_id INT UNIQUE, -- Link para o orçamento que gerou este evento (OPCIONAL, pode ser NULL)
-    cliente_id INT NOT NULL,
-    nome_evento VARCHAR(255) NOT NULL,
-    tipo_evento VARCHAR(100),
-    data_evento DATETIME NOT NULL,
-    recolhimento_evento DATETIME,
-    observacoes TEXT,
-    valor_total DECIMAL(10, 2) NOT NULL,
-    valor_pago DECIMAL(10, 2) DEFAULT 0.00, -- Novo campo para rastrear o total pago
-    mao_de_obra DECIMAL(10, 2) DEFAULT 0.00,
-    frete DECIMAL(10, 2) DEFAULT 0.00,
-    status ENUM('Pendente', 'Confirmado', 'Em Montagem', 'Finalizado', 'Finalização Parcial') DEFAULT 'Confirmado' NOT NULL,
-    status_pagamento ENUM('Pendente', 'Parcial', 'Total') DEFAULT 'Pendente' NOT NULL,
-    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE RESTRICT,
-    FOREIGN KEY (orcamento_id) REFERENCES orcamentos(id) ON DELETE SET NULL -- Se o orçamento for deletado, a chave externa é zerada
-) ENGINE=InnoDB;
-"""
+    @contextmanager
+    def lock_migracao(self, cnx):
+        """Lock nomeado do servidor (GET_LOCK): vale entre todos os processos conectados."""
+        cursor = cnx.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError(f"Não foi possível obter o lock de migração '{MIGRATION_LOCK_NAME}'.")
+            try:
+                yield
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+                cursor.fetchone()
+        finally:
+            cursor.close()
 
-# 9. Tabela: montagem_materiais
-TABLES['montagem_materiais'] = """
-CREATE TABLE montagem_materiais (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    evento_id INT NOT NULL,
-    material_id INT, -- ID do produto da tabela 'estoque' (para produtos avulsos)
-    kit_id INT, -- ID do kit da tabela 'kits' (para kits)
-    quantidade DECIMAL(10, 2) NOT NULL,
-    valor_item DECIMAL(10, 2), -- Valor do item no momento do cadastro do evento (para histórico)
-    FOREIGN KEY (evento_id) REFERENCES eventos(id) ON DELETE CASCADE,
-    FOREIGN KEY (material_id) REFERENCES estoque(id) ON DELETE RESTRICT,
-    FOREIGN KEY (kit_id) REFERENCES kits(id) ON DELETE RESTRICT,
-    -- Uma restrição para garantir que haja apenas material_id OU kit_id, mas não ambos.
-    CONSTRAINT chk_material_or_kit CHECK (
-        (material_id IS NULL AND kit_id IS NOT NULL) OR 
-        (material_id IS NOT NULL AND kit_id IS NULL)
-    )
-) ENGINE=InnoDB;
-"""
 
-# 10. Tabela: fluxo_caixa
-TABLES['fluxo_caixa'] = """
-CREATE TABLE fluxo_caixa (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    data DATE NOT NULL,
-    descricao VARCHAR(255) NOT NULL,
-    tipo ENUM('Receita', 'Despesa') NOT NULL,
-    valor DECIMAL(10, 2) NOT NULL,
-    observacoes TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+# -- SQLite: conversões de tipos ---------------------------------------------------
 
-# 11. Tabela: log_atividades
-TABLES['log_atividades'] = """
-CREATE TABLE log_atividades (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    tipo VARCHAR(50) NOT NULL, -- Ex: MUDANCA_STATUS_EVENTO, EXCLUSAO, CADASTRO_PRODUTO
-    id_referencia INT, -- ID do registro (evento, produto, etc.) que foi alterado (pode ser NULL)
-    descricao TEXT NOT NULL,
-    data_log TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-) ENGINE=InnoDB;
-"""
+def _converter_datetime(valor):
+    texto = valor.decode()
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        return texto
 
-# 12. Tabela: precos
-TABLES['precos'] = """
-CREATE TABLE precos (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    nome VARCHAR(255) NOT NULL UNIQUE,
-    tipo ENUM('servico', 'mao_de_obra', 'frete', 'outro') NOT NULL,
-    preco DECIMAL(10, 2) NOT NULL
-) ENGINE=InnoDB;
-"""
+def _converter_date(valor):
+    texto = valor.decode()
+    try:
+        return date.fromisoformat(texto[:10])
+    except ValueError:
+        return texto
+
+def _converter_decimal(valor):
+    try:
+        return Decimal(valor.decode())
+    except InvalidOperation:
+        return valor.decode()
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(' '))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+sqlite3.register_converter('DATETIME', _converter_datetime)
+sqlite3.register_converter('TIMESTAMP', _converter_datetime)
+sqlite3.register_converter('DATE', _converter_date)
+sqlite3.register_converter('DECIMAL', _converter_decimal)
+
+# Formulários HTML enviam datetime-local como '2025-01-31T18:30'; o MySQL normaliza para
+# '2025-01-31 18:30:00'. Fazemos o mesmo para que comparações de texto no SQLite funcionem.
+_DATETIME_LOCAL_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2})(:\d{2})?$')
+
+def _normalizar_parametro(valor):
+    if isinstance(valor, str):
+        m = _DATETIME_LOCAL_RE.match(valor)
+        if m:
+            return f"{m.group(1)} {m.group(2)}{m.group(3) or ':00'}"
+    return valor
+
+def _normalizar_linha(linha):
+    # Não há colunas FLOAT/DOUBLE no esquema: expressões numéricas (SUM, IFNULL, ...) voltam
+    # do SQLite como float, mas no MySQL seriam DECIMAL. Convertendo, a aritmética com Decimal funciona.
+    return tuple(Decimal(repr(v)) if isinstance(v, float) else v for v in linha)
+
+
+# -- SQLite: tradução do dialeto MySQL ----------------------------------------------
+
+_PARTES_DATA = {'YEAR': '%Y', 'MONTH': '%m', 'DAY': '%d'}
+
+_TRADUCOES_DML = [
+    (re.compile(r'\bCURDATE\(\)', re.I), "date('now', 'localtime')"),
+    (re.compile(r'\bNOW\(\)', re.I), "datetime('now', 'localtime')"),
+    # Hora local, como no MySQL (no SQLite, CURRENT_TIMESTAMP é UTC)
+    (re.compile(r'\bCURRENT_TIMESTAMP\b', re.I), "datetime('now', 'localtime')"),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((\w+)\)', re.I), r'excluded.\1'),
+    (re.compile(r'\s+FOR\s+UPDATE\b', re.I), ''),  # Não há lock de linha; ver _trava_linhas (BEGIN IMMEDIATE)
+    (re.compile(r'\b(YEAR|MONTH|DAY)\(((?:[^()]|\([^()]*\))*)\)', re.I),
+     lambda m: f"CAST(strftime('{_PARTES_DATA[m.group(1).upper()]}', {m.group(2)}) AS INTEGER)"),
+]
+
+_TRADUCOES_DDL = [
+    (re.compile(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    # ENUM e VARCHAR viram texto sem diferenciar maiúsculas, como a collation utf8mb4_unicode_ci
+    (re.compile(r'\bENUM\s*\([^)]*\)', re.I), 'TEXT COLLATE NOCASE'),
+    (re.compile(r'\b(VARCHAR\s*\(\d+\))', re.I), r'\1 COLLATE NOCASE'),
+    (re.compile(r'\bUNIQUE\s+KEY\s+(\w+)\s*\(', re.I), r'CONSTRAINT \1 UNIQUE ('),
+    (re.compile(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b', re.I), ''),
+    (re.compile(r'\bDEFAULT\s+CURRENT_TIMESTAMP\b', re.I), "DEFAULT (datetime('now', 'localtime'))"),
+    (re.compile(r'\bENGINE\s*=\s*\w+(\s+(DEFAULT\s+)?(CHARSET|CHARACTER\s+SET|COLLATE)\s*=?\s*\w+)*', re.I), ''),
+]
+_COMENTARIO_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_CREATE_TABLE_RE = re.compile(r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?', re.I)
+_FOREIGN_KEY_RE = re.compile(r'\bFOREIGN\s+KEY\s*\(\s*`?(\w+)`?\s*\)', re.I)
+_PREFIXO_INDICE_RE = re.compile(r'(\w+)\s*\(\d+\)')
+
+def _verbo_sql(sql):
+    """Primeira palavra do comando, ignorando comentários ('SELECT', 'CREATE', ...)."""
+    partes = _COMENTARIO_RE.sub(' ', sql).split(None, 1)
+    return partes[0].upper() if partes else ''
+
+@lru_cache(maxsize=1024)
+def traduzir_sql_sqlite(sql):
+    """
+    Traduz um comando no dialeto MySQL para o SQLite.
+    Retorna (comando, [comandos extras]) — os extras são os índices que o InnoDB cria
+    automaticamente para chaves estrangeiras e que o SQLite não cria.
+    """
+    sql = re.sub(r'%([s%])', lambda m: '?' if m.group(1) == 's' else '%', sql)
+    extras = []
+    if _verbo_sql(sql) in ('CREATE', 'ALTER'):
+        sql = _COMENTARIO_RE.sub('', sql).strip()
+        for padrao, troca in _TRADUCOES_DDL:
+            sql = padrao.sub(troca, sql)
+        if re.match(r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\b', sql, re.I):
+            cabecalho, _, colunas = sql.partition(' ON ')
+            sql = cabecalho + ' ON ' + _PREFIXO_INDICE_RE.sub(r'\1', colunas, count=0) if colunas else sql
+        tabela = _CREATE_TABLE_RE.match(sql)
+        if tabela:
+            for coluna in _FOREIGN_KEY_RE.findall(sql):
+                extras.append(f"CREATE INDEX IF NOT EXISTS fk_{tabela.group(1)}_{coluna} ON {tabela.group(1)} ({coluna})")
+    else:
+        for padrao, troca in _TRADUCOES_DML:
+            sql = padrao.sub(troca, sql)
+    return sql, tuple(extras)
+
+
+@lru_cache(maxsize=1024)
+def _trava_linhas(sql):
+    return _verbo_sql(sql) == 'SELECT' and re.search(r'\bFOR\s+UPDATE\s*$', sql.strip(), re.I) is not None
+
+
+def _traduzir_erro_sqlite(err, sql):
+    """Converte um erro do sqlite3 no erro equivalente do mysql.connector (mesmos errno)."""
+    msg = str(err)
+    baixo = msg.lower()
+    if isinstance(err, sqlite3.IntegrityError):
+        if 'unique' in baixo:
+            errno = errorcode.ER_DUP_ENTRY
+        elif 'foreign key' in baixo:
+            errno = errorcode.ER_ROW_IS_REFERENCED_2 if _verbo_sql(sql) in ('DELETE', 'UPDATE') else errorcode.ER_NO_REFERENCED_ROW_2
+        elif 'not null' in baixo:
+            errno = errorcode.ER_BAD_NULL_ERROR
+        else:
+            errno = None
+        return mysql_errors.IntegrityError(msg=msg, errno=errno)
+    if 'no such table' in baixo:
+        return mysql_errors.ProgrammingError(msg=msg, errno=errorcode.ER_NO_SUCH_TABLE)
+    if baixo.startswith('index') and 'already exists' in baixo:
+        return mysql_errors.ProgrammingError(msg=msg, errno=errorcode.ER_DUP_KEYNAME)
+    if 'already exists' in baixo:
+        return mysql_errors.ProgrammingError(msg=msg, errno=errorcode.ER_TABLE_EXISTS_ERROR)
+    if 'duplicate column name' in baixo:
+        return mysql_errors.ProgrammingError(msg=msg, errno=errorcode.ER_DUP_FIELDNAME)
+    if 'database is locked' in baixo:
+        return mysql_errors.OperationalError(msg=msg, errno=errorcode.ER_LOCK_WAIT_TIMEOUT)
+    if isinstance(err, sqlite3.OperationalError):
+        return mysql_errors.ProgrammingError(msg=msg)
+    return mysql_errors.DatabaseError(msg=msg)
+
+
+class SQLiteCursor:
+    """Cursor com a interface usada do mysql.connector (%s, dictionary=True, lastrowid...)."""
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._cnx.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=None):
+        traduzido, extras = traduzir_sql_sqlite(sql)
+        try:
+            if _trava_linhas(sql) and not self._connection._cnx.in_transaction:
+                # SELECT ... FOR UPDATE: o SQLite não trava linhas; pega o lock de escrita do
+                # banco já na leitura, para que a baixa que vem depois não concorra com outra
+                self._cursor.execute("BEGIN IMMEDIATE")
+            self._cursor.execute(traduzido, tuple(_normalizar_parametro(p) for p in (params or ())))
+            for comando in extras:
+                self._cursor.execute(comando)
+        except sqlite3.Error as err:
+            raise _traduzir_erro_sqlite(err, sql) from err
+
+    def executemany(self, sql, seq_params):
+        traduzido, _ = traduzir_sql_sqlite(sql)
+        try:
+            self._cursor.executemany(traduzido, (tuple(_normalizar_parametro(p) for p in params) for params in seq_params))
+        except sqlite3.Error as err:
+            raise _traduzir_erro_sqlite(err, sql) from err
+
+    def _formatar(self, linha):
+        if linha is None:
+            return None
+        linha = _normalizar_linha(linha)
+        if self._dictionary:
+            return dict(zip(self.column_names, linha))
+        return linha
 
+    def fetchone(self):
+        return self._formatar(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._formatar(l) for l in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._formatar(l) for l in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Conexão sqlite3 com a interface de conexão do mysql.connector usada pelo app."""
+
+    def __init__(self, cnx):
+        self._cnx = cnx
+        self._aberta = True
+
+    def cursor(self, dictionary=False, **_):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self._cnx.commit()
+
+    def rollback(self):
+        self._cnx.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._cnx.in_transaction
+
+    def is_connected(self):
+        return self._aberta
+
+    def close(self):
+        self._aberta = False
+        self._cnx.close()
+
+
+class SQLiteBackend:
+    """Arquivo SQLite (ou ':memory:') rodando dentro do próprio processo."""
+    nome = 'sqlite'
+
+    def __init__(self, caminho=SQLITE_PATH):
+        self.caminho = caminho
+        self.memoria = caminho == ':memory:'
+        self._lock_memoria = threading.Lock()
+        self._ancora = None
+        if self.memoria:
+            # Banco em memória compartilhado entre as conexões do processo. A conexão-âncora
+            # mantém o banco vivo mesmo que o pool recicle todas as outras.
+            self._uri = f"file:{DB_NAME}?mode=memory&cache=shared"
+            self._ancora = self._abrir()
+
+    def _abrir(self):
+        if self.memoria:
+            cnx = sqlite3.connect(self._uri, uri=True, detect_types=sqlite3.PARSE_DECLTYPES,
+                                  check_same_thread=False, timeout=30)
+        else:
+            cnx = sqlite3.connect(self.caminho, detect_types=sqlite3.PARSE_DECLTYPES,
+                                  check_same_thread=False, timeout=30)
+            cnx.execute("PRAGMA journal_mode = WAL")
+        cnx.execute("PRAGMA foreign_keys = ON")
+        return cnx
+
+    def connect(self):
+        return SQLiteConnection(self._abrir())
+
+    def ping(self, cnx):
+        return cnx.is_connected()
+
+    def reset(self, cnx, full=True):
+        cnx.rollback()
+
+    def pool_options(self):
+        # Em memória (cache compartilhado) o SQLite trava por tabela: uma conexão por vez
+        return {'size': 1, 'max_overflow': 0} if self.memoria else {}
+
+    def garantir_banco(self):
+        pass  # O arquivo é criado na primeira conexão
+
+    @contextmanager
+    def lock_migracao(self, cnx):
+        """Lock entre processos: transação exclusiva num arquivo '<banco>.lock' ao lado do banco."""
+        if self.memoria:
+            with self._lock_memoria:
+                yield
+            return
+        lock_cnx = sqlite3.connect(self.caminho + '.lock', timeout=MIGRATION_LOCK_TIMEOUT, isolation_level=None)
+        try:
+            try:
+                lock_cnx.execute("BEGIN EXCLUSIVE")
+            except sqlite3.OperationalError as err:
+                raise RuntimeError(f"Não foi possível obter o lock de migração ({err}).") from err
+            yield
+        finally:
+            lock_cnx.close()
+
+
+_BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
+_backend = None
+
+def get_backend():
+    """Backend selecionado por DB_BACKEND ('mysql' ou 'sqlite')."""
+    global _backend
+    if _backend is None:
+        if DB_BACKEND not in _BACKENDS:
+            raise RuntimeError(f"DB_BACKEND inválido: '{DB_BACKEND}'. Use 'mysql' ou 'sqlite'.")
+        _backend = _BACKENDS[DB_BACKEND]()
+    return _backend
 
 # --------------------------------------------------------------------------------
-# FUNÇÕES DE INICIALIZAÇÃO DO BANCO DE DADOS
+# MIGRAÇÕES DE ESQUEMA (versionadas)
 # --------------------------------------------------------------------------------
+# O esquema vive em arquivos numerados na pasta `migrations/` (0001_nome.sql, 0002_nome.py, ...).
+# - Arquivos .sql: comandos separados por ';' no fim da linha.
+# - Arquivos .py: devem definir `upgrade(cursor)`.
+# A tabela `schema_version` registra cada migração aplicada. Na inicialização normal
+# o app faz apenas uma consulta de versão; migrações pendentes são aplicadas por um
+# único processo de cada vez, protegido pelo lock de migração do backend
+# (GET_LOCK no MySQL, arquivo '<banco>.lock' no SQLite).
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_LOCK_NAME = f"{DB_NAME}.migracoes"
+MIGRATION_LOCK_TIMEOUT = int(os.getenv('DB_MIGRATION_LOCK_TIMEOUT', 120))  # Segundos esperando outro worker migrar
+DB_AUTO_MIGRATE = _env_bool('DB_AUTO_MIGRATE', True)  # Aplica migrações pendentes ao iniciar o app
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    aplicado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB
+"""
+
+# Erros tolerados ao reaplicar uma migração interrompida no meio (DDL do MySQL não é transacional)
+_ERROS_DDL_IDEMPOTENTES = {
+    errorcode.ER_TABLE_EXISTS_ERROR,  # Tabela já existe
+    errorcode.ER_DUP_KEYNAME,         # Índice já existe
+    errorcode.ER_DUP_FIELDNAME,       # Coluna já existe
+}
+
+_MIGRACAO_RE = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+
+def listar_migracoes():
+    """Retorna as migrações disponíveis como [(versão, nome, caminho)], em ordem."""
+    migracoes = []
+    for arquivo in os.listdir(MIGRATIONS_DIR):
+        m = _MIGRACAO_RE.match(arquivo)
+        if m:
+            migracoes.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, arquivo)))
+    migracoes.sort()
+    versoes = [v for v, _, _ in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise RuntimeError(f"Há migrações com número de versão repetido em {MIGRATIONS_DIR}.")
+    return migracoes
+
+def versao_mais_recente():
+    migracoes = listar_migracoes()
+    return migracoes[-1][0] if migracoes else 0
 
-def setup_database():
+def _comandos_sql(texto):
+    """Divide um arquivo .sql em comandos (separados por ';' no fim da linha)."""
+    comandos = re.split(r';\s*(?:\n|$)', texto)
+    resultado = []
+    for comando in comandos:
+        # Descarta blocos que só contêm comentários/linhas vazias
+        linhas = [l for l in comando.splitlines() if l.strip() and not l.strip().startswith('--')]
+        if linhas:
+            resultado.append(comando.strip())
+    return resultado
+
+def _carregar_modulo_migracao(caminho):
+    spec = importlib.util.spec_from_file_location(f"migracao_{os.path.basename(caminho)[:-3]}", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def _aplicar_migracao(cnx, versao, nome, caminho):
+    cursor = cnx.cursor()
+    try:
+        if caminho.endswith('.sql'):
+            with open(caminho, encoding='utf-8') as f:
+                comandos = _comandos_sql(f.read())
+            for comando in comandos:
+                try:
+                    cursor.execute(comando)
+                except Error as err:
+                    if err.errno in _ERROS_DDL_IDEMPOTENTES:
+                        print(f"  (ignorado, já aplicado: {err.msg})")
+                        continue
+                    raise
+        else:
+            _carregar_modulo_migracao(caminho).upgrade(cursor)
+
+        cursor.execute("INSERT INTO schema_version (version, nome) VALUES (%s, %s)", (versao, nome))
+        cnx.commit()
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _ler_versao(cursor):
+    """Versão aplicada no banco (0 se a tabela schema_version ainda não existe)."""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except Error as err:
+        if err.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    row = cursor.fetchone()
+    return (row[0] if row else None) or 0
+
+def migrar(alvo=None):
     """
-    Tenta conectar ao servidor MySQL (sem DB), cria o banco de dados se não existir
-    e garante que todas as tabelas estejam criadas.
-    Esta função é chamada uma vez na inicialização do módulo.
+    Aplica as migrações pendentes (até a versão `alvo`, se informada).
+    Apenas um processo migra por vez: os demais aguardam o lock e, ao obtê-lo,
+    encontram o banco já atualizado. Retorna a lista de versões aplicadas.
     """
-    print(f"--- Iniciando configuração do DB: {DB_NAME} ---")
-    
-    # 1. Tenta conectar ao servidor (sem especificar o DB)
+    backend = get_backend()
+    backend.garantir_banco()
+    cnx = backend.connect()
+    aplicadas = []
     try:
-        cnx = mysql.connector.connect(**MYSQL_ROOT_CONFIG)
-        cursor = cnx.cursor()
-    except Error as err:
-        print(f"Erro CRÍTICO: Não foi possível conectar ao servidor MySQL. Verifique as credenciais no .env. Erro: {err}")
-        return False
+        with backend.lock_migracao(cnx):
+            cursor = cnx.cursor()
+            cursor.execute(SCHEMA_VERSION_DDL)
+            cnx.commit()
+            atual = _ler_versao(cursor)
+            cursor.close()
+            for versao, nome, caminho in listar_migracoes():
+                if versao <= atual or (alvo is not None and versao > alvo):
+                    continue
+                print(f"Aplicando migração {versao:04d}_{nome}...")
+                _aplicar_migracao(cnx, versao, nome, caminho)
+                aplicadas.append(versao)
+    finally:
+        cnx.close()
+    return aplicadas
 
-    # 2. Cria o banco de dados se não existir
+def status_migracoes():
+    """Retorna (versão aplicada, [(versão, nome) pendentes])."""
     try:
-        # Usa utf8mb4 e utf8mb4_unicode_ci para garantir suporte a emojis e caracteres complexos
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-        print(f"Banco de dados '{DB_NAME}' garantido.")
-        cnx.database = DB_NAME # Altera a conexão para usar o DB recém-criado/existente
+        cnx = get_backend().connect()
     except Error as err:
-        print(f"Falha ao criar/acessar o DB: {err}")
+        if err.errno == errorcode.ER_BAD_DB_ERROR:
+            return 0, [(v, n) for v, n, _ in listar_migracoes()]
+        raise
+    try:
+        cursor = cnx.cursor()
+        atual = _ler_versao(cursor)
         cursor.close()
+    finally:
         cnx.close()
-        return False
-    
-    # 3. Cria todas as tabelas, pulando se já existirem
-    for name, ddl in TABLES.items():
+    return atual, [(v, n) for v, n, _ in listar_migracoes() if v > atual]
+
+# --------------------------------------------------------------------------------
+# POOL DE CONEXÕES
+# --------------------------------------------------------------------------------
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro de DB_POOL_TIMEOUT segundos."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões thread-safe com overflow, reciclagem por ociosidade,
+    pre-ping no checkout e reset de sessão na devolução.
+
+    `creator` abre uma conexão nova, `ping` devolve True se a conexão ainda responde
+    e `reset` limpa o estado da sessão (transação aberta, variáveis) antes do reuso.
+    """
+
+    def __init__(self, creator, ping, reset, size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW,
+                 timeout=DB_POOL_TIMEOUT, idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 pre_ping=DB_POOL_PRE_PING, reset_session=DB_POOL_RESET_SESSION):
+        self._creator = creator
+        self._ping = ping
+        self._reset = reset
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.reset_session = reset_session
+
+        self._idle = deque()  # (conexão, instante da devolução); o fim da fila é a mais recente
+        self._total = 0       # Conexões abertas (ociosas + emprestadas)
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'checkout_wait_total_ms': 0.0,
+            'checkout_wait_max_ms': 0.0,
+            'exhausted': 0,        # Checkouts que encontraram o pool cheio e precisaram esperar
+            'timeouts': 0,         # Checkouts que desistiram após DB_POOL_TIMEOUT
+            'created': 0,
+            'broken_recycled': 0,  # Conexões descartadas por falha no ping/reset
+            'idle_recycled': 0,    # Conexões descartadas por excederem DB_POOL_IDLE_TIMEOUT
+            'overflow_closed': 0,  # Conexões de overflow fechadas na devolução
+        }
+
+    # -- API pública ---------------------------------------------------------
+
+    def checkout(self):
+        """Entrega uma conexão saudável, esperando até `timeout` se o pool estiver esgotado."""
+        inicio = time.monotonic()
+        conn = self._acquire(inicio)
+        try:
+            if conn is None:
+                conn = self._create()
+            elif self.pre_ping and not self._safe_ping(conn):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats['broken_recycled'] += 1
+                conn = self._create()
+        except Exception:
+            # Não conseguimos abrir a conexão: libera a vaga reservada
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        espera_ms = (time.monotonic() - inicio) * 1000
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['checkout_wait_total_ms'] += espera_ms
+            self._stats['checkout_wait_max_ms'] = max(self._stats['checkout_wait_max_ms'], espera_ms)
+        return conn
+
+    def checkin(self, conn):
+        """Devolve a conexão ao pool (ou a fecha, se estiver quebrada ou for de overflow)."""
         try:
-            # Tenta criar a tabela. O InnoDB é usado por padrão na DDL.
-            cursor.execute(ddl)
-            print(f"Tabela {name}: OK (Criada).")
-        except Error as err:
-            if err.errno == errorcode.ER_TABLE_EXISTS_ERROR:
-                print(f"Tabela {name}: OK (Já existe).")
-                continue # Continua para a próxima tabela
+            self._reset(conn, full=self.reset_session)
+        except Exception:
+            self._close_quietly(conn)
+            with self._cond:
+                self._total -= 1
+                self._stats['broken_recycled'] += 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            if len(self._idle) >= self.size:
+                # Já temos o tamanho base ocioso: esta conexão é excedente (overflow)
+                self._total -= 1
+                self._stats['overflow_closed'] += 1
+                fechar = True
             else:
-                # Erros como sintaxe ou Foreign Key podem aparecer aqui
-                print(f"Tabela {name}: Erro CRÍTICO ao criar a tabela: {err}")
-                
-    cursor.close()
-    cnx.close()
-    print("--- Configuração do DB concluída com sucesso. ---")
-    return True
+                self._idle.append((conn, time.monotonic()))
+                fechar = False
+            self._cond.notify()
+        if fechar:
+            self._close_quietly(conn)
+
+    def discard(self, conn):
+        """Fecha uma conexão emprestada sem devolvê-la ao pool."""
+        self._close_quietly(conn)
+        with self._cond:
+            self._total -= 1
+            self._stats['broken_recycled'] += 1
+            self._cond.notify()
+
+    def dispose(self):
+        """Fecha todas as conexões ociosas (ex.: ao encerrar o processo ou após um fork)."""
+        with self._cond:
+            ociosas = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._total -= len(ociosas)
+            self._cond.notify_all()
+        for conn in ociosas:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Retorna um retrato dos contadores do pool para monitoramento/dimensionamento."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._total,
+                'idle': len(self._idle),
+                'checked_out': self._total - len(self._idle),
+            })
+        checkouts = stats['checkouts']
+        stats['checkout_wait_avg_ms'] = stats['checkout_wait_total_ms'] / checkouts if checkouts else 0.0
+        return stats
+
+    # -- Internos --------------------------------------------------------------
+
+    def _acquire(self, inicio):
+        """
+        Reserva uma vaga no pool. Retorna uma conexão ociosa ou None quando o chamador
+        deve abrir uma nova (a vaga já foi contabilizada em `_total`).
+        """
+        expiradas = []
+        esperou = False
+        try:
+            with self._cond:
+                while True:
+                    agora = time.monotonic()
+                    while self._idle:
+                        conn, devolvida_em = self._idle.pop()
+                        if self.idle_timeout and agora - devolvida_em > self.idle_timeout:
+                            expiradas.append(conn)
+                            self._total -= 1
+                            self._stats['idle_recycled'] += 1
+                            continue
+                        return conn
+
+                    if self._total < self.size + self.max_overflow:
+                        self._total += 1
+                        return None
+
+                    if not esperou:
+                        esperou = True
+                        self._stats['exhausted'] += 1
+                    restante = self.timeout - (agora - inicio)
+                    if restante <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Pool de conexões esgotado ({self._total} abertas) após {self.timeout}s de espera."
+                        )
+                    self._cond.wait(restante)
+        finally:
+            for conn in expiradas:
+                self._close_quietly(conn)
+
+    def _create(self):
+        conn = self._creator()
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _safe_ping(self, conn):
+        try:
+            return self._ping(conn)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Retorna o pool de conexões do processo, criando-o no primeiro uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                backend = get_backend()
+                _pool = ConnectionPool(backend.connect, backend.ping, backend.reset, **backend.pool_options())
+    return _pool
+
+def pool_stats():
+    """Contadores do pool (tempo de espera no checkout, esgotamentos, reciclagens)."""
+    return get_pool().stats()
+
+
+# --------------------------------------------------------------------------------
+# INSTRUMENTAÇÃO DE SQL POR REQUISIÇÃO
+# --------------------------------------------------------------------------------
+# Cada comando executado por uma conexão de get_db() é registrado com seu texto
+# normalizado (literais trocados por '?'), duração e número de linhas. Ao fim da
+# requisição o app recebe os cabeçalhos X-DB-Queries / X-DB-Time e um aviso no console
+# quando o mesmo formato de consulta se repete demais (padrão N+1: um SELECT por item).
+
+_LITERAL_TEXTO_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_LITERAL_NUMERO_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTA_IN_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+
+@lru_cache(maxsize=2048)
+def normalizar_sql(sql):
+    """Formato da consulta: sem comentários, literais e parâmetros viram '?', listas IN viram (...)."""
+    sql = _COMENTARIO_RE.sub(' ', sql)
+    sql = _LITERAL_TEXTO_RE.sub('?', sql)
+    sql = re.sub(r'%(?:s|\(\w+\)s)', '?', sql)
+    sql = _LITERAL_NUMERO_RE.sub('?', sql)
+    sql = _LISTA_IN_RE.sub('IN (...)', sql)
+    return ' '.join(sql.split())
+
+
+class ColetorConsultas:
+    """Comandos SQL executados durante uma requisição."""
+
+    def __init__(self):
+        self.consultas = []  # dicts: sql, duracao_ms, linhas
+
+    def registrar(self, sql, duracao_ms, linhas):
+        registro = {'sql': normalizar_sql(sql), 'duracao_ms': duracao_ms, 'linhas': linhas}
+        self.consultas.append(registro)
+        return registro
+
+    @property
+    def total(self):
+        return len(self.consultas)
+
+    @property
+    def tempo_total_ms(self):
+        return sum(c['duracao_ms'] for c in self.consultas)
+
+    def repetidas(self, limite=DB_N_PLUS_ONE_THRESHOLD):
+        """Formatos executados mais de `limite` vezes: [(sql, vezes, tempo_ms)], do mais repetido."""
+        agrupado = {}
+        for c in self.consultas:
+            vezes, tempo = agrupado.get(c['sql'], (0, 0.0))
+            agrupado[c['sql']] = (vezes + 1, tempo + c['duracao_ms'])
+        return sorted(((sql, v, t) for sql, (v, t) in agrupado.items() if v > limite),
+                      key=lambda item: item[1], reverse=True)
+
+
+class InstrumentedCursor:
+    """Envolve um cursor do driver medindo cada execute/executemany e contando as linhas lidas."""
+
+    def __init__(self, cursor, coletor):
+        self._cursor = cursor
+        self._coletor = coletor
+        self._registro = None
+
+    def execute(self, sql, params=None):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            linhas = self._cursor.rowcount if _verbo_sql(sql) in ('INSERT', 'UPDATE', 'DELETE', 'REPLACE') else 0
+            self._registro = self._coletor.registrar(sql, duracao_ms, max(linhas, 0))
+
+    def executemany(self, sql, seq_params):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_params)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            self._registro = self._coletor.registrar(sql, duracao_ms, max(self._cursor.rowcount or 0, 0))
+
+    def _contar(self, n):
+        if self._registro is not None:
+            self._registro['linhas'] += n
+
+    def fetchone(self):
+        linha = self._cursor.fetchone()
+        if linha is not None:
+            self._contar(1)
+        return linha
+
+    def fetchmany(self, *args, **kwargs):
+        linhas = self._cursor.fetchmany(*args, **kwargs)
+        self._contar(len(linhas))
+        return linhas
+
+    def fetchall(self):
+        linhas = self._cursor.fetchall()
+        self._contar(len(linhas))
+        return linhas
+
+    def __iter__(self):
+        for linha in self._cursor:
+            self._contar(1)
+            yield linha
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+
+class InstrumentedConnection:
+    """Conexão emprestada do pool cujos cursores registram no coletor da requisição."""
+
+    def __init__(self, cnx, coletor):
+        self._cnx = cnx
+        self.coletor = coletor
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._cnx.cursor(*args, **kwargs), self.coletor)
+
+    def __getattr__(self, nome):
+        return getattr(self._cnx, nome)
+
+
+def consultas_da_requisicao():
+    """Coletor da requisição atual (None se ela não usou o banco)."""
+    db = g.get('_database')
+    return db.coletor if db is not None else None
+
+
+_PAINEL_SQL = """
+<div id="painel-sql" style="position:fixed;bottom:0;left:0;right:0;max-height:40%;overflow:auto;z-index:99999;
+     background:#1e1e1e;color:#ddd;font:12px monospace;padding:8px;border-top:3px solid #f0ad4e;">
+  <strong>SQL: {total} consulta(s), {tempo:.2f} ms</strong>{alertas}
+  <table style="width:100%;border-collapse:collapse;margin-top:6px;">{linhas}</table>
+</div>
+"""
+
+def _html_painel(coletor, repetidas):
+    alertas = ''.join(
+        f'<div style="color:#f0ad4e;">N+1? {vezes}x ({tempo:.2f} ms): {escape(sql)}</div>'
+        for sql, vezes, tempo in repetidas
+    )
+    linhas = ''.join(
+        f'<tr><td style="padding:2px 6px;text-align:right;">{c["duracao_ms"]:.2f} ms</td>'
+        f'<td style="padding:2px 6px;text-align:right;">{c["linhas"]}</td>'
+        f'<td style="padding:2px 6px;">{escape(c["sql"])}</td></tr>'
+        for c in coletor.consultas
+    )
+    return _PAINEL_SQL.format(total=coletor.total, tempo=coletor.tempo_total_ms, alertas=alertas, linhas=linhas)
+
+def instrumentar_app(app):
+    """Registra no app os cabeçalhos X-DB-*, o aviso de N+1 e (se DB_DEBUG_PANEL=1) o painel de SQL."""
+
+    @app.after_request
+    def _relatorio_sql(response):
+        coletor = consultas_da_requisicao()
+        if coletor is None:
+            response.headers['X-DB-Queries'] = '0'
+            response.headers['X-DB-Time'] = '0.00'
+            return response
+
+        response.headers['X-DB-Queries'] = str(coletor.total)
+        response.headers['X-DB-Time'] = f"{coletor.tempo_total_ms:.2f}"
+
+        repetidas = coletor.repetidas()
+        if repetidas:
+            response.headers['X-DB-N-Plus-One'] = str(len(repetidas))
+            for sql, vezes, tempo in repetidas:
+                print(f"AVISO N+1: {request.method} {request.path} executou {vezes}x ({tempo:.2f} ms): {sql}")
+
+        if (DB_DEBUG_PANEL and response.mimetype == 'text/html'
+                and not response.direct_passthrough and response.status_code == 200):
+            corpo = response.get_data(as_text=True)
+            if '</body>' in corpo:
+                corpo = corpo.replace('</body>', _html_painel(coletor, repetidas) + '</body>', 1)
+                response.set_data(corpo)
+        return response
+
+    return app
 
 
 # --------------------------------------------------------------------------------
@@ -276,24 +978,25 @@ def setup_database():
 
 def get_db():
     """
-    Conecta ao banco de dados MySQL e retorna a conexão.
+    Obtém uma conexão do pool e a retorna.
     Armazena a conexão em `g` para que possa ser reutilizada na mesma requisição.
     """
     db = getattr(g, '_database', None)
     if db is None:
         try:
-            # Garante a conexão ao DB com o nome especificado
-            db = g._database = mysql.connector.connect(**MYSQL_CONFIG)
-        except Error as e:
+            # Empresta uma conexão já autenticada do pool (sem novo handshake TCP/auth)
+            db = g._database = InstrumentedConnection(get_pool().checkout(), ColetorConsultas())
+        except (Error, PoolTimeoutError) as e:
             # Se a conexão falhar, retorna None e o erro é logado no console principal (se houver)
+            print(f"Erro ao obter conexão do pool: {e}")
             return None
     return db
 
 def close_connection(exception):
-    """Fecha a conexão com o banco de dados se ela existir."""
-    db = getattr(g, '_database', None)
-    if db is not None and db.is_connected():
-        db.close()
+    """Devolve a conexão da requisição ao pool, se ela existir."""
+    db = g.pop('_database', None)
+    if db is not None:
+        get_pool().checkin(db._cnx)
 
 def create_initial_admin_user():
     """Cria um usuário 'admin' inicial ou atualiza a senha se ele já existir."""
@@ -334,8 +1037,66 @@ def create_initial_admin_user():
 
 
 # --------------------------------------------------------------------------------
-# LÓGICA DE INICIALIZAÇÃO NA PRIMEIRA IMPORTAÇÃO
+# VERIFICAÇÃO DO ESQUEMA NA INICIALIZAÇÃO
+# --------------------------------------------------------------------------------
+
+def verificar_schema():
+    """
+    Chamada uma vez na inicialização do app: uma única consulta de versão.
+    Se houver migrações pendentes (ou o banco ainda não existir) e DB_AUTO_MIGRATE
+    estiver ativo, aplica-as sob o lock de migração; caso contrário apenas avisa.
+    Retorna True se o esquema estiver atualizado.
+    """
+    esperada = versao_mais_recente()
+    atual = None
+    try:
+        cnx = get_pool().checkout()
+    except Error as err:
+        if err.errno != errorcode.ER_BAD_DB_ERROR:
+            print(f"Erro CRÍTICO: Não foi possível conectar ao banco de dados. Verifique as credenciais no .env. Erro: {err}")
+            return False
+    else:
+        try:
+            cursor = cnx.cursor()
+            atual = _ler_versao(cursor)
+            cursor.close()
+        finally:
+            get_pool().checkin(cnx)
+        if atual >= esperada:
+            return True
+
+    if not DB_AUTO_MIGRATE:
+        print(f"AVISO: esquema do banco na versão {atual or 0}, esperada {esperada}. Execute: python db.py migrate")
+        return False
+    try:
+        migrar()
+        return True
+    except Exception as err:
+        print(f"Erro CRÍTICO ao aplicar migrações: {err}")
+        return False
+
+
+# --------------------------------------------------------------------------------
+# LINHA DE COMANDO: python db.py migrate|status
 # --------------------------------------------------------------------------------
 
-# Chama a função de configuração do DB logo após a definição das funções
-setup_database()
\ No newline at end of file
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrações do banco de dados da Gestão de Eventos.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_migrate = sub.add_parser('migrate', help="Aplica as migrações pendentes.")
+    p_migrate.add_argument('--alvo', type=int, default=None, help="Migra somente até esta versão.")
+    sub.add_parser('status', help="Mostra a versão atual e as migrações pendentes.")
+    args = parser.parse_args()
+
+    if args.comando == 'migrate':
+        aplicadas = migrar(args.alvo)
+        print(f"{len(aplicadas)} migração(ões) aplicada(s)." if aplicadas else "Banco já está atualizado.")
+    elif args.comando == 'status':
+        atual, pendentes = status_migracoes()
+        print(f"Versão atual: {atual}")
+        for versao, nome in pendentes:
+            print(f"  pendente: {versao:04d}_{nome}")
+        if not pendentes:
+            print("Nenhuma migração pendente.")
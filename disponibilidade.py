@@ -0,0 +1,198 @@
+"""
+Disponibilidade de itens de aluguel e kits por período.
+
+Itens de aluguel e kits voltam ao estoque depois do evento, então a pergunta certa não é
+"quanto tem em estoque agora", e sim "quantas peças estão livres entre T1 e T2". Uma reserva
+é uma linha de montagem_materiais de um evento em aberto, valendo de data_evento a
+recolhimento_evento (índice idx_eventos_periodo). Itens de aluguel: livres = total de peças
+(quantidade_estoque) - pico de uso simultâneo das reservas que cruzam o período. Kits são
+uma unidade: livres se nenhuma reserva cruza o período e o kit não está em manutenção.
+Os demais tipos (descartável, venda, ...) são consumidos: livres = quantidade_estoque.
+Kits-modelo (kits.modelo) valem pelos componentes: a linha de montagem do kit reserva
+quantidade x receita de cada componente, e cabem tantos kits quanto o componente mais escasso.
+
+disponibilidade_carrinho() responde para um carrinho inteiro com até quatro consultas (estoque,
+kits, receitas dos kits-modelo e reservas), independentemente do número de itens.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from catalogo import TIPO_KIT, TIPO_PRODUTO, componentes_de_modelos, resolver_itens
+
+TIPO_ALUGUEL = 'aluguel'
+# Eventos cujos itens já voltaram (ou foram dados como perdidos): não reservam mais nada
+STATUS_LIBERADOS = ('Finalizado', 'Finalização Parcial')
+
+
+def como_datetime(valor):
+    """datetime a partir de datetime, date ou texto ('aaaa-mm-dd[ HH:MM[:SS]]' ou datetime-local)."""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime.combine(valor, time.min)
+    texto = str(valor).strip().split('.')[0].replace('T', ' ')
+    for formato in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {valor}")
+
+
+def periodo_do_evento(data_evento, recolhimento_evento=None):
+    """(início, fim) da reserva de um evento; sem recolhimento, termina no próprio início."""
+    inicio = como_datetime(data_evento)
+    if inicio is None:
+        raise ValueError("A data do evento é obrigatória.")
+    fim = como_datetime(recolhimento_evento) or inicio
+    if fim < inicio:
+        raise ValueError("O recolhimento não pode ser anterior à data do evento.")
+    return inicio, fim
+
+
+def _pico(intervalos):
+    """Maior soma de quantidades simultâneas numa lista de (início, fim, quantidade)."""
+    marcos = []
+    for inicio, fim, quantidade in intervalos:
+        marcos.append((inicio, 0, quantidade))   # Entradas antes das saídas no mesmo instante:
+        marcos.append((fim, 1, -quantidade))     # quem devolve às 10h não libera para quem monta às 10h
+    pico = atual = Decimal(0)
+    for _, _, delta in sorted(marcos, key=lambda m: (m[0], m[1])):
+        atual += delta
+        pico = max(pico, atual)
+    return pico
+
+
+def reservas_no_periodo(cursor, inicio, fim, material_ids=(), kit_ids=(), travar=False):
+    """
+    Pico de uso simultâneo, no período, das reservas de eventos em aberto.
+    Retorna ({material_id: quantidade}, {kit_id: reservas}); ids sem reserva ficam de fora.
+    Reservas de kits-modelo contam nos materiais (quantidade x receita), não em kit_id.
+    `fim` None = período sem fim (todas as reservas a partir de `inicio`). `cursor` de dicionário.
+    Com `travar`, a leitura é FOR UPDATE: dentro da transação da reserva ela enxerga as
+    reservas já confirmadas por outras transações, e não a foto tirada no início da transação.
+    """
+    if not material_ids and not kit_ids:
+        return {}, {}
+    filtros, params = [], [como_datetime(inicio)]
+    if material_ids:
+        in_clause = ', '.join(['%s'] * len(material_ids))
+        filtros.append(f"mm.material_id IN ({in_clause}) OR ki.material_id IN ({in_clause})")
+        params += list(material_ids) * 2
+    if kit_ids:
+        filtros.append(f"mm.kit_id IN ({', '.join(['%s'] * len(kit_ids))})")
+        params += list(kit_ids)
+    limite_fim = ""
+    if fim is not None:
+        limite_fim = "AND e.data_evento <= %s"
+        params.append(como_datetime(fim))
+    params += list(STATUS_LIBERADOS)
+
+    cursor.execute(f"""
+        SELECT mm.material_id, mm.kit_id, mm.quantidade, ki.material_id AS componente_id,
+               ki.quantidade AS componente_quantidade, e.data_evento, e.recolhimento_evento
+        FROM eventos e
+        JOIN montagem_materiais mm ON mm.evento_id = e.id
+        LEFT JOIN kits k ON k.id = mm.kit_id AND k.modelo = TRUE
+        LEFT JOIN kit_itens ki ON ki.kit_id = k.id
+        WHERE e.recolhimento_evento >= %s AND ({' OR '.join(filtros)}) {limite_fim}
+          AND e.status NOT IN ({', '.join(['%s'] * len(STATUS_LIBERADOS))})
+        {'FOR UPDATE' if travar else ''}
+    """, tuple(params))
+
+    por_material, por_kit = {}, {}
+    for row in cursor.fetchall():
+        intervalo = (como_datetime(row['data_evento']), como_datetime(row['recolhimento_evento']))
+        if row['componente_id'] is not None:
+            por_material.setdefault(row['componente_id'], []).append(
+                intervalo + (Decimal(row['quantidade']) * Decimal(row['componente_quantidade']),))
+        elif row['material_id'] is not None:
+            por_material.setdefault(row['material_id'], []).append(intervalo + (Decimal(row['quantidade']),))
+        elif row['kit_id'] is not None:
+            por_kit.setdefault(row['kit_id'], []).append(intervalo + (Decimal(1),))  # Kit é uma unidade
+    return ({i: _pico(v) for i, v in por_material.items()},
+            {i: _pico(v) for i, v in por_kit.items()})
+
+
+def materiais_do_evento(cursor, evento_id):
+    """
+    Materiais de um evento com os kits-modelo já desmontados nos componentes:
+    [{'material_id', 'quantidade', 'tipo_material', 'quantidade_estoque'}]. Kits comuns ficam de fora.
+    """
+    cursor.execute("""
+        SELECT e.id AS material_id, mm.quantidade * COALESCE(ki.quantidade, 1) AS quantidade,
+               e.tipo_material, e.quantidade_estoque
+        FROM montagem_materiais mm
+        LEFT JOIN kits k ON k.id = mm.kit_id AND k.modelo = TRUE
+        LEFT JOIN kit_itens ki ON ki.kit_id = k.id
+        JOIN estoque e ON e.id = COALESCE(ki.material_id, mm.material_id)
+        WHERE mm.evento_id = %s
+    """, (evento_id,))
+    return cursor.fetchall()
+
+
+def livre(tipo, tipo_material=None, quantidade_estoque=None, status=None, reservado=0):
+    """Quantidade livre de um item, dado o que está reservado no período."""
+    if tipo == TIPO_KIT:
+        if status is None or status == 'manutencao':
+            return Decimal(0)
+        return max(Decimal(1) - reservado, Decimal(0))
+    saldo = Decimal(quantidade_estoque or 0)
+    if tipo_material == TIPO_ALUGUEL:
+        return max(saldo - reservado, Decimal(0))
+    return saldo
+
+
+def disponibilidade_carrinho(cursor, itens, inicio, fim):
+    """
+    Resolve um carrinho ({id, tipo, quantidade}) e calcula a disponibilidade no período.
+    Retorna a saída de resolver_itens() com:
+      - livre: quantidade livre do produto/kit no período (kit-modelo: quantos kits os
+        componentes livres permitem montar)
+      - disponivel: o que o carrinho inteiro pede do item (mesmo item em várias linhas, e
+        componentes pedidos também por kits-modelo) cabe no que está livre
+    """
+    resolvidos = resolver_itens(cursor, itens)
+    modelos = componentes_de_modelos(cursor, sorted({i['id'] for i in resolvidos
+                                                     if i['tipo'] == TIPO_KIT and i['encontrado'] and i['modelo']}))
+    componentes = {c['material_id']: c for receita in modelos.values() for c in receita}
+    ids_aluguel = sorted({i['id'] for i in resolvidos
+                          if i['tipo'] == TIPO_PRODUTO and i.get('tipo_material') == TIPO_ALUGUEL}
+                         | {m for m, c in componentes.items() if c['tipo_material'] == TIPO_ALUGUEL})
+    ids_kits = sorted({i['id'] for i in resolvidos if i['tipo'] == TIPO_KIT and i['encontrado'] and not i['modelo']})
+    reservado_material, reservado_kit = reservas_no_periodo(cursor, inicio, fim, ids_aluguel, ids_kits)
+
+    # Quanto o carrinho pede de cada kit comum e de cada material (direto ou via kit-modelo)
+    pedido_kit, pedido_material = {}, {}
+    for item in resolvidos:
+        if item['tipo'] == TIPO_PRODUTO:
+            pedido_material[item['id']] = pedido_material.get(item['id'], 0) + item['quantidade']
+        elif item['tipo'] == TIPO_KIT and item['id'] in modelos:
+            for c in modelos[item['id']]:
+                pedido_material[c['material_id']] = pedido_material.get(c['material_id'], 0) + item['quantidade'] * c['quantidade']
+        elif item['tipo'] == TIPO_KIT:
+            pedido_kit[item['id']] = pedido_kit.get(item['id'], 0) + 1
+
+    def livre_material(material_id, tipo_material, quantidade_estoque):
+        return livre(TIPO_PRODUTO, tipo_material, quantidade_estoque, reservado=reservado_material.get(material_id, 0))
+
+    for item in resolvidos:
+        if item['tipo'] not in (TIPO_PRODUTO, TIPO_KIT) or not item['encontrado']:
+            item['livre'] = Decimal(0)
+            item['disponivel'] = False if item['tipo'] in (TIPO_PRODUTO, TIPO_KIT) else item['disponivel']
+        elif item['tipo'] == TIPO_PRODUTO:
+            item['livre'] = livre_material(item['id'], item.get('tipo_material'), item['quantidade_estoque'])
+            item['disponivel'] = pedido_material[item['id']] <= item['livre']
+        elif item['id'] in modelos:
+            receita = modelos[item['id']]
+            livres = {c['material_id']: livre_material(c['material_id'], c['tipo_material'], c['quantidade_estoque'])
+                      for c in receita}
+            em_manutencao = item['status'] == 'manutencao'
+            item['livre'] = Decimal(0) if em_manutencao else min(
+                (livres[c['material_id']] // Decimal(c['quantidade']) for c in receita), default=Decimal(0))
+            item['disponivel'] = not em_manutencao and bool(receita) and all(
+                pedido_material[m] <= livres[m] for m in livres)
+        else:
+            item['livre'] = livre(TIPO_KIT, status=item['status'], reservado=reservado_kit.get(item['id'], 0))
+            item['disponivel'] = pedido_kit[item['id']] <= item['livre']
+    return resolvidos
@@ -0,0 +1,153 @@
+"""
+E-mails de orçamento: templates Jinja compilados e cache do conteúdo renderizado.
+
+Os templates ficam em emails/ (fora do template_folder do Flask) e são compilados uma
+única vez, na importação. O conteúdo de um orçamento — itens com nome e preço e o total
+dos itens — e o HTML do e-mail ficam em cache por (orçamento, versão do conteúdo), onde a
+versão é um hash dos campos do orçamento que aparecem no e-mail. Reenvios e a tela
+ver_orcamento reaproveitam o que já foi calculado, sem reler os itens do orçamento.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from catalogo import itens_do_orcamento, nome_do_item
+
+EMAILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emails')
+EMAIL_CACHE_TAMANHO = int(os.getenv('EMAIL_CACHE_TAMANHO', 500))  # Orçamentos mantidos em cache
+
+# Campos do orçamento que entram no e-mail (e, portanto, na versão do conteúdo)
+CAMPOS_CONTEUDO = ('nome_evento', 'data_evento', 'cliente_nome', 'mao_de_obra', 'frete',
+                   'valor_total', 'itens_json', 'token')
+
+
+# --------------------------------------------------------------------------------
+# TEMPLATES
+# --------------------------------------------------------------------------------
+def _moeda(valor):
+    return f"{Decimal(valor or 0):.2f}"
+
+def formatar_data_hora(valor):
+    """'dd/mm/aaaa às HH:MM' a partir de datetime ou texto ('aaaa-mm-dd HH:MM[:SS]' / datetime-local)."""
+    if not isinstance(valor, datetime):
+        texto = str(valor).split('.')[0].replace('T', ' ')
+        formato = '%Y-%m-%d %H:%M:%S' if texto.count(':') == 2 else '%Y-%m-%d %H:%M'
+        valor = datetime.strptime(texto, formato)
+    return valor.strftime('%d/%m/%Y às %H:%M')
+
+
+_env = Environment(
+    loader=FileSystemLoader(EMAILS_DIR),
+    autoescape=select_autoescape(['html']),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False,  # Compilado uma vez; mudanças no template exigem reiniciar o app
+)
+_env.filters['moeda'] = _moeda
+_env.filters['data_hora'] = formatar_data_hora
+
+TEMPLATE_ORCAMENTO = _env.get_template('orcamento.html')
+
+
+# --------------------------------------------------------------------------------
+# CACHE
+# --------------------------------------------------------------------------------
+class RenderCache:
+    """LRU thread-safe com contadores de acertos/faltas."""
+
+    def __init__(self, tamanho=EMAIL_CACHE_TAMANHO):
+        self.tamanho = tamanho
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def get(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.faltas += 1
+            return None
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'itens': len(self._itens), 'tamanho': self.tamanho,
+                    'acertos': self.acertos, 'faltas': self.faltas}
+
+
+_cache = RenderCache()
+
+def cache_stats():
+    return _cache.stats()
+
+
+def versao_conteudo(orcamento):
+    """Hash curto dos campos do orçamento que aparecem no e-mail."""
+    partes = '\x1f'.join(str(orcamento.get(campo)) for campo in CAMPOS_CONTEUDO)
+    return hashlib.sha1(partes.encode('utf-8')).hexdigest()[:16]
+
+
+# --------------------------------------------------------------------------------
+# CONTEÚDO E RENDERIZAÇÃO
+# --------------------------------------------------------------------------------
+def detalhes_orcamento(cursor, orcamento, itens_resolvidos=None):
+    """
+    Itens detalhados (nome, quantidade, valor_unitario, valor_total_item, tipo) e o total dos
+    itens do orçamento, em cache por versão do conteúdo. `orcamento` precisa dos campos de
+    CAMPOS_CONTEUDO (a linha de orcamentos com cliente_nome). Se `itens_resolvidos` vier
+    (quem acabou de resolver o carrinho), orcamento_itens não é consultado.
+    """
+    chave = ('detalhes', orcamento['id'], versao_conteudo(orcamento))
+    detalhes = _cache.get(chave)
+    if detalhes is not None:
+        return detalhes
+
+    if itens_resolvidos is None:
+        itens_resolvidos = itens_do_orcamento(cursor, orcamento['id'])
+
+    itens = [{
+        'nome': nome_do_item(item),
+        'quantidade': item['quantidade'],
+        'valor_unitario': item['valor_unitario'],
+        'valor_total_item': item['valor_total_item'],
+        'tipo': item['tipo'],
+    } for item in itens_resolvidos if item['tipo'] in ('produto', 'kit')]
+    detalhes = {'itens': itens, 'valor_total_itens': sum((i['valor_total_item'] for i in itens), Decimal(0))}
+    return _cache.set(chave, detalhes)
+
+
+def renderizar_email_orcamento(cursor, orcamento, link_aprovacao, reenvio=False, itens_resolvidos=None):
+    """HTML do e-mail do orçamento (original ou reenvio), em cache por versão do conteúdo."""
+    chave = ('email', orcamento['id'], versao_conteudo(orcamento), reenvio, link_aprovacao)
+    html = _cache.get(chave)
+    if html is not None:
+        return html
+
+    detalhes = detalhes_orcamento(cursor, orcamento, itens_resolvidos)
+    html = TEMPLATE_ORCAMENTO.render(
+        orcamento=orcamento,
+        itens=detalhes['itens'],
+        valor_total_itens=detalhes['valor_total_itens'],
+        link_aprovacao=link_aprovacao,
+        reenvio=reenvio,
+    )
+    return _cache.set(chave, html)
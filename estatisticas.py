@@ -0,0 +1,187 @@
+"""
+Resumo do painel (index e dashboard): receita do mês, total de clientes e itens em estoque.
+
+O painel é a tela mais acessada e agregava clientes, estoque e fluxo de caixa a cada
+carregamento (a receita com MONTH(data) = MONTH(CURDATE()), que não usa índice). Agora os
+indicadores ficam em dashboard_stats (migrações 0015/0016) e são mantidos por quem grava,
+na mesma transação da alteração:
+  - movimentar_estoque() soma o saldo movimentado em total_itens_estoque;
+  - cadastro e exclusão de clientes ajustam total_clientes;
+  - lançamentos de receita somam na linha do mês ('receita:aaaa-mm'); exclusões em lote de
+    lançamentos recalculam os meses afetados (recalcular_receita, pelo índice de data).
+ler_estatisticas() faz uma leitura pela chave primária e guarda o resultado em memória por
+DASHBOARD_CACHE_TTL segundos. Gravações neste processo descartam a cópia logo depois do
+commit (descartar_se_alterado(), no fim da requisição): descartá-la antes deixaria outra
+requisição guardar de novo os totais anteriores à gravação.
+
+Se os totais divergirem (ex.: alteração feita direto no banco):
+    python estatisticas.py --recalcular
+"""
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', 5))  # Segundos de vida do resumo em memória
+
+TOTAL_CLIENTES = 'total_clientes'
+TOTAL_ITENS_ESTOQUE = 'total_itens_estoque'
+RECEITA = 'Receita'
+
+_lock = threading.Lock()
+_resumo = None  # (expira_em, mes, valores)
+_geracao = 0    # Incrementada a cada descarte: leitura que começou antes dele não guarda o resultado
+_local = threading.local()  # alterado: a transação desta thread mexeu nos indicadores
+
+
+def _como_data(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor
+    return datetime.strptime(str(valor).strip()[:10], '%Y-%m-%d')
+
+
+def chave_receita(data):
+    """Linha da receita do mês de `data`: 'receita:aaaa-mm'."""
+    return f"receita:{_como_data(data):%Y-%m}"
+
+
+def _expirar():
+    global _resumo, _geracao
+    with _lock:
+        _resumo = None
+        _geracao += 1
+
+
+def _marcar_alterado():
+    _local.alterado = True
+
+
+def descartar_se_alterado():
+    """
+    Descarta o resumo em memória se esta thread gravou indicadores. Chamar depois do commit
+    (ou do rollback) da transação que gravou; o app chama no teardown de cada requisição.
+    """
+    if getattr(_local, 'alterado', False):
+        _local.alterado = False
+        _expirar()
+
+
+def ajustar_estatisticas(cursor, deltas):
+    """
+    Soma `deltas` ({chave: diferença}) nas linhas de dashboard_stats, criando as que faltam.
+    Dentro da transação de quem grava (não faz commit).
+    """
+    linhas = [(chave, delta, delta) for chave, delta in sorted(deltas.items()) if delta]
+    if not linhas:
+        return
+    cursor.executemany(
+        "INSERT INTO dashboard_stats (chave, valor) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE valor = valor + %s, atualizado_em = CURRENT_TIMESTAMP",
+        linhas
+    )
+    _marcar_alterado()
+
+
+def registrar_lancamento(cursor, data, tipo, valor):
+    """Acompanha um lançamento novo do fluxo de caixa (só receitas entram no resumo)."""
+    if tipo == RECEITA and valor:
+        ajustar_estatisticas(cursor, {chave_receita(data): Decimal(str(valor))})
+
+
+def recalcular_receita(cursor, datas):
+    """Refaz a receita dos meses de `datas` a partir do fluxo de caixa (uma soma por mês, pelo índice)."""
+    meses = sorted({datetime(_como_data(d).year, _como_data(d).month, 1) for d in datas if d})
+    for inicio in meses:
+        fim = (inicio + timedelta(days=32)).replace(day=1)
+        cursor.execute(
+            "SELECT COALESCE(SUM(valor), 0) AS total FROM fluxo_caixa WHERE tipo = %s AND data >= %s AND data < %s",
+            (RECEITA, inicio.date(), fim.date())
+        )
+        total = cursor.fetchone()['total']
+        cursor.execute(
+            "INSERT INTO dashboard_stats (chave, valor) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE valor = %s, atualizado_em = CURRENT_TIMESTAMP",
+            (chave_receita(inicio), total, total)
+        )
+    if meses:
+        _marcar_alterado()
+
+
+def recalcular_estatisticas(cursor):
+    """Refaz os totais e a receita de todos os meses com lançamentos. Retorna o resumo do mês atual."""
+    cursor.execute("SELECT COUNT(*) AS n FROM clientes")
+    total_clientes = cursor.fetchone()['n']
+    cursor.execute("SELECT COALESCE(SUM(quantidade_estoque), 0) AS n FROM estoque")
+    total_itens = cursor.fetchone()['n']
+    cursor.executemany(
+        "INSERT INTO dashboard_stats (chave, valor) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE valor = %s, atualizado_em = CURRENT_TIMESTAMP",
+        [(TOTAL_CLIENTES, total_clientes, total_clientes), (TOTAL_ITENS_ESTOQUE, total_itens, total_itens)]
+    )
+    cursor.execute("SELECT MIN(data) AS inicio, MAX(data) AS fim FROM fluxo_caixa WHERE tipo = %s", (RECEITA,))
+    row = cursor.fetchone()
+    if row['inicio']:
+        inicio, fim = _como_data(row['inicio']), _como_data(row['fim'])
+        meses, mes = [], datetime(inicio.year, inicio.month, 1)
+        while mes <= datetime(fim.year, fim.month, 1):
+            meses.append(mes)
+            mes = (mes + timedelta(days=32)).replace(day=1)
+        recalcular_receita(cursor, meses)
+    _marcar_alterado()
+    return ler_estatisticas(cursor)
+
+
+def ler_estatisticas(cursor, agora=None):
+    """
+    {'receita_mes', 'total_clientes', 'total_itens_estoque'} do mês de `agora`: uma leitura
+    de dashboard_stats pela chave primária, reaproveitada por DASHBOARD_CACHE_TTL segundos.
+    """
+    global _resumo
+    mes = chave_receita(agora or datetime.now())
+    # Com gravação ainda não confirmada nesta thread, lê do banco (vê a própria alteração) sem guardar
+    guardar = not getattr(_local, 'alterado', False)
+    with _lock:
+        if guardar and _resumo is not None and _resumo[0] > time.monotonic() and _resumo[1] == mes:
+            return dict(_resumo[2])
+        geracao = _geracao
+    cursor.execute("SELECT chave, valor FROM dashboard_stats WHERE chave IN (%s, %s, %s)",
+                   (mes, TOTAL_CLIENTES, TOTAL_ITENS_ESTOQUE))
+    linhas = {row['chave']: row['valor'] for row in cursor.fetchall()}
+    valores = {'receita_mes': linhas.get(mes, Decimal(0)),
+               'total_clientes': int(linhas.get(TOTAL_CLIENTES, 0)),
+               'total_itens_estoque': linhas.get(TOTAL_ITENS_ESTOQUE, Decimal(0))}
+    if guardar:
+        with _lock:
+            if geracao == _geracao:
+                _resumo = (time.monotonic() + DASHBOARD_CACHE_TTL, mes, valores)
+    return dict(valores)
+
+
+def main(argv=None):
+    import argparse
+
+    from db import get_backend
+
+    parser = argparse.ArgumentParser(description="Resumo do painel (dashboard_stats).")
+    parser.add_argument('--recalcular', action='store_true', required=True,
+                        help="Refaz os totais e a receita mensal a partir das tabelas de origem.")
+    parser.parse_args(argv)
+
+    cnx = get_backend().connect()
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        resumo = recalcular_estatisticas(cursor)
+        cnx.commit()
+        descartar_se_alterado()
+    finally:
+        cursor.close()
+        cnx.close()
+    print(f"Receita do mês: {resumo['receita_mes']}; clientes: {resumo['total_clientes']}; "
+          f"itens em estoque: {resumo['total_itens_estoque']}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Variantes redimensionadas (WebP) das fotos de produtos e kits.
+
+save_image() grava o original e agenda gerar_variantes() num pool de threads: para cada
+largura de VARIANTES é gravado, ao lado do original, '<nome>-<largura>.webp'. As telas
+usam srcset() / miniatura() e continuam funcionando com o original enquanto as variantes
+não existem (ou se o Pillow não estiver instalado). Os nomes nunca são reaproveitados
+(o original tem nome único), então os arquivos de uploads/ podem ser servidos com cache
+imutável.
+
+Para gerar as variantes das fotos já existentes:
+    python imagens.py --gerar-todas
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele as telas usam o original
+    Image = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+VARIANTES = (160, 640)                                      # Larguras geradas (px): miniatura e média
+IMAGENS_QUALIDADE = int(os.getenv('IMAGENS_QUALIDADE', 80))  # Qualidade WebP
+IMAGENS_WORKERS = int(os.getenv('IMAGENS_WORKERS', 2))       # Threads que geram variantes
+
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMAGENS_WORKERS, thread_name_prefix='imagens')
+    return _executor
+
+
+def caminho_variante(rel_path, largura):
+    """'uploads/produtos/abc.jpg' -> 'uploads/produtos/abc-160.webp'."""
+    return f"{rel_path.rsplit('.', 1)[0]}-{largura}.webp"
+
+
+def eh_variante(nome_arquivo):
+    return any(nome_arquivo.endswith(f"-{largura}.webp") for largura in VARIANTES)
+
+
+def _absoluto(rel_path):
+    return os.path.join(STATIC_DIR, rel_path.replace("\\", "/"))
+
+
+def gerar_variantes(rel_path):
+    """Grava as variantes de um original (as que ainda não existem). Retorna as geradas."""
+    if Image is None:
+        return []
+    pendentes = [l for l in VARIANTES if not os.path.exists(_absoluto(caminho_variante(rel_path, l)))]
+    if not pendentes:
+        return []
+    geradas = []
+    with Image.open(_absoluto(rel_path)) as original:
+        original.draft('RGB', (max(pendentes), max(pendentes)))  # JPEG: decodifica já reduzido
+        imagem = ImageOps.exif_transpose(original)
+        if imagem.mode not in ('RGB', 'RGBA'):
+            imagem = imagem.convert('RGBA' if 'transparency' in imagem.info or imagem.mode in ('LA', 'PA') else 'RGB')
+        # Original menor que uma largura: essa variante não é gerada (só a menor, para ter o WebP)
+        for largura in sorted((l for l in pendentes if l <= imagem.width or l == min(VARIANTES)), reverse=True):
+            if imagem.width > largura:
+                imagem = imagem.resize((largura, max(1, round(imagem.height * largura / imagem.width))),
+                                       Image.LANCZOS)
+            destino = _absoluto(caminho_variante(rel_path, largura))
+            temporario = f"{destino}.{os.getpid()}.tmp"
+            imagem.save(temporario, 'WEBP', quality=IMAGENS_QUALIDADE, method=4)
+            os.replace(temporario, destino)  # Quem lê nunca vê um arquivo pela metade
+            geradas.append(caminho_variante(rel_path, largura))
+    return geradas
+
+
+def _gerar_com_log(rel_path):
+    try:
+        return gerar_variantes(rel_path)
+    except Exception as e:
+        print(f"Erro ao gerar variantes de {rel_path}: {e}")
+        return []
+
+
+def agendar_variantes(rel_path):
+    """Gera as variantes em segundo plano; retorna o Future (None sem Pillow ou sem foto)."""
+    if Image is None or not rel_path:
+        return None
+    return _pool().submit(_gerar_com_log, rel_path)
+
+
+def remover_variantes(rel_path):
+    for largura in VARIANTES:
+        try:
+            os.remove(_absoluto(caminho_variante(rel_path, largura)))
+        except FileNotFoundError:
+            pass
+
+
+# --------------------------------------------------------------------------------
+# TEMPLATES
+# --------------------------------------------------------------------------------
+def _variantes_prontas(rel_path):
+    return [(l, caminho_variante(rel_path, l)) for l in VARIANTES
+            if os.path.exists(_absoluto(caminho_variante(rel_path, l)))]
+
+
+def miniatura(rel_path, url_for):
+    """URL da menor variante pronta (ou do original)."""
+    if not rel_path:
+        return None
+    prontas = _variantes_prontas(rel_path)
+    return url_for('static', filename=prontas[0][1] if prontas else rel_path)
+
+
+def srcset(rel_path, url_for):
+    """Valor do atributo srcset com as variantes prontas ('' enquanto não houver nenhuma)."""
+    if not rel_path:
+        return ''
+    return ', '.join(f"{url_for('static', filename=caminho)} {largura}w"
+                     for largura, caminho in _variantes_prontas(rel_path))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Variantes WebP das fotos de produtos e kits.")
+    parser.add_argument('--gerar-todas', action='store_true', required=True,
+                        help="Gera as variantes que faltam para todos os originais em static/uploads.")
+    parser.parse_args(argv)
+    if Image is None:
+        print("Pillow não está instalado (pip install pillow).")
+        return 1
+
+    originais = []
+    for pasta, _, arquivos in os.walk(os.path.join(STATIC_DIR, 'uploads')):
+        for arquivo in arquivos:
+            rel_path = os.path.relpath(os.path.join(pasta, arquivo), STATIC_DIR).replace(os.sep, '/')
+            if arquivo.endswith('.tmp') or eh_variante(arquivo):
+                continue
+            originais.append(rel_path)
+    geradas = sum(len(g) for g in _pool().map(_gerar_com_log, originais))
+    print(f"{len(originais)} originais, {geradas} variantes geradas.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
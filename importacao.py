@@ -0,0 +1,300 @@
+"""
+Importação em lote de materiais do estoque a partir de planilhas (.xlsx ou .csv).
+
+A planilha é lida em streaming (openpyxl em modo read_only, ou csv) e processada em lotes
+de IMPORTACAO_LOTE linhas. Cada lote é validado com as mesmas regras do cadastro manual
+(estoque_evento), com uma única consulta de nomes já cadastrados, e gravado numa transação
+própria:
+  - INSERT em lote (executemany) no estoque, com quantidade 0;
+  - as quantidades iniciais entram por movimentar_estoque() (um UPDATE e um INSERT no livro
+    de movimentos para o lote inteiro);
+  - as despesas automáticas de compra vão para o fluxo_caixa com executemany.
+Linhas inválidas não impedem as demais: voltam no relatório, com o número da linha e o motivo.
+
+Colunas reconhecidas (cabeçalho na primeira linha; maiúsculas e acentos não importam):
+    nome, tipo_material, unidade_medida, quantidade_estoque, quantidade_venda,
+    preco_compra, preco_repasse
+
+Uso (linha de comando):
+    python importacao.py fornecedor.xlsx
+"""
+import csv
+import io
+import os
+import re
+import sys
+import unicodedata
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from atividades import CADASTRO_PRODUTO, registrar_atividade
+from cache_catalogo import ESTOQUE, invalidar_catalogo
+from movimentos import COMPRA, movimentar_estoque
+
+IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', 500))  # Linhas validadas e gravadas por transação
+
+TIPOS_MATERIAL = ('descartavel', 'aluguel', 'venda', 'kit_componente')
+UNIDADES_COM_QTD = {'pacote', 'caixa', 'saco', 'pote'}  # Exigem quantidade por unidade (quantidade_venda)
+
+# Cabeçalhos aceitos para cada coluna (já sem acentos e em minúsculas)
+COLUNAS = {
+    'nome': ('nome', 'nome_material', 'material', 'produto', 'descricao'),
+    'tipo_material': ('tipo_material', 'tipo'),
+    'unidade_medida': ('unidade_medida', 'unidade'),
+    'quantidade_estoque': ('quantidade_estoque', 'quantidade', 'qtd', 'estoque'),
+    'quantidade_venda': ('quantidade_venda', 'quantidade_por_unidade', 'qtd_por_unidade'),
+    'preco_compra': ('preco_compra', 'custo', 'valor_compra'),
+    'preco_repasse': ('preco_repasse', 'preco', 'preco_venda', 'valor'),
+}
+
+
+class ErroImportacao(Exception):
+    """Planilha ilegível ou sem as colunas obrigatórias."""
+
+
+# --------------------------------------------------------------------------------
+# LEITURA
+# --------------------------------------------------------------------------------
+def _normalizar_cabecalho(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(texto.strip().lower().replace('-', ' ').split())
+
+
+def _mapa_colunas(cabecalho):
+    """{coluna: índice} a partir da linha de cabeçalho."""
+    normalizado = [_normalizar_cabecalho(c) for c in cabecalho]
+    mapa = {}
+    for coluna, apelidos in COLUNAS.items():
+        for apelido in apelidos:
+            if apelido in normalizado:
+                mapa[coluna] = normalizado.index(apelido)
+                break
+    faltando = [c for c in ('nome', 'tipo_material') if c not in mapa]
+    if faltando:
+        raise ErroImportacao(f"Coluna(s) obrigatória(s) ausente(s): {', '.join(faltando)}.")
+    return mapa
+
+
+def _linhas_xlsx(arquivo):
+    from openpyxl import load_workbook
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from livro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        livro.close()
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+    yield from csv.reader(texto, dialeto)
+
+
+def ler_planilha(arquivo, nome_arquivo):
+    """
+    Gera (número da linha, {coluna: valor}) para cada linha de dados, sem carregar a planilha
+    inteira. `arquivo` é um arquivo binário (upload ou open(..., 'rb')).
+    """
+    extensao = nome_arquivo.rsplit('.', 1)[-1].lower()
+    if extensao == 'xlsx':
+        linhas = _linhas_xlsx(arquivo)
+    elif extensao == 'csv':
+        linhas = _linhas_csv(arquivo)
+    else:
+        raise ErroImportacao("Formato não suportado: envie um arquivo .xlsx ou .csv.")
+
+    try:
+        mapa = _mapa_colunas(next(linhas))
+    except StopIteration:
+        raise ErroImportacao("A planilha está vazia.") from None
+    for numero, valores in enumerate(linhas, start=2):
+        if not valores or all(v is None or str(v).strip() == '' for v in valores):
+            continue
+        yield numero, {coluna: valores[i] if i < len(valores) else None for coluna, i in mapa.items()}
+
+
+# --------------------------------------------------------------------------------
+# VALIDAÇÃO
+# --------------------------------------------------------------------------------
+_MILHAR = re.compile(r'-?\d{1,3}(\.\d{3})+')
+
+
+def _numero(valor, campo):
+    if valor is None or str(valor).strip() == '':
+        return Decimal(0)
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor))
+    texto = str(valor).strip().replace('R$', '').strip()
+    if ',' in texto:  # 1.234,56 -> 1234.56
+        texto = texto.replace('.', '').replace(',', '.')
+    elif _MILHAR.fullmatch(texto):  # 1.000 -> 1000 (planilha pt-BR), e não 1.0
+        texto = texto.replace('.', '')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f"{campo} inválido: {valor}") from None
+
+
+def validar_linha(dados):
+    """Material pronto para gravar, com as regras do cadastro manual; levanta ValueError."""
+    nome = str(dados.get('nome') or '').strip().lower()
+    if not nome:
+        raise ValueError("Nome vazio.")
+    tipo_material = _normalizar_cabecalho(dados.get('tipo_material'))
+    if tipo_material not in TIPOS_MATERIAL:
+        raise ValueError(f"Tipo de material inválido: {dados.get('tipo_material')}")
+    unidade_medida = str(dados.get('unidade_medida') or '').strip().lower() or 'unidade'
+
+    quantidade_estoque = _numero(dados.get('quantidade_estoque'), 'quantidade_estoque')
+    preco_compra = _numero(dados.get('preco_compra'), 'preco_compra')
+    preco_repasse = _numero(dados.get('preco_repasse'), 'preco_repasse')
+    if quantidade_estoque < 0 or preco_compra < 0 or preco_repasse < 0:
+        raise ValueError("Quantidade e preços não podem ser negativos.")
+
+    quantidade_venda = None
+    if unidade_medida in UNIDADES_COM_QTD:
+        quantidade_venda = _numero(dados.get('quantidade_venda'), 'quantidade_venda')
+        if quantidade_venda <= 0:
+            raise ValueError("Quantidade por unidade é obrigatória e deve ser maior que zero para esta unidade.")
+
+    return {'nome': nome, 'tipo_material': tipo_material, 'unidade_medida': unidade_medida,
+            'quantidade_venda': quantidade_venda, 'quantidade_estoque': quantidade_estoque,
+            'preco_compra': preco_compra, 'preco_repasse': preco_repasse}
+
+
+# --------------------------------------------------------------------------------
+# GRAVAÇÃO
+# --------------------------------------------------------------------------------
+def _gravar_lote(cursor, materiais):
+    """Grava um lote já validado e sem nomes repetidos. Não faz commit."""
+    cursor.executemany(
+        "INSERT INTO estoque (nome, tipo_material, unidade_medida, quantidade_venda, quantidade_estoque, preco_compra, preco_repasse) "
+        "VALUES (%s, %s, %s, %s, 0, %s, %s)",
+        [(m['nome'], m['tipo_material'], m['unidade_medida'], m['quantidade_venda'], m['preco_compra'], m['preco_repasse'])
+         for m in materiais]
+    )
+    # Ids pelo nome (único): o lastrowid de um executemany não garante ids consecutivos
+    cursor.execute(f"SELECT id, nome FROM estoque WHERE nome IN ({', '.join(['%s'] * len(materiais))})",
+                   tuple(m['nome'] for m in materiais))
+    ids = {row['nome']: row['id'] for row in cursor.fetchall()}
+
+    movimentar_estoque(cursor, [(ids[m['nome']], m['quantidade_estoque']) for m in materiais], COMPRA)
+    if not any(m['quantidade_estoque'] for m in materiais):
+        invalidar_catalogo(cursor, ESTOQUE)  # Sem quantidade inicial o lote não passa pelo livro
+
+    hoje = datetime.now().date()
+    despesas = [(hoje, f"Compra de estoque: {m['nome'].capitalize()}", "Despesa",
+                 m['preco_compra'] * m['quantidade_estoque'],
+                 f"Lançamento automático de {m['quantidade_estoque']} unidade(s) a R$ {m['preco_compra']:.2f} cada.")
+                for m in materiais if m['preco_compra'] > 0 and m['quantidade_estoque'] > 0]
+    if despesas:
+        cursor.executemany(
+            "INSERT INTO fluxo_caixa (data, descricao, tipo, valor, observacoes) VALUES (%s, %s, %s, %s, %s)",
+            despesas
+        )
+
+
+def importar_estoque(cnx, linhas, lote=IMPORTACAO_LOTE):
+    """
+    Importa as linhas de ler_planilha() em lotes, um commit por lote.
+    Retorna {'linhas', 'importados', 'erros': [{'linha', 'nome', 'erro'}]}.
+    """
+    relatorio = {'linhas': 0, 'importados': 0, 'erros': []}
+    vistos = set()
+    cursor = cnx.cursor(dictionary=True)
+
+    def processar(pendentes):
+        validos = []
+        for numero, dados in pendentes:
+            try:
+                material = validar_linha(dados)
+            except ValueError as e:
+                relatorio['erros'].append({'linha': numero, 'nome': dados.get('nome'), 'erro': str(e)})
+                continue
+            if material['nome'] in vistos:
+                relatorio['erros'].append({'linha': numero, 'nome': material['nome'], 'erro': "Nome repetido na planilha."})
+                continue
+            vistos.add(material['nome'])
+            validos.append((numero, material))
+        if not validos:
+            return
+
+        cursor.execute(f"SELECT nome FROM estoque WHERE nome IN ({', '.join(['%s'] * len(validos))})",
+                       tuple(m['nome'] for _, m in validos))
+        existentes = {row['nome'] for row in cursor.fetchall()}
+        novos = []
+        for numero, material in validos:
+            if material['nome'] in existentes:
+                relatorio['erros'].append({'linha': numero, 'nome': material['nome'], 'erro': "Material com este nome já existe."})
+            else:
+                novos.append((numero, material))
+        if not novos:
+            cnx.rollback()  # Encerra a transação de leitura
+            return
+
+        try:
+            _gravar_lote(cursor, [m for _, m in novos])
+            cnx.commit()
+            relatorio['importados'] += len(novos)
+        except Exception as e:
+            cnx.rollback()
+            # Nada do lote foi gravado: uma linha seguinte com o mesmo nome ainda pode entrar
+            vistos.difference_update(m['nome'] for _, m in novos)
+            relatorio['erros'] += [{'linha': numero, 'nome': m['nome'], 'erro': f"Lote não gravado: {e}"}
+                                   for numero, m in novos]
+
+    try:
+        pendentes = []
+        for numero, dados in linhas:
+            relatorio['linhas'] += 1
+            pendentes.append((numero, dados))
+            if len(pendentes) >= lote:
+                processar(pendentes)
+                pendentes = []
+        if pendentes:
+            processar(pendentes)
+        if relatorio['importados']:
+            # Uma atividade por importação no feed do painel, não uma por lote ou material
+            registrar_atividade(cursor, CADASTRO_PRODUTO, None,
+                                f"{relatorio['importados']} produto(s) importado(s) de planilha.")
+            cnx.commit()
+    finally:
+        cursor.close()
+    relatorio['erros'].sort(key=lambda e: e['linha'])
+    return relatorio
+
+
+def main(argv=None):
+    import argparse
+
+    from db import get_backend
+
+    parser = argparse.ArgumentParser(description="Importa materiais do estoque de uma planilha .xlsx ou .csv.")
+    parser.add_argument('arquivo')
+    parser.add_argument('--lote', type=int, default=IMPORTACAO_LOTE, help="Linhas por transação.")
+    args = parser.parse_args(argv)
+
+    cnx = get_backend().connect()
+    try:
+        with open(args.arquivo, 'rb') as arquivo:
+            relatorio = importar_estoque(cnx, ler_planilha(arquivo, args.arquivo), args.lote)
+    except ErroImportacao as e:
+        print(f"ERRO: {e}")
+        return 1
+    finally:
+        cnx.close()
+
+    for erro in relatorio['erros']:
+        print(f"Linha {erro['linha']} ({erro['nome']}): {erro['erro']}")
+    print(f"{relatorio['linhas']} linhas, {relatorio['importados']} materiais importados, {len(relatorio['erros'])} com erro.")
+    return 1 if relatorio['erros'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Listagem paginada dos eventos (controle_eventos e /api/eventos).
+
+A tela carregava todos os eventos já cadastrados de uma vez. listar_eventos() devolve uma
+página por vez, em ordem de (data_evento, id) decrescente, e continua a partir do cursor
+da página anterior (keyset: eventos "antes" do último visto), sem OFFSET. Os filtros
+(status, status de pagamento, cliente e janela de datas) ficam no banco, cada um com um
+índice (filtro, data_evento) (migrações 0002 e 0012); no InnoDB e no SQLite o índice
+secundário já carrega o id, então a ordenação e o desempate saem do próprio índice.
+
+contar_eventos() responde a contagem por status numa consulta agregada, para as abas e
+totais da tela, sem trazer as linhas.
+
+eventos_na_janela() alimenta o calendário (/api/eventos/feed): só os eventos que cruzam a
+janela visível, pelo índice de intervalos idx_eventos_periodo (migração 0006).
+"""
+from datetime import datetime, timedelta
+
+from disponibilidade import como_datetime
+
+EVENTOS_POR_PAGINA = 50
+EVENTOS_POR_PAGINA_MAX = 200
+FEED_JANELA_MAX_DIAS = 400  # Maior janela aceita pelo feed do calendário (visão anual + bordas)
+
+
+def codificar_cursor(linha, campo='data_evento'):
+    """Cursor da página seguinte: 'aaaa-mm-ddTHH:MM:SS_id' da última linha da página (data em `campo`)."""
+    return f"{como_datetime(linha[campo]).isoformat()}_{linha['id']}"
+
+
+def decodificar_cursor(cursor_pagina):
+    """(data, id) de um cursor de codificar_cursor(); ValueError se for inválido."""
+    data, _, id_evento = str(cursor_pagina).rpartition('_')
+    return como_datetime(data), int(id_evento)
+
+
+def _filtros(status=None, status_pagamento=None, cliente_id=None, data_inicio=None, data_fim=None):
+    filtros, params = [], []
+    if status:
+        filtros.append("e.status = %s")
+        params.append(status)
+    if status_pagamento:
+        filtros.append("e.status_pagamento = %s")
+        params.append(status_pagamento)
+    if cliente_id:
+        filtros.append("e.cliente_id = %s")
+        params.append(int(cliente_id))
+    if data_inicio:
+        filtros.append("e.data_evento >= %s")
+        params.append(como_datetime(data_inicio))
+    if data_fim:
+        # Só a data ('aaaa-mm-dd'): o dia inteiro entra na janela
+        fim = como_datetime(data_fim)
+        so_data = len(str(data_fim).strip()) <= 10
+        filtros.append("e.data_evento < %s" if so_data else "e.data_evento <= %s")
+        params.append(fim + timedelta(days=1) if so_data else fim)
+    return filtros, params
+
+
+def listar_eventos(cursor, apos=None, limite=EVENTOS_POR_PAGINA, **filtros):
+    """
+    Uma página de eventos, mais recentes primeiro. `apos` é o cursor devolvido pela página
+    anterior; `filtros`: status, status_pagamento, cliente_id, data_inicio, data_fim.
+    Retorna {'itens': [...], 'proximo': cursor da próxima página ou None}.
+    """
+    limite = max(1, min(int(limite), EVENTOS_POR_PAGINA_MAX))
+    condicoes, params = _filtros(**filtros)
+    if apos:
+        data, id_evento = decodificar_cursor(apos)
+        # O limite data_evento <= ... deixa o banco começar a leitura do índice no cursor
+        condicoes.append("e.data_evento <= %s AND (e.data_evento < %s OR (e.data_evento = %s AND e.id < %s))")
+        params += [data, data, data, id_evento]
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    cursor.execute(f"""
+        SELECT e.id, e.nome_evento, e.data_evento, e.recolhimento_evento, e.observacoes, e.cliente_id,
+               c.nome AS cliente_nome, e.status, e.valor_total, e.status_pagamento, e.valor_pago
+        FROM eventos e
+        JOIN clientes c ON e.cliente_id = c.id
+        {where}
+        ORDER BY e.data_evento DESC, e.id DESC
+        LIMIT %s
+    """, tuple(params) + (limite + 1,))
+    itens = cursor.fetchall()
+    proximo = codificar_cursor(itens[limite - 1]) if len(itens) > limite else None
+    return {'itens': itens[:limite], 'proximo': proximo}
+
+
+def contar_eventos(cursor, status=None, **filtros):
+    """
+    Contagem dos eventos com os filtros: {'total', 'por_status': {status: n}}. por_status
+    ignora o filtro de status (são as abas da tela); total respeita todos os filtros.
+    """
+    condicoes, params = _filtros(**filtros)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    cursor.execute(f"SELECT e.status, COUNT(*) AS n FROM eventos e {where} GROUP BY e.status", tuple(params))
+    por_status = {row['status']: int(row['n']) for row in cursor.fetchall()}
+    total = por_status.get(status, 0) if status else sum(por_status.values())
+    return {'total': total, 'por_status': por_status}
+
+
+# --------------------------------------------------------------------------------
+# FEED DO CALENDÁRIO
+# --------------------------------------------------------------------------------
+def _data_do_feed(valor):
+    """Data ISO 8601 do calendário ('aaaa-mm-dd', com hora e fuso opcionais), sem fuso."""
+    try:
+        return datetime.fromisoformat(str(valor).strip().replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f"Data inválida: {valor}") from None
+
+
+def janela_do_mes(agora=None):
+    """(inicio, fim) do mês de `agora`: a janela que as telas mandam já no HTML."""
+    hoje = agora or datetime.now()
+    inicio = datetime(hoje.year, hoje.month, 1)
+    return inicio, datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+
+
+def janela_do_feed(start, end):
+    """(inicio, fim) da janela visível do calendário; ValueError se faltar, inverter ou passar do máximo."""
+    if not start or not end:
+        raise ValueError("Informe start e end.")
+    inicio, fim = _data_do_feed(start), _data_do_feed(end)
+    if fim <= inicio:
+        raise ValueError("end deve ser posterior a start.")
+    if fim - inicio > timedelta(days=FEED_JANELA_MAX_DIAS):
+        raise ValueError(f"A janela não pode passar de {FEED_JANELA_MAX_DIAS} dias.")
+    return inicio, fim
+
+
+def eventos_na_janela(cursor, inicio, fim):
+    """
+    Eventos que cruzam [inicio, fim), no formato compacto do calendário:
+    [{'id', 'title', 'start', 'end', 'status', 'cliente'}], datas em ISO 8601.
+    """
+    cursor.execute("""
+        SELECT e.id, e.nome_evento, e.data_evento, e.recolhimento_evento, e.status, c.nome AS cliente_nome
+        FROM eventos e
+        JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.recolhimento_evento >= %s AND e.data_evento < %s
+        ORDER BY e.data_evento, e.id
+    """, (inicio, fim))
+    return [{'id': row['id'], 'title': row['nome_evento'],
+             'start': como_datetime(row['data_evento']).isoformat(),
+             'end': como_datetime(row['recolhimento_evento'] or row['data_evento']).isoformat(),
+             'status': row['status'], 'cliente': row['cliente_nome']}
+            for row in cursor.fetchall()]
@@ -0,0 +1,158 @@
+-- Migração 0001: esquema inicial (as 12 tabelas originais do sistema).
+-- Usa IF NOT EXISTS para adotar bancos que já existiam antes do controle de versão.
+-- A ordem é importante para respeitar as chaves estrangeiras.
+
+-- 1. Tabela: users
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(80) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL, -- Armazena o hash bcrypt
+    role ENUM('admin', 'user') DEFAULT 'user' NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 2. Tabela: clientes
+CREATE TABLE IF NOT EXISTS clientes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    telefone VARCHAR(20),
+    email VARCHAR(255) NOT NULL UNIQUE, -- Garante que cada cliente tenha um e-mail único
+    cpf VARCHAR(11) NOT NULL UNIQUE,
+    cep VARCHAR(8),
+    endereco VARCHAR(255),
+    bairro VARCHAR(100),
+    cidade VARCHAR(100),
+    uf VARCHAR(2),
+    numero VARCHAR(20),
+    complemento VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 3. Tabela: configuracoes_email
+CREATE TABLE IF NOT EXISTS configuracoes_email (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(255) NOT NULL,
+    codigo_app VARCHAR(255) NOT NULL, -- Código/Senha de App do Gmail
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 4. Tabela: estoque
+CREATE TABLE IF NOT EXISTS estoque (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL UNIQUE,
+    tipo_material ENUM('descartavel', 'aluguel', 'venda', 'kit_componente') NOT NULL,
+    unidade_medida VARCHAR(50) DEFAULT 'unidade',
+    quantidade_venda DECIMAL(10, 2), -- Quantidade em uma unidade de medida maior (ex: unidades em uma caixa)
+    quantidade_estoque DECIMAL(10, 2) NOT NULL,
+    preco_compra DECIMAL(10, 2) NOT NULL,
+    preco_repasse DECIMAL(10, 2) NOT NULL, -- Preço de venda/aluguel para o cliente
+    foto_path VARCHAR(255),
+    data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 5. Tabela: kits
+CREATE TABLE IF NOT EXISTS kits (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL UNIQUE,
+    valor DECIMAL(10, 2) NOT NULL, -- Preço de repasse do kit
+    foto_path VARCHAR(255),
+    status ENUM('disponivel', 'em_uso', 'manutencao') DEFAULT 'disponivel' NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 6. Tabela: kit_itens
+CREATE TABLE IF NOT EXISTS kit_itens (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kit_id INT NOT NULL,
+    material_id INT NOT NULL, -- Componente do kit (referência à tabela 'estoque')
+    quantidade DECIMAL(10, 2) NOT NULL,
+    FOREIGN KEY (kit_id) REFERENCES kits(id) ON DELETE CASCADE,
+    FOREIGN KEY (material_id) REFERENCES estoque(id) ON DELETE RESTRICT, -- RESTRICT para evitar a exclusão de um produto que está em um kit
+    UNIQUE KEY uk_kit_material (kit_id, material_id) -- Garante que um kit não tenha o mesmo material duas vezes
+) ENGINE=InnoDB;
+
+-- 7. Tabela: orcamentos
+CREATE TABLE IF NOT EXISTS orcamentos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    cliente_id INT NOT NULL,
+    nome_evento VARCHAR(255) NOT NULL,
+    tipo_evento VARCHAR(100),
+    data_evento DATETIME NOT NULL,
+    recolhimento_evento DATETIME,
+    observacoes TEXT,
+    valor_total DECIMAL(10, 2) NOT NULL,
+    mao_de_obra DECIMAL(10, 2) DEFAULT 0.00,
+    frete DECIMAL(10, 2) DEFAULT 0.00,
+    itens_json JSON NOT NULL, -- Armazena os itens selecionados como JSON
+    token VARCHAR(36) NOT NULL UNIQUE, -- Token de aprovação por e-mail
+    status ENUM('Pendente', 'Aprovado', 'Recusado') DEFAULT 'Pendente' NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE RESTRICT
+) ENGINE=InnoDB;
+
+-- 8. Tabela: eventos
+CREATE TABLE IF NOT EXISTS eventos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    orcamento_id INT UNIQUE, -- Link para o orçamento que gerou este evento (OPCIONAL, pode ser NULL)
+    cliente_id INT NOT NULL,
+    nome_evento VARCHAR(255) NOT NULL,
+    tipo_evento VARCHAR(100),
+    data_evento DATETIME NOT NULL,
+    recolhimento_evento DATETIME,
+    observacoes TEXT,
+    valor_total DECIMAL(10, 2) NOT NULL,
+    valor_pago DECIMAL(10, 2) DEFAULT 0.00, -- Novo campo para rastrear o total pago
+    mao_de_obra DECIMAL(10, 2) DEFAULT 0.00,
+    frete DECIMAL(10, 2) DEFAULT 0.00,
+    status ENUM('Pendente', 'Confirmado', 'Em Montagem', 'Finalizado', 'Finalização Parcial') DEFAULT 'Confirmado' NOT NULL,
+    status_pagamento ENUM('Pendente', 'Parcial', 'Total') DEFAULT 'Pendente' NOT NULL,
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE RESTRICT,
+    FOREIGN KEY (orcamento_id) REFERENCES orcamentos(id) ON DELETE SET NULL -- Se o orçamento for deletado, a chave externa é zerada
+) ENGINE=InnoDB;
+
+-- 9. Tabela: montagem_materiais
+CREATE TABLE IF NOT EXISTS montagem_materiais (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    evento_id INT NOT NULL,
+    material_id INT, -- ID do produto da tabela 'estoque' (para produtos avulsos)
+    kit_id INT, -- ID do kit da tabela 'kits' (para kits)
+    quantidade DECIMAL(10, 2) NOT NULL,
+    valor_item DECIMAL(10, 2), -- Valor do item no momento do cadastro do evento (para histórico)
+    FOREIGN KEY (evento_id) REFERENCES eventos(id) ON DELETE CASCADE,
+    FOREIGN KEY (material_id) REFERENCES estoque(id) ON DELETE RESTRICT,
+    FOREIGN KEY (kit_id) REFERENCES kits(id) ON DELETE RESTRICT,
+    -- Uma restrição para garantir que haja apenas material_id OU kit_id, mas não ambos.
+    CONSTRAINT chk_material_or_kit CHECK (
+        (material_id IS NULL AND kit_id IS NOT NULL) OR 
+        (material_id IS NOT NULL AND kit_id IS NULL)
+    )
+) ENGINE=InnoDB;
+
+-- 10. Tabela: fluxo_caixa
+CREATE TABLE IF NOT EXISTS fluxo_caixa (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    data DATE NOT NULL,
+    descricao VARCHAR(255) NOT NULL,
+    tipo ENUM('Receita', 'Despesa') NOT NULL,
+    valor DECIMAL(10, 2) NOT NULL,
+    observacoes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 11. Tabela: log_atividades
+CREATE TABLE IF NOT EXISTS log_atividades (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL, -- Ex: MUDANCA_STATUS_EVENTO, EXCLUSAO, CADASTRO_PRODUTO
+    id_referencia INT, -- ID do registro (evento, produto, etc.) que foi alterado (pode ser NULL)
+    descricao TEXT NOT NULL,
+    data_log TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- 12. Tabela: precos
+CREATE TABLE IF NOT EXISTS precos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL UNIQUE,
+    tipo ENUM('servico', 'mao_de_obra', 'frete', 'outro') NOT NULL,
+    preco DECIMAL(10, 2) NOT NULL
+) ENGINE=InnoDB;
@@ -0,0 +1,17 @@
+-- Migração 0002: índices secundários para os filtros e ordenações mais usados.
+-- Conferidos com EXPLAIN por `python verificar_indices.py`.
+
+-- relatorio_eventos / exportar_relatorio_eventos: período, tipo e status de pagamento
+CREATE INDEX idx_eventos_data_evento ON eventos (data_evento);
+CREATE INDEX idx_eventos_tipo_data ON eventos (tipo_evento, data_evento);
+CREATE INDEX idx_eventos_pagamento_data ON eventos (status_pagamento, data_evento);
+
+-- fluxo_caixa: filtro por período, com ou sem tipo (Receita/Despesa)
+CREATE INDEX idx_fluxo_caixa_data ON fluxo_caixa (data);
+CREATE INDEX idx_fluxo_caixa_tipo_data ON fluxo_caixa (tipo, data);
+
+-- dashboard: últimos logs de um tipo
+CREATE INDEX idx_log_atividades_tipo_data ON log_atividades (tipo, data_log);
+
+-- orcamento_eventos: lista de orçamentos mais recentes primeiro
+CREATE INDEX idx_orcamentos_created_at ON orcamentos (created_at);
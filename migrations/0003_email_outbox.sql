@@ -0,0 +1,24 @@
+-- Migração 0003: caixa de saída de e-mails (outbox transacional).
+-- Os e-mails de orçamento são gravados aqui na mesma transação do orçamento e enviados
+-- depois pelo worker de outbox.py, com novas tentativas e fila de falhas definitivas.
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    orcamento_id INT, -- Orçamento de origem (NULL para e-mails avulsos ou orçamento excluído)
+    remetente VARCHAR(255) NOT NULL,
+    destinatario VARCHAR(255) NOT NULL,
+    assunto VARCHAR(255) NOT NULL,
+    corpo_html MEDIUMTEXT NOT NULL,
+    status ENUM('pendente', 'enviando', 'enviado', 'falhou') DEFAULT 'pendente' NOT NULL,
+    tentativas INT DEFAULT 0 NOT NULL,
+    proxima_tentativa DATETIME NOT NULL, -- Quando o e-mail pode ser (re)tentado
+    reservado_por VARCHAR(64), -- Worker que está enviando (status 'enviando')
+    reservado_em DATETIME,
+    enviado_em DATETIME,
+    ultimo_erro TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (orcamento_id) REFERENCES orcamentos(id) ON DELETE SET NULL
+) ENGINE=InnoDB;
+
+-- Fila do worker: pendentes cuja hora de tentativa já chegou, na ordem de chegada
+CREATE INDEX idx_email_outbox_status_proxima ON email_outbox (status, proxima_tentativa);
@@ -0,0 +1,24 @@
+-- Migração 0004: itens do orçamento em tabela própria (antes só em orcamentos.itens_json).
+-- Nome e valor unitário são fotografados no momento do orçamento, então o orçamento continua
+-- igual mesmo que o preço ou o nome do produto/kit mude (ou que ele seja excluído) depois.
+-- O itens_json continua sendo gravado por compatibilidade; a leitura passa a ser por aqui.
+
+CREATE TABLE IF NOT EXISTS orcamento_itens (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    orcamento_id INT NOT NULL,
+    posicao INT NOT NULL, -- Ordem do item no carrinho
+    tipo ENUM('produto', 'kit') NOT NULL,
+    material_id INT, -- Preenchido quando tipo = 'produto'
+    kit_id INT, -- Preenchido quando tipo = 'kit'
+    nome VARCHAR(255) NOT NULL, -- Nome no momento do orçamento
+    quantidade INT NOT NULL,
+    valor_unitario DECIMAL(10, 2) NOT NULL, -- Preço no momento do orçamento
+    FOREIGN KEY (orcamento_id) REFERENCES orcamentos(id) ON DELETE CASCADE,
+    FOREIGN KEY (material_id) REFERENCES estoque(id) ON DELETE SET NULL,
+    FOREIGN KEY (kit_id) REFERENCES kits(id) ON DELETE SET NULL,
+    UNIQUE KEY uk_orcamento_posicao (orcamento_id, posicao)
+) ENGINE=InnoDB;
+
+-- "Quais orçamentos contêm o material/kit X": busca pelo item e junta com o orçamento
+CREATE INDEX idx_orcamento_itens_material ON orcamento_itens (material_id, orcamento_id);
+CREATE INDEX idx_orcamento_itens_kit ON orcamento_itens (kit_id, orcamento_id);
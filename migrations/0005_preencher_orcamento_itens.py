@@ -0,0 +1,52 @@
+"""
+Migração 0005: preenche orcamento_itens a partir do itens_json dos orçamentos existentes.
+
+Os orçamentos antigos não guardavam o preço de cada item, então o nome e o valor unitário
+fotografados aqui são os do catálogo no momento da migração. Itens cujo produto/kit não
+existe mais entram com valor 0 e um nome indicativo; tipos desconhecidos são ignorados.
+"""
+import json
+
+LOTE = 1000
+
+
+def _por_id(cursor, tabela, colunas, ids):
+    if not ids:
+        return {}
+    in_clause = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"SELECT id, {colunas} FROM {tabela} WHERE id IN ({in_clause})", tuple(ids))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def upgrade(cursor):
+    cursor.execute(
+        "SELECT o.id, o.itens_json FROM orcamentos o "
+        "WHERE NOT EXISTS (SELECT 1 FROM orcamento_itens oi WHERE oi.orcamento_id = o.id) ORDER BY o.id"
+    )
+    orcamentos = [(orcamento_id, json.loads(itens_json or '[]')) for orcamento_id, itens_json in cursor.fetchall()]
+
+    ids_produtos = {int(i['id']) for _, itens in orcamentos for i in itens if i.get('tipo') == 'produto'}
+    ids_kits = {int(i['id']) for _, itens in orcamentos for i in itens if i.get('tipo') == 'kit'}
+    produtos = _por_id(cursor, 'estoque', 'nome, preco_repasse', sorted(ids_produtos))
+    kits = _por_id(cursor, 'kits', 'nome, valor', sorted(ids_kits))
+
+    linhas = []
+    for orcamento_id, itens in orcamentos:
+        for posicao, item in enumerate(itens):
+            item_id = int(item['id'])
+            if item.get('tipo') == 'produto':
+                catalogo, material_id, kit_id = produtos, item_id, None
+            elif item.get('tipo') == 'kit':
+                catalogo, material_id, kit_id = kits, None, item_id
+            else:
+                continue
+            nome, valor = catalogo.get(item_id, (f"ITEM ID {item_id} ({item['tipo'].upper()}) (Removido)", 0))
+            if item_id not in catalogo:
+                material_id = kit_id = None  # A chave estrangeira não pode apontar para um item excluído
+            linhas.append((orcamento_id, posicao, item['tipo'], material_id, kit_id, nome, int(item['quantidade']), valor))
+
+    sql = ("INSERT INTO orcamento_itens (orcamento_id, posicao, tipo, material_id, kit_id, nome, quantidade, valor_unitario) "
+           "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
+    for i in range(0, len(linhas), LOTE):
+        cursor.executemany(sql, linhas[i:i + LOTE])
+    print(f"  {len(linhas)} item(ns) de {len(orcamentos)} orçamento(s) copiados para orcamento_itens.")
@@ -0,0 +1,28 @@
+-- Migração 0006: disponibilidade de itens de aluguel e kits por período.
+-- A reserva de um item de aluguel/kit passa a ser a própria linha em montagem_materiais,
+-- valendo de data_evento a recolhimento_evento (ver disponibilidade.py). Assim:
+--   - quantidade_estoque de itens de aluguel é o total de peças, e não baixa ao criar o evento
+--   - kits deixam de usar o status 'em_uso' (continuam 'disponivel' ou 'manutencao')
+
+-- Índice de intervalos: eventos que terminam depois do início da janela e começam antes do fim.
+-- recolhimento_evento vem primeiro porque a janela consultada quase sempre é futura, e poucos
+-- eventos terminam depois dela (os passados ficam fora da faixa do índice).
+-- Vem antes das atualizações: no MySQL o DDL confirma a transação, e as devoluções ao estoque
+-- precisam ser confirmadas junto com o registro da migração (uma repetição não soma duas vezes)
+CREATE INDEX idx_eventos_periodo ON eventos (recolhimento_evento, data_evento);
+
+-- O período da reserva precisa de um fim: eventos sem recolhimento terminam no próprio dia/hora do evento
+UPDATE eventos SET recolhimento_evento = data_evento WHERE recolhimento_evento IS NULL;
+
+-- Devolve ao estoque as peças de aluguel de eventos ainda em aberto (antes eram baixadas na criação)
+UPDATE estoque
+SET quantidade_estoque = quantidade_estoque + (
+    SELECT COALESCE(SUM(mm.quantidade), 0)
+    FROM montagem_materiais mm
+    JOIN eventos e ON e.id = mm.evento_id
+    WHERE mm.material_id = estoque.id
+      AND e.status NOT IN ('Finalizado', 'Finalização Parcial')
+)
+WHERE tipo_material = 'aluguel';
+
+UPDATE kits SET status = 'disponivel' WHERE status = 'em_uso';
@@ -0,0 +1,25 @@
+-- Migração 0007: livro de movimentos de estoque (só inserção).
+-- Toda alteração de estoque.quantidade_estoque passa por movimentos.movimentar_estoque(), que
+-- grava aqui uma linha por material com a quantidade movimentada (com sinal) e o saldo logo
+-- depois. quantidade_estoque continua sendo o saldo atual, mantido na mesma transação.
+-- O histórico de um material é apagado junto com ele; eventos e kits podem ser excluídos
+-- sem perder os movimentos (evento_id/kit_id são só referência, sem chave estrangeira).
+
+CREATE TABLE IF NOT EXISTS movimentos_estoque (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    material_id INT NOT NULL,
+    quantidade DECIMAL(10, 2) NOT NULL, -- Positiva = entrada, negativa = saída
+    saldo_apos DECIMAL(10, 2) NOT NULL, -- quantidade_estoque logo depois do movimento
+    motivo ENUM('saldo_inicial', 'compra', 'kit', 'kit_desfeito', 'evento', 'evento_excluido', 'perda', 'ajuste') NOT NULL,
+    evento_id INT,
+    kit_id INT,
+    criado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (material_id) REFERENCES estoque(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- "Saldo do material X na data D" = último movimento de X com criado_em <= D (uma busca no índice)
+CREATE INDEX idx_movimentos_material_data ON movimentos_estoque (material_id, criado_em, id);
+
+-- Saldo de abertura: o saldo atual de cada material, no momento da migração
+INSERT INTO movimentos_estoque (material_id, quantidade, saldo_apos, motivo)
+SELECT id, quantidade_estoque, quantidade_estoque, 'saldo_inicial' FROM estoque;
@@ -0,0 +1,12 @@
+-- Migração 0008: contadores de versão do catálogo (cache_catalogo.py).
+-- Cada processo guarda em memória as listas de produtos, kits e preços, identificadas pela
+-- versão de cada tabela. Quem grava incrementa a versão na mesma transação da alteração, e
+-- os demais processos (workers) percebem a mudança na próxima leitura da versão.
+
+CREATE TABLE IF NOT EXISTS versoes (
+    nome VARCHAR(50) PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+INSERT INTO versoes (nome, versao) VALUES ('estoque', 0), ('kits', 0), ('precos', 0);
@@ -0,0 +1,7 @@
+-- Migração 0009: índices da listagem paginada do estoque (catalogo.listar_estoque).
+-- A listagem anda por id decrescente a partir do cursor (id < último visto); com filtro,
+-- o índice (filtro, id) entrega as linhas já na ordem, sem ordenar o estoque inteiro.
+-- A busca por prefixo do nome usa o índice único que estoque.nome já tem.
+
+CREATE INDEX idx_estoque_tipo_id ON estoque (tipo_material, id);
+CREATE INDEX idx_estoque_unidade_id ON estoque (unidade_medida, id);
@@ -0,0 +1,6 @@
+-- Migração 0010: índices de foto_path (uploads.py).
+-- Com o armazenamento endereçado pelo conteúdo, o mesmo arquivo pode ser usado por vários
+-- produtos/kits; antes de apagar um arquivo conta-se quem ainda o referencia.
+
+CREATE INDEX idx_estoque_foto_path ON estoque (foto_path);
+CREATE INDEX idx_kits_foto_path ON kits (foto_path);
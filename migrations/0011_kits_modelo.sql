@@ -0,0 +1,7 @@
+-- Migração 0011: kits-modelo.
+-- Um kit comum é uma unidade montada: as peças saem do estoque quando ele é cadastrado.
+-- Um kit-modelo (modelo = TRUE) é só a receita: as peças continuam no estoque e cada kit
+-- pedido reserva/consome os componentes. Quantos kits-modelo cabem no estoque é o menor
+-- FLOOR(quantidade_estoque / quantidade no kit) entre os componentes (catalogo.capacidade_kits).
+
+ALTER TABLE kits ADD COLUMN modelo BOOLEAN NOT NULL DEFAULT FALSE;
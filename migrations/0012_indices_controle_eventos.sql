@@ -0,0 +1,8 @@
+-- Migração 0012: índices da listagem paginada de eventos (listagem_eventos.py).
+-- A tela de controle anda por (data_evento, id) decrescente a partir do cursor. Sem filtro,
+-- idx_eventos_data_evento (0002) já serve: o índice secundário carrega o id. Com filtro de
+-- status ou de cliente, o índice (filtro, data_evento) entrega as linhas já na ordem, e a
+-- contagem por status sai do próprio índice. O filtro de pagamento usa idx_eventos_pagamento_data.
+
+CREATE INDEX idx_eventos_status_data ON eventos (status, data_evento);
+CREATE INDEX idx_eventos_cliente_data ON eventos (cliente_id, data_evento);
@@ -0,0 +1,5 @@
+-- Migração 0013: contador de versão da agenda de eventos (cache_catalogo.py).
+-- Quem grava um evento incrementa a versão 'eventos' na mesma transação; o feed do calendário
+-- usa a versão como ETag e guarda as janelas já consultadas em cache.
+
+INSERT INTO versoes (nome, versao) VALUES ('eventos', 0);
@@ -0,0 +1,8 @@
+-- Migração 0014: assinatura do calendário (ICS) por usuário (agenda_ics.py).
+-- Cada usuário pode gerar um link secreto para assinar a agenda no celular. Só o SHA-256 do
+-- token fica no banco: quem lê a tabela não consegue montar o link, e a busca pelo token
+-- continua sendo uma consulta de índice.
+
+ALTER TABLE users ADD COLUMN ics_token CHAR(64) NULL;
+
+CREATE UNIQUE INDEX idx_users_ics_token ON users (ics_token);
@@ -0,0 +1,10 @@
+-- Migração 0015: resumo do painel mantido pelas gravações (estatisticas.py).
+-- Uma linha por indicador: total de clientes, total de itens em estoque e a receita de cada
+-- mês ('receita:aaaa-mm'). Quem grava soma a diferença na mesma transação; o painel lê as
+-- linhas do mês pela chave primária, em vez de agregar clientes, estoque e fluxo de caixa.
+
+CREATE TABLE IF NOT EXISTS dashboard_stats (
+    chave VARCHAR(50) PRIMARY KEY,
+    valor DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    atualizado_em DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
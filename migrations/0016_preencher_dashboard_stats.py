@@ -0,0 +1,33 @@
+"""
+Migração 0016: preenche dashboard_stats com os totais atuais.
+
+Os totais de clientes e de estoque são agregados uma vez; a receita é somada por mês a
+partir dos lançamentos 'Receita' do fluxo de caixa (em Python, para valer no MySQL e no
+SQLite). Daqui em diante as gravações mantêm as linhas (estatisticas.py).
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+
+def _mes(valor):
+    if isinstance(valor, (date, datetime)):
+        return f"{valor:%Y-%m}"
+    return str(valor)[:7]  # Texto 'aaaa-mm-dd...' (SQLite)
+
+
+def upgrade(cursor):
+    cursor.execute("SELECT COUNT(*) FROM clientes")
+    total_clientes = cursor.fetchone()[0] or 0
+    cursor.execute("SELECT COALESCE(SUM(quantidade_estoque), 0) FROM estoque")
+    total_itens_estoque = cursor.fetchone()[0] or 0
+
+    receitas = defaultdict(Decimal)
+    cursor.execute("SELECT data, valor FROM fluxo_caixa WHERE tipo = 'Receita' AND data IS NOT NULL")
+    for data, valor in cursor.fetchall():
+        receitas[_mes(data)] += Decimal(str(valor or 0))
+
+    linhas = [('total_clientes', total_clientes), ('total_itens_estoque', total_itens_estoque)]
+    linhas += [(f"receita:{mes}", valor) for mes, valor in sorted(receitas.items())]
+    cursor.executemany("INSERT INTO dashboard_stats (chave, valor) VALUES (%s, %s)", linhas)
+    print(f"  {len(linhas) - 2} mês(es) de receita e 2 totais gravados em dashboard_stats.")
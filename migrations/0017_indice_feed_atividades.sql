@@ -0,0 +1,6 @@
+-- Migração 0017: índice do feed de atividades do painel (atividades.py).
+-- O feed junta todos os tipos e anda por (data_log, id) decrescente a partir do cursor. O
+-- índice secundário já carrega o id, então a ordenação e o desempate saem do próprio índice
+-- (idx_log_atividades_tipo_data, da 0002, só serve para um tipo por vez).
+
+CREATE INDEX idx_log_atividades_data ON log_atividades (data_log);
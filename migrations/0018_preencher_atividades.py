@@ -0,0 +1,45 @@
+"""
+Migração 0018: preenche o feed de atividades (log_atividades) com o histórico existente.
+
+Até aqui o log só tinha as exclusões de eventos; o painel lia eventos e produtos direto
+das tabelas. Cada evento, orçamento, pagamento, produto, kit e cliente já cadastrado vira
+uma linha do log com a data original, para o feed unificado (atividades.py) começar com
+o mesmo histórico. Daqui em diante quem grava registra a própria atividade.
+"""
+LOTE = 1000
+
+
+def _descricoes(cursor):
+    # Na ordem em que dependem umas das outras, para o desempate de linhas com a mesma data
+    cursor.execute("SELECT id, nome, created_at FROM clientes")
+    for id_, nome, data in cursor.fetchall():
+        yield 'CADASTRO_CLIENTE', id_, f"Cliente {nome} cadastrado.", data
+    cursor.execute("SELECT id, nome, data_cadastro FROM estoque")
+    for id_, nome, data in cursor.fetchall():
+        yield 'CADASTRO_PRODUTO', id_, f"Produto '{nome}' cadastrado.", data
+    cursor.execute("SELECT id, nome, created_at FROM kits")
+    for id_, nome, data in cursor.fetchall():
+        yield 'CADASTRO_KIT', id_, f"Kit '{nome}' cadastrado.", data
+    cursor.execute("SELECT o.id, o.nome_evento, c.nome, o.created_at FROM orcamentos o JOIN clientes c ON o.cliente_id = c.id")
+    for id_, nome, cliente, data in cursor.fetchall():
+        yield 'ORCAMENTO_CRIADO', id_, f"Orçamento '{nome}' enviado para {cliente}.", data
+    cursor.execute("SELECT e.id, e.nome_evento, c.nome, e.data_criacao FROM eventos e JOIN clientes c ON e.cliente_id = c.id")
+    for id_, nome, cliente, data in cursor.fetchall():
+        yield 'EVENTO_CRIADO', id_, f"Evento '{nome}' cadastrado para o cliente {cliente}.", data
+    # Pagamentos de eventos: os lançamentos automáticos de registrar_pagamento
+    cursor.execute("SELECT descricao, valor, created_at FROM fluxo_caixa "
+                   "WHERE tipo = 'Receita' AND descricao LIKE 'Receita do evento: %'")
+    for descricao, valor, data in cursor.fetchall():
+        evento = descricao.split(': ', 1)[1]
+        yield 'PAGAMENTO', None, f"Pagamento de R$ {float(valor or 0):.2f} no evento '{evento}'.", data
+
+
+def upgrade(cursor):
+    linhas = [linha for linha in _descricoes(cursor) if linha[3] is not None]
+    linhas.sort(key=lambda linha: str(linha[3]))  # Ids na ordem cronológica, como se gravados na hora
+    for i in range(0, len(linhas), LOTE):
+        cursor.executemany(
+            "INSERT INTO log_atividades (tipo, id_referencia, descricao, data_log) VALUES (%s, %s, %s, %s)",
+            linhas[i:i + LOTE]
+        )
+    print(f"  {len(linhas)} atividade(s) copiadas para log_atividades.")
@@ -0,0 +1,189 @@
+"""
+Livro de movimentos de estoque (tabela movimentos_estoque).
+
+Toda alteração de estoque.quantidade_estoque passa por movimentar_estoque(): um único UPDATE
+para todos os materiais do lote (CASE por id) e um INSERT em lote no livro, com o saldo
+resultante de cada material. quantidade_estoque é o saldo materializado; o livro é o
+histórico. Assim:
+  - "saldo em D" é o saldo_apos do último movimento até D (busca no índice
+    idx_movimentos_material_data, uma por material);
+  - conciliar_estoque() confere quantidade_estoque contra a soma e o último saldo do livro.
+
+Uso (linha de comando):
+    python movimentos.py --conciliar
+    python movimentos.py --saldo-em 2025-01-31
+"""
+import sys
+from decimal import Decimal
+
+from cache_catalogo import ESTOQUE, invalidar_catalogo
+from estatisticas import TOTAL_ITENS_ESTOQUE, ajustar_estatisticas
+
+# Motivos aceitos pela coluna movimentos_estoque.motivo
+SALDO_INICIAL = 'saldo_inicial'
+COMPRA = 'compra'
+KIT = 'kit'                          # Peças que passam a compor um kit
+KIT_DESFEITO = 'kit_desfeito'        # Peças que voltam ao estoque quando o kit é excluído
+EVENTO = 'evento'                    # Consumo de um evento
+EVENTO_EXCLUIDO = 'evento_excluido'  # Devolução do consumo de um evento excluído
+PERDA = 'perda'                      # Peças de aluguel não devolvidas (finalização parcial)
+AJUSTE = 'ajuste'
+
+
+class SaldoInsuficiente(Exception):
+    """Um movimento com exigir_saldo deixaria o saldo de algum material negativo."""
+
+    def __init__(self, material_ids):
+        self.material_ids = material_ids
+        super().__init__(f"Saldo insuficiente para os materiais {', '.join(map(str, material_ids))}.")
+
+
+def movimentar_estoque(cursor, movimentos, motivo, evento_id=None, kit_id=None, exigir_saldo=False):
+    """
+    Aplica um lote de movimentos [(material_id, quantidade com sinal)] e grava o livro.
+    Quantidades do mesmo material são somadas (uma linha no livro por material); zeros são
+    ignorados. Com `exigir_saldo`, nenhum saldo pode ficar negativo (UPDATE condicional;
+    levanta SaldoInsuficiente e quem chama faz rollback). `cursor` de dicionário; não faz commit.
+    Incrementa a versão do estoque no cache do catálogo (cache_catalogo.py) e soma o saldo
+    movimentado no total de itens do painel (estatisticas.py).
+    Retorna {material_id: saldo depois do movimento}.
+    """
+    total = {}
+    for material_id, quantidade in movimentos:
+        total[int(material_id)] = total.get(int(material_id), Decimal(0)) + Decimal(str(quantidade))
+    total = {i: q for i, q in sorted(total.items()) if q != 0}
+    if not total:
+        return {}
+
+    ids = list(total)
+    in_clause = ', '.join(['%s'] * len(ids))
+    caso = "CASE id " + " ".join(["WHEN %s THEN %s"] * len(ids)) + " END"
+    pares = tuple(v for par in total.items() for v in par)
+    condicao, params = "", pares + tuple(ids)
+    if exigir_saldo:
+        condicao = f" AND quantidade_estoque + {caso} >= 0"
+        params += pares
+    cursor.execute(
+        f"UPDATE estoque SET quantidade_estoque = quantidade_estoque + {caso} WHERE id IN ({in_clause}){condicao}",
+        params
+    )
+    if cursor.rowcount != len(ids):
+        if exigir_saldo:
+            raise SaldoInsuficiente(ids)
+        raise ValueError(f"Material não encontrado entre {ids}.")
+
+    # As linhas estão travadas pelo UPDATE até o fim da transação: o saldo lido é o que ficou
+    cursor.execute(f"SELECT id, quantidade_estoque FROM estoque WHERE id IN ({in_clause})", tuple(ids))
+    saldos = {row['id']: row['quantidade_estoque'] for row in cursor.fetchall()}
+    cursor.executemany(
+        "INSERT INTO movimentos_estoque (material_id, quantidade, saldo_apos, motivo, evento_id, kit_id) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        [(material_id, quantidade, saldos[material_id], motivo, evento_id, kit_id)
+         for material_id, quantidade in total.items()]
+    )
+    invalidar_catalogo(cursor, ESTOQUE)
+    ajustar_estatisticas(cursor, {TOTAL_ITENS_ESTOQUE: sum(total.values())})
+    return saldos
+
+
+# --------------------------------------------------------------------------------
+# CONSULTAS
+# --------------------------------------------------------------------------------
+def saldo_em(cursor, data, material_ids=None):
+    """
+    Saldo de cada material ao fim de `data` (datetime ou 'aaaa-mm-dd[ HH:MM:SS]'), pelo livro.
+    Retorna [{'id', 'nome', 'saldo'}]; saldo None = sem movimentos até a data (material
+    cadastrado depois, ou data anterior à criação do livro).
+    """
+    data = str(data)
+    if len(data) == 10:
+        data += ' 23:59:59'
+    filtro, params = "", [data]
+    if material_ids:
+        filtro = f"WHERE e.id IN ({', '.join(['%s'] * len(material_ids))})"
+        params += list(material_ids)
+    cursor.execute(f"""
+        SELECT e.id, e.nome,
+               (SELECT m.saldo_apos FROM movimentos_estoque m
+                WHERE m.material_id = e.id AND m.criado_em <= %s
+                ORDER BY m.criado_em DESC, m.id DESC LIMIT 1) AS saldo
+        FROM estoque e {filtro}
+        ORDER BY e.nome
+    """, tuple(params))
+    return cursor.fetchall()
+
+
+def movimentos_do_material(cursor, material_id, data_inicio=None, data_fim=None, limite=200):
+    """Movimentos de um material no período, mais recentes primeiro."""
+    filtros, params = ["material_id = %s"], [material_id]
+    if data_inicio:
+        filtros.append("criado_em >= %s")
+        params.append(str(data_inicio))
+    if data_fim:
+        filtros.append("criado_em <= %s")
+        params.append(str(data_fim) + (' 23:59:59' if len(str(data_fim)) == 10 else ''))
+    cursor.execute(
+        "SELECT id, quantidade, saldo_apos, motivo, evento_id, kit_id, criado_em FROM movimentos_estoque "
+        f"WHERE {' AND '.join(filtros)} ORDER BY criado_em DESC, id DESC LIMIT %s",
+        tuple(params) + (int(limite),)
+    )
+    return cursor.fetchall()
+
+
+def conciliar_estoque(cursor):
+    """
+    Materiais cujo saldo materializado não bate com o livro:
+    [{'id', 'nome', 'quantidade_estoque', 'soma_movimentos', 'ultimo_saldo'}].
+    """
+    cursor.execute("""
+        SELECT e.id, e.nome, e.quantidade_estoque,
+               (SELECT SUM(m.quantidade) FROM movimentos_estoque m WHERE m.material_id = e.id) AS soma_movimentos,
+               (SELECT m.saldo_apos FROM movimentos_estoque m WHERE m.material_id = e.id
+                ORDER BY m.criado_em DESC, m.id DESC LIMIT 1) AS ultimo_saldo
+        FROM estoque e
+        ORDER BY e.id
+    """)
+    divergentes = []
+    for row in cursor.fetchall():
+        saldo = Decimal(row['quantidade_estoque'])
+        if (Decimal(row['soma_movimentos'] or 0) != saldo
+                or row['ultimo_saldo'] is None and saldo != 0
+                or row['ultimo_saldo'] is not None and Decimal(row['ultimo_saldo']) != saldo):
+            divergentes.append(row)
+    return divergentes
+
+
+def main(argv=None):
+    import argparse
+
+    from db import get_backend
+
+    parser = argparse.ArgumentParser(description="Livro de movimentos de estoque.")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--conciliar', action='store_true', help="Confere quantidade_estoque contra o livro.")
+    grupo.add_argument('--saldo-em', metavar='DATA', help="Saldo de cada material na data (aaaa-mm-dd).")
+    args = parser.parse_args(argv)
+
+    cnx = get_backend().connect()
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        if args.saldo_em:
+            for row in saldo_em(cursor, args.saldo_em):
+                print(f"{row['id']:6d}  {row['nome'][:40]:40s}  {'-' if row['saldo'] is None else row['saldo']}")
+            return 0
+        divergentes = conciliar_estoque(cursor)
+    finally:
+        cursor.close()
+        cnx.close()
+
+    for row in divergentes:
+        print(f"DIVERGENTE: material {row['id']} ({row['nome']}): estoque {row['quantidade_estoque']}, "
+              f"soma do livro {row['soma_movimentos']}, último saldo {row['ultimo_saldo']}")
+    if divergentes:
+        return 1
+    print("OK: estoque confere com o livro de movimentos.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
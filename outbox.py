@@ -0,0 +1,520 @@
+"""
+Caixa de saída de e-mails (outbox transacional) e o worker que a esvazia.
+
+As rotas não falam mais com o servidor SMTP: elas chamam enfileirar_email() com o
+cursor da própria transação, de modo que o e-mail só existe se o orçamento for gravado
+(e vice-versa). Um OutboxWorker em segundo plano reserva os pendentes, envia por SMTP
+e registra o resultado:
+  - sucesso: status 'enviado';
+  - falha: nova tentativa após um intervalo exponencial (OUTBOX_BACKOFF_BASE * 2^n,
+    limitado a OUTBOX_BACKOFF_MAX);
+  - após OUTBOX_MAX_TENTATIVAS falhas: status 'falhou' (fila de falhas definitivas),
+    de onde pode ser reenfileirado manualmente.
+
+A reserva é otimista (UPDATE ... WHERE status = 'pendente' e conferência do rowcount),
+então vários workers/processos podem rodar ao mesmo tempo sem enviar duas vezes. Durante
+o envio o worker renova a reserva a cada mensagem e confere, antes de cada uma, que ela
+ainda é dele: só uma reserva parada há OUTBOX_RESERVA_MAX segundos (worker que caiu) volta
+para a fila, e nunca a de um lote que está apenas lento.
+
+Para testar com um servidor SMTP local (sem TLS e sem autenticação):
+    python -m smtpd -n -c DebuggingServer localhost:1025      # Python <= 3.11
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_SSL=0 python outbox.py --uma-vez
+"""
+import os
+import random
+import smtplib
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from dotenv import load_dotenv
+
+from db import get_pool
+
+load_dotenv()
+
+OUTBOX_INTERVALO = float(os.getenv('OUTBOX_INTERVALO', 5))         # Segundos entre varreduras da fila
+OUTBOX_LOTE = int(os.getenv('OUTBOX_LOTE', 20))                    # E-mails reservados por varredura
+OUTBOX_MAX_TENTATIVAS = int(os.getenv('OUTBOX_MAX_TENTATIVAS', 6)) # Depois disso vai para 'falhou'
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', 30))  # Segundos até a 1ª nova tentativa
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 3600))  # Teto do intervalo entre tentativas
+OUTBOX_RESERVA_MAX = float(os.getenv('OUTBOX_RESERVA_MAX', 600))   # Reserva 'enviando' sem renovação há mais que isso é liberada
+                                                                   # (cobre uma mensagem: 2 tentativas com timeouts de 30 s)
+
+SMTP_KEEPALIVE = float(os.getenv('SMTP_KEEPALIVE', 30))            # Sessão parada há mais que isso é conferida com NOOP
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 240))     # Sessão parada há mais que isso é encerrada
+SMTP_MAX_POR_SESSAO = int(os.getenv('SMTP_MAX_POR_SESSAO', 90))    # Mensagens por sessão antes de reconectar
+
+STATUS_OUTBOX = ('pendente', 'enviando', 'enviado', 'falhou')
+
+
+class ReservaPerdida(Exception):
+    """A reserva do e-mail expirou e passou para outro worker: este não envia nem registra nada."""
+
+
+# --------------------------------------------------------------------------------
+# ENFILEIRAMENTO (chamado pelas rotas, dentro da transação delas)
+# --------------------------------------------------------------------------------
+def enfileirar_email(cursor, remetente, destinatario, assunto, corpo_html, orcamento_id=None):
+    """
+    Grava um e-mail na outbox usando o cursor (e a transação) de quem chamou.
+    Não faz commit: o e-mail é confirmado ou desfeito junto com o resto da transação.
+    Retorna o id do e-mail na fila.
+    """
+    cursor.execute(
+        "INSERT INTO email_outbox (orcamento_id, remetente, destinatario, assunto, corpo_html, proxima_tentativa) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        (orcamento_id, remetente, destinatario, assunto, corpo_html, datetime.now())
+    )
+    return cursor.lastrowid
+
+
+def intervalo_nova_tentativa(tentativas):
+    """Espera (segundos) antes da próxima tentativa, com variação aleatória de até 10%."""
+    espera = min(OUTBOX_BACKOFF_BASE * (2 ** max(tentativas - 1, 0)), OUTBOX_BACKOFF_MAX)
+    return espera * random.uniform(0.9, 1.1)
+
+
+# --------------------------------------------------------------------------------
+# ENVIO SMTP
+# --------------------------------------------------------------------------------
+def montar_mensagem(email):
+    """EmailMessage (HTML) a partir de uma linha da outbox."""
+    msg = EmailMessage()
+    msg['Subject'] = email['assunto']
+    msg['From'] = email['remetente']
+    msg['To'] = email['destinatario']
+    msg['Date'] = formatdate(localtime=True)
+    msg['Message-ID'] = make_msgid()
+    msg.set_content("Este e-mail precisa de um leitor com suporte a HTML.")
+    msg.add_alternative(email['corpo_html'], subtype='html')
+    return msg
+
+
+def _chave_config(config):
+    return (config['servidor'], config['porta'], bool(config.get('ssl')), config.get('usuario'), config.get('senha'))
+
+
+class SMTPConnectionManager:
+    """
+    Sessão SMTP de longa duração, reaproveitada entre lotes.
+
+    Abrir uma sessão custa conexão TCP + handshake TLS + EHLO + AUTH; com ela aberta, cada
+    mensagem custa só MAIL/RCPT/DATA. O gerenciador:
+      - reaproveita a sessão enquanto a configuração não mudar;
+      - antes de reusar uma sessão parada há mais de `keepalive` segundos, confere com NOOP;
+      - reconecta e tenta de novo (uma vez) se a sessão cair no meio do envio;
+      - encerra a sessão após `max_mensagens` envios (limite comum dos provedores) ou
+        `idle_timeout` segundos ociosa (ver manter_viva()).
+    É thread-safe: envios concorrentes são serializados na mesma sessão.
+    """
+
+    # Recusas de uma mensagem específica: a sessão continua válida
+    ERROS_DA_MENSAGEM = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+    def __init__(self, keepalive=SMTP_KEEPALIVE, idle_timeout=SMTP_IDLE_TIMEOUT,
+                 max_mensagens=SMTP_MAX_POR_SESSAO, timeout=30):
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.max_mensagens = max_mensagens
+        self.timeout = timeout
+        self._smtp = None
+        self._chave = None
+        self._ultimo_uso = 0.0
+        self._enviadas_na_sessao = 0
+        self._lock = threading.RLock()
+        self._stats = {'sessoes': 0, 'reconexoes': 0, 'noops': 0, 'enviadas': 0, 'recusadas': 0}
+
+    # -- sessão -------------------------------------------------------------
+
+    def _abrir(self, config):
+        classe = smtplib.SMTP_SSL if config.get('ssl') else smtplib.SMTP
+        smtp = classe(config['servidor'], config['porta'], timeout=config.get('timeout', self.timeout))
+        try:
+            if config.get('usuario') and config.get('senha'):
+                smtp.login(config['usuario'], config['senha'])
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self._chave = _chave_config(config)
+        self._enviadas_na_sessao = 0
+        self._ultimo_uso = time.monotonic()
+        self._stats['sessoes'] += 1
+        return smtp
+
+    def _viva(self):
+        """NOOP na sessão atual; False se o servidor não responder 250."""
+        try:
+            self._stats['noops'] += 1
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _sessao(self, config):
+        """Sessão pronta para uso com esta configuração (reaproveitada, conferida ou nova)."""
+        if self._smtp is not None:
+            ociosa = time.monotonic() - self._ultimo_uso
+            if (_chave_config(config) != self._chave or ociosa > self.idle_timeout
+                    or (ociosa > self.keepalive and not self._viva())):
+                self.fechar()
+        return self._smtp or self._abrir(config)
+
+    def fechar(self):
+        """Encerra a sessão atual (QUIT), se houver."""
+        with self._lock:
+            smtp, self._smtp = self._smtp, None
+            if smtp is not None:
+                try:
+                    smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    smtp.close()
+
+    def manter_viva(self):
+        """
+        Chamado nos intervalos ociosos: encerra a sessão parada há mais de idle_timeout e
+        manda NOOP na que passou de keepalive (o servidor derruba sessões mudas).
+        """
+        with self._lock:
+            if self._smtp is None:
+                return
+            ociosa = time.monotonic() - self._ultimo_uso
+            if ociosa > self.idle_timeout:
+                self.fechar()
+            elif ociosa > self.keepalive:
+                if self._viva():
+                    self._ultimo_uso = time.monotonic()
+                else:
+                    self.fechar()
+
+    # -- envio --------------------------------------------------------------
+
+    def enviar(self, config, mensagens):
+        """
+        Envia as mensagens reaproveitando a sessão.
+        `config`: dict com servidor, porta, ssl, usuario, senha (e timeout opcional).
+        Retorna [(mensagem, None | exceção)] na mesma ordem.
+        """
+        resultados = []
+        with self._lock:
+            for i, msg in enumerate(mensagens):
+                for tentativa in (1, 2):
+                    try:
+                        smtp = self._sessao(config)
+                    except (smtplib.SMTPException, OSError) as e:
+                        # Sem sessão (servidor fora, TLS, login): esta e as restantes falham
+                        resultados.extend((restante, e) for restante in mensagens[i:])
+                        return resultados
+                    try:
+                        smtp.send_message(msg)
+                        resultados.append((msg, None))
+                        self._stats['enviadas'] += 1
+                    except self.ERROS_DA_MENSAGEM as e:
+                        resultados.append((msg, e))
+                        self._stats['recusadas'] += 1
+                    except (smtplib.SMTPException, OSError) as e:
+                        # Sessão caiu: descarta e, na primeira vez, tenta de novo numa nova
+                        self.fechar()
+                        if tentativa == 1:
+                            self._stats['reconexoes'] += 1
+                            continue
+                        resultados.append((msg, e))
+                    break
+
+                self._ultimo_uso = time.monotonic()
+                self._enviadas_na_sessao += 1
+                if self._enviadas_na_sessao >= self.max_mensagens:
+                    self.fechar()
+        return resultados
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['conectado'] = self._smtp is not None
+            return stats
+
+
+def enviar_smtp(config, mensagens):
+    """Envio avulso numa sessão aberta e encerrada só para estas mensagens."""
+    smtp = SMTPConnectionManager()
+    try:
+        return smtp.enviar(config, mensagens)
+    finally:
+        smtp.fechar()
+
+
+# --------------------------------------------------------------------------------
+# WORKER
+# --------------------------------------------------------------------------------
+class OutboxWorker:
+    """
+    Thread que esvazia a outbox periodicamente.
+    `config_smtp` é uma função sem argumentos que devolve o dict de SMTPConnectionManager.enviar();
+    ela é chamada a cada lote, então mudanças de configuração valem a partir do lote seguinte.
+    Os lotes reaproveitam a mesma sessão SMTP (self.smtp), mantida viva com NOOP entre eles.
+    `enviar` permite trocar o transporte (padrão: self.smtp.enviar).
+    """
+
+    def __init__(self, config_smtp, intervalo=OUTBOX_INTERVALO, lote=OUTBOX_LOTE, enviar=None):
+        self.config_smtp = config_smtp
+        self.intervalo = intervalo
+        self.lote = lote
+        self.smtp = SMTPConnectionManager()
+        self.enviar = enviar or self.smtp.enviar
+        self.nome = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    # -- ciclo de vida ------------------------------------------------------
+
+    def iniciar(self):
+        """Inicia a thread (daemon) do worker, se ainda não estiver rodando."""
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, name="outbox-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self, timeout=None):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.smtp.fechar()
+
+    def acordar(self):
+        """Pede uma varredura imediata (ex.: logo após o commit de um orçamento)."""
+        self._acordar.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                while self.processar_lote() >= self.lote and not self._parar.is_set():
+                    pass  # Lote cheio: provavelmente há mais na fila
+            except Exception as e:
+                print(f"Erro no worker da outbox: {e}")
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self.smtp.manter_viva()
+            except Exception as e:
+                print(f"Erro ao manter a sessão SMTP: {e}")
+
+    # -- uma varredura ------------------------------------------------------
+
+    def processar_lote(self):
+        """Reserva, envia e registra um lote. Retorna quantos e-mails foram processados."""
+        emails = self._reservar()
+        if not emails:
+            return 0
+
+        config = self.config_smtp()
+        erros = []
+        for i, email in enumerate(emails):
+            # Heartbeat: renova a reserva do que falta do lote e confere que esta mensagem
+            # continua reservada por este worker antes de enviá-la
+            if email['id'] not in self._renovar_reserva([e['id'] for e in emails[i:]]):
+                erros.append(ReservaPerdida())
+                continue
+            try:
+                erro = self.enviar(config, [montar_mensagem(email)])[0][1]
+            except Exception as e:
+                erro = e
+            erros.append(erro)
+            if erro is not None and not isinstance(erro, SMTPConnectionManager.ERROS_DA_MENSAGEM):
+                # Falha da sessão (conexão, TLS, login): conta como falha para o resto do lote
+                erros += [erro] * (len(emails) - len(erros))
+                break
+
+        self._registrar(emails, erros)
+        return len(emails)
+
+    def _reservar(self):
+        pool = get_pool()
+        cnx = pool.checkout()
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            agora = datetime.now()
+            # Reservas antigas (worker que caiu no meio do envio) voltam para a fila
+            cursor.execute(
+                "UPDATE email_outbox SET status = 'pendente', reservado_por = NULL "
+                "WHERE status = 'enviando' AND reservado_em < %s",
+                (agora - timedelta(seconds=OUTBOX_RESERVA_MAX),)
+            )
+            cursor.execute(
+                "SELECT id FROM email_outbox WHERE status = 'pendente' AND proxima_tentativa <= %s "
+                "ORDER BY proxima_tentativa, id LIMIT %s",
+                (agora, self.lote)
+            )
+            candidatos = [row['id'] for row in cursor.fetchall()]
+
+            reservados = []
+            for email_id in candidatos:
+                # Reserva otimista: só um worker consegue mudar 'pendente' -> 'enviando'
+                cursor.execute(
+                    "UPDATE email_outbox SET status = 'enviando', tentativas = tentativas + 1, "
+                    "reservado_por = %s, reservado_em = %s WHERE id = %s AND status = 'pendente'",
+                    (self.nome, agora, email_id)
+                )
+                if cursor.rowcount == 1:
+                    reservados.append(email_id)
+            cnx.commit()
+
+            if not reservados:
+                return []
+            in_clause = ', '.join(['%s'] * len(reservados))
+            cursor.execute(
+                f"SELECT id, remetente, destinatario, assunto, corpo_html, tentativas "
+                f"FROM email_outbox WHERE id IN ({in_clause}) ORDER BY id",
+                tuple(reservados)
+            )
+            return cursor.fetchall()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+            pool.checkin(cnx)
+
+    def _renovar_reserva(self, ids):
+        """Renova reservado_em dos e-mails ainda reservados por este worker; retorna os ids deles."""
+        pool = get_pool()
+        cnx = pool.checkout()
+        cursor = cnx.cursor()
+        try:
+            in_clause = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f"UPDATE email_outbox SET reservado_em = %s "
+                f"WHERE id IN ({in_clause}) AND status = 'enviando' AND reservado_por = %s",
+                (datetime.now(), *ids, self.nome)
+            )
+            cursor.execute(
+                f"SELECT id FROM email_outbox WHERE id IN ({in_clause}) AND status = 'enviando' AND reservado_por = %s",
+                (*ids, self.nome)
+            )
+            reservados = {row[0] for row in cursor.fetchall()}
+            cnx.commit()
+            return reservados
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+            pool.checkin(cnx)
+
+    def _registrar(self, emails, erros):
+        pool = get_pool()
+        cnx = pool.checkout()
+        cursor = cnx.cursor()
+        try:
+            agora = datetime.now()
+            for email, erro in zip(emails, erros):
+                if isinstance(erro, ReservaPerdida):
+                    print(f"E-mail {email['id']}: reserva expirada, ficou com outro worker.")
+                    continue
+                if erro is None:
+                    cursor.execute(
+                        "UPDATE email_outbox SET status = 'enviado', enviado_em = %s, reservado_por = NULL, "
+                        "ultimo_erro = NULL WHERE id = %s AND reservado_por = %s",
+                        (agora, email['id'], self.nome)
+                    )
+                elif email['tentativas'] >= OUTBOX_MAX_TENTATIVAS:
+                    cursor.execute(
+                        "UPDATE email_outbox SET status = 'falhou', reservado_por = NULL, ultimo_erro = %s "
+                        "WHERE id = %s AND reservado_por = %s",
+                        (str(erro)[:2000], email['id'], self.nome)
+                    )
+                    print(f"E-mail {email['id']} para {email['destinatario']} falhou definitivamente: {erro}")
+                else:
+                    cursor.execute(
+                        "UPDATE email_outbox SET status = 'pendente', reservado_por = NULL, ultimo_erro = %s, "
+                        "proxima_tentativa = %s WHERE id = %s AND reservado_por = %s",
+                        (str(erro)[:2000], agora + timedelta(seconds=intervalo_nova_tentativa(email['tentativas'])),
+                         email['id'], self.nome)
+                    )
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+            pool.checkin(cnx)
+
+
+# --------------------------------------------------------------------------------
+# CONSULTAS PARA A PÁGINA DE STATUS
+# --------------------------------------------------------------------------------
+def resumo_outbox(cursor, limite=50, status=None):
+    """Contagem por status e os e-mails mais recentes (sem o corpo), opcionalmente de um status."""
+    cursor.execute("SELECT status, COUNT(*) AS total FROM email_outbox GROUP BY status")
+    contagem = {s: 0 for s in STATUS_OUTBOX}
+    contagem.update({row['status']: row['total'] for row in cursor.fetchall()})
+
+    filtro, params = "", ()
+    if status in STATUS_OUTBOX:
+        filtro, params = "WHERE status = %s", (status,)
+    cursor.execute(
+        f"SELECT id, orcamento_id, destinatario, assunto, status, tentativas, proxima_tentativa, "
+        f"enviado_em, ultimo_erro, created_at FROM email_outbox {filtro} ORDER BY id DESC LIMIT %s",
+        params + (limite,)
+    )
+    return contagem, cursor.fetchall()
+
+
+def reenfileirar(cursor, email_id):
+    """Devolve um e-mail 'falhou' para a fila, zerando as tentativas. Retorna True se mudou."""
+    cursor.execute(
+        "UPDATE email_outbox SET status = 'pendente', tentativas = 0, proxima_tentativa = %s "
+        "WHERE id = %s AND status = 'falhou'",
+        (datetime.now(), email_id)
+    )
+    return cursor.rowcount == 1
+
+
+def config_smtp_do_ambiente():
+    """Configuração SMTP a partir do .env (a mesma usada pelo app quando não há e-mail no banco)."""
+    return {
+        'servidor': os.getenv('MAIL_SERVER', 'smtp.gmail.com'),
+        'porta': int(os.getenv('MAIL_PORT', 465)),
+        'ssl': os.getenv('MAIL_USE_SSL', '1').strip().lower() in ('1', 'true', 'yes', 'on'),
+        'usuario': os.getenv('MAIL_USERNAME'),
+        'senha': os.getenv('MAIL_PASSWORD'),
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worker da caixa de saída de e-mails.")
+    parser.add_argument('--uma-vez', action='store_true', help="Esvazia a fila uma vez e sai.")
+    args = parser.parse_args(argv)
+
+    worker = OutboxWorker(config_smtp_do_ambiente)
+    if args.uma_vez:
+        total = 0
+        while True:
+            n = worker.processar_lote()
+            total += n
+            if n < worker.lote:
+                break
+        print(f"{total} e-mail(s) processado(s).")
+        return 0
+
+    worker.iniciar()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.parar(timeout=10)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
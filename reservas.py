@@ -0,0 +1,146 @@
+"""
+Reserva atômica de estoque (produtos) e de kits.
+
+Antes, cada rota lia quantidade_estoque, comparava em Python e depois rodava um UPDATE por
+item. Com duas aprovações ao mesmo tempo, as duas passavam na conferência e o estoque ficava
+negativo. reservar() faz, dentro da transação de quem chama:
+  1. SELECT ... FOR UPDATE das linhas envolvidas, sempre em ordem de id (estoque e depois
+     kits), para que transações concorrentes travem na mesma ordem e não entrem em deadlock;
+  2. a conferência do carrinho inteiro (quantidades do mesmo produto somadas), levantando
+     EstoqueInsuficiente com TODOS os itens em falta. Itens de aluguel e kits são conferidos
+     contra as reservas do período (disponibilidade.py); os demais, contra quantidade_estoque;
+  3. uma única baixa condicional para os produtos consumidos (movimentos.movimentar_estoque,
+     com exigir_saldo: nenhum saldo fica negativo, e a saída vai para o livro). Itens de
+     aluguel e kits não têm baixa: a reserva é a linha em montagem_materiais que quem chama
+     grava na mesma transação, com as linhas do catálogo ainda travadas.
+Kits-modelo (kits.modelo) entram como os seus componentes (quantidade x receita): a
+conferência e a baixa são as dos produtos, e o kit em si só é conferido quanto ao status.
+Em caso de falta nada é alterado; quem chama deve fazer rollback da transação.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from catalogo import TIPO_KIT, TIPO_PRODUTO, componentes_de_modelos
+from disponibilidade import TIPO_ALUGUEL, livre, reservas_no_periodo
+from movimentos import EVENTO, KIT, SaldoInsuficiente, movimentar_estoque
+
+
+class EstoqueInsuficiente(Exception):
+    """
+    Itens sem saldo para a reserva.
+    `faltas`: [{'tipo', 'id', 'nome', 'solicitado', 'disponivel'}] (para kits, disponivel é a situação: 'manutencao', 'reservado no período'...).
+    """
+
+    def __init__(self, faltas):
+        self.faltas = faltas
+        super().__init__(self._mensagem())
+
+    def _mensagem(self):
+        partes = []
+        for falta in self.faltas:
+            nome = falta['nome'] or f"ID {falta['id']}"
+            if falta['tipo'] == TIPO_KIT:
+                partes.append(f"kit '{nome}' não está disponível ({falta['disponivel'] or 'removido'})")
+            else:
+                partes.append(f"'{nome}' (solicitado: {falta['solicitado']}, disponível: {falta['disponivel']})")
+        return "Estoque insuficiente: " + "; ".join(partes) + "."
+
+
+def _somar_por_id(itens, tipo):
+    """Quantidade total pedida por id para um tipo de item; rejeita quantidades não positivas."""
+    total = {}
+    for item in itens:
+        if item.get('tipo', TIPO_PRODUTO) != tipo or item['id'] is None:
+            continue
+        quantidade = Decimal(str(item['quantidade']))
+        if quantidade <= 0:
+            raise ValueError(f"Quantidade inválida para o item {item['id']}: {item['quantidade']}.")
+        total[int(item['id'])] = total.get(int(item['id']), Decimal(0)) + quantidade
+    return dict(sorted(total.items()))
+
+
+def _travar(cursor, sql, ids):
+    """SELECT ... FOR UPDATE das linhas `ids`, em ordem de id; retorna {id: linha}."""
+    if not ids:
+        return {}
+    in_clause = ', '.join(['%s'] * len(ids))
+    cursor.execute(sql.format(**{'in': in_clause}), tuple(ids))
+    return {row['id']: row for row in cursor.fetchall()}
+
+
+def reservar(cursor, itens, inicio=None, fim=None, evento_id=None, kit_id=None):
+    """
+    Reserva os itens de um carrinho ({id, tipo, quantidade}; sem tipo = produto) para o
+    período [inicio, fim] de um evento. Sem período, a saída é definitiva (ex.: peças que
+    passam a compor um kit): itens de aluguel também têm baixa, desde que não faltem peças
+    para as reservas já feitas daqui para frente. `evento_id`/`kit_id` identificam a saída
+    no livro de movimentos (motivo 'evento' ou 'kit').
+    `cursor` precisa ser de dicionário. Levanta EstoqueInsuficiente (sem alterar nada) se
+    algum item não puder ser reservado. Não faz commit.
+    """
+    definitiva = inicio is None
+    if definitiva:
+        inicio, fim = datetime.now(), None
+    produtos = _somar_por_id(itens, TIPO_PRODUTO)
+    pedidos_kits = _somar_por_id(itens, TIPO_KIT)
+    # Kits-modelo viram pedidos dos componentes; os demais kits são uma unidade
+    modelos = componentes_de_modelos(cursor, list(pedidos_kits))
+    for id_kit, receita in modelos.items():
+        for componente in receita:
+            quantidade = pedidos_kits[id_kit] * Decimal(componente['quantidade'])
+            produtos[componente['material_id']] = produtos.get(componente['material_id'], Decimal(0)) + quantidade
+    produtos = dict(sorted(produtos.items()))
+    kits = {i: Decimal(1) for i in pedidos_kits if i not in modelos}
+
+    linhas_estoque = _travar(
+        cursor, "SELECT id, nome, tipo_material, quantidade_estoque FROM estoque WHERE id IN ({in}) ORDER BY id FOR UPDATE", list(produtos))
+    linhas_kits = _travar(
+        cursor, "SELECT id, nome, status, modelo FROM kits WHERE id IN ({in}) ORDER BY id FOR UPDATE", list(pedidos_kits))
+
+    ids_aluguel = [i for i, linha in linhas_estoque.items() if linha['tipo_material'] == TIPO_ALUGUEL]
+    reservado_material, reservado_kit = reservas_no_periodo(cursor, inicio, fim, ids_aluguel, list(kits), travar=True)
+
+    faltas = []
+    # Itens que já não existem no catálogo (ex.: removidos depois do orçamento)
+    for item in itens:
+        if item['id'] is None:
+            faltas.append({'tipo': item.get('tipo', TIPO_PRODUTO), 'id': None, 'nome': item.get('nome'),
+                           'solicitado': item['quantidade'], 'disponivel': 0 if item.get('tipo') != TIPO_KIT else None})
+    for material_id, pedido in produtos.items():
+        linha = linhas_estoque.get(material_id)
+        disponivel = livre(TIPO_PRODUTO, linha['tipo_material'], linha['quantidade_estoque'],
+                           reservado=reservado_material.get(material_id, 0)) if linha else Decimal(0)
+        if pedido > disponivel:
+            faltas.append({'tipo': TIPO_PRODUTO, 'id': material_id, 'nome': linha['nome'] if linha else None,
+                           'solicitado': pedido, 'disponivel': disponivel})
+    for id_kit in modelos:
+        linha = linhas_kits.get(id_kit)
+        if not linha or linha['status'] == 'manutencao':
+            faltas.append({'tipo': TIPO_KIT, 'id': id_kit, 'nome': linha['nome'] if linha else None,
+                           'solicitado': pedidos_kits[id_kit], 'disponivel': linha and 'manutencao'})
+    for id_kit in kits:
+        linha = linhas_kits.get(id_kit)
+        if linha and linha['modelo']:
+            # Kit-modelo sem nenhum componente cadastrado: não há o que reservar
+            faltas.append({'tipo': TIPO_KIT, 'id': id_kit, 'nome': linha['nome'],
+                           'solicitado': pedidos_kits[id_kit], 'disponivel': 'sem componentes'})
+            continue
+        if not linha or livre(TIPO_KIT, status=linha['status'], reservado=reservado_kit.get(id_kit, 0)) < 1:
+            situacao = None if not linha else ('manutencao' if linha['status'] == 'manutencao' else 'reservado no período')
+            faltas.append({'tipo': TIPO_KIT, 'id': id_kit, 'nome': linha['nome'] if linha else None,
+                           'solicitado': kits[id_kit], 'disponivel': situacao})
+    if faltas:
+        raise EstoqueInsuficiente(faltas)
+
+    # Baixa só do que é consumido (e, na saída definitiva, também das peças de aluguel),
+    # numa só instrução condicional e registrada no livro de movimentos
+    baixas = {i: pedido for i, pedido in produtos.items()
+              if definitiva or linhas_estoque[i]['tipo_material'] != TIPO_ALUGUEL}
+    try:
+        movimentar_estoque(cursor, [(i, -pedido) for i, pedido in baixas.items()],
+                           KIT if kit_id is not None else EVENTO, evento_id=evento_id, kit_id=kit_id,
+                           exigir_saldo=True)
+    except SaldoInsuficiente as e:
+        # Não deveria acontecer com as linhas travadas; protege bancos/isolamentos sem FOR UPDATE
+        raise EstoqueInsuficiente([{'tipo': TIPO_PRODUTO, 'id': i, 'nome': linhas_estoque[i]['nome'],
+                                    'solicitado': baixas[i], 'disponivel': '?'} for i in e.material_ids])
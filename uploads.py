@@ -0,0 +1,233 @@
+"""
+Armazenamento das fotos enviadas, endereçado pelo conteúdo.
+
+Cada arquivo é gravado em 'uploads/<subdir>/<h[0:2]>/<h[2:4]>/<h>.<ext>', onde h é o SHA-256
+do conteúdo: a mesma foto enviada para dez produtos ocupa um arquivo só. As referências
+são as próprias colunas estoque.foto_path e kits.foto_path (índices da migração 0010), então
+a contagem nunca diverge do banco:
+  - liberar_upload() apaga um arquivo quando nenhuma linha o referencia mais;
+  - arquivos mais novos que UPLOADS_CARENCIA segundos nunca são apagados, porque podem
+    pertencer a uma transação ainda não confirmada (um reenvio do mesmo conteúdo renova
+    a data do arquivo). Sobras de rollback ficam para a varredura;
+  - varrer_orfaos() (VarredorUploads, periódico, ou a linha de comando) remove arquivos sem
+    referência, variantes sem original e temporários abandonados, e informa quanto espaço
+    foi liberado e quanto a deduplicação economiza.
+
+Uso (linha de comando):
+    python uploads.py             # varre e apaga os órfãos
+    python uploads.py --simular   # só informa
+"""
+import glob
+import hashlib
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from imagens import STATIC_DIR, VARIANTES, caminho_variante, eh_variante
+
+UPLOADS_DIR = os.path.join(STATIC_DIR, 'uploads')
+UPLOADS_CARENCIA = float(os.getenv('UPLOADS_CARENCIA', 3600))                      # Segundos antes de um arquivo poder ser apagado
+UPLOADS_VARREDURA_INTERVALO = float(os.getenv('UPLOADS_VARREDURA_INTERVALO', 6 * 3600))  # Segundos entre varreduras
+
+_BLOCO = 64 * 1024
+
+
+def _absoluto(rel_path):
+    return os.path.join(STATIC_DIR, rel_path.replace("\\", "/"))
+
+
+def salvar_upload(file_storage, subdir, extensao):
+    """
+    Grava o upload pelo hash do conteúdo. Retorna (rel_path, novo); novo=False quando o
+    mesmo conteúdo já estava armazenado (o arquivo existente é reaproveitado).
+    """
+    pasta = os.path.join(UPLOADS_DIR, subdir)
+    os.makedirs(pasta, exist_ok=True)
+    temporario = os.path.join(pasta, f".{uuid.uuid4().hex}.tmp")
+    resumo = hashlib.sha256()
+    try:
+        with open(temporario, 'wb') as destino:
+            while True:
+                bloco = file_storage.stream.read(_BLOCO)
+                if not bloco:
+                    break
+                resumo.update(bloco)
+                destino.write(bloco)
+        h = resumo.hexdigest()
+        rel_path = f"uploads/{subdir}/{h[:2]}/{h[2:4]}/{h}.{extensao}"
+        caminho = _absoluto(rel_path)
+        if os.path.exists(caminho):
+            os.utime(caminho)  # Renova a carência: há um novo uso a caminho
+            return rel_path, False
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        os.replace(temporario, caminho)
+        return rel_path, True
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def referencias(cursor, rel_path):
+    """Quantas linhas de estoque/kits usam o arquivo. `cursor` de dicionário."""
+    cursor.execute(
+        "SELECT (SELECT COUNT(*) FROM estoque WHERE foto_path = %s) + (SELECT COUNT(*) FROM kits WHERE foto_path = %s) AS n",
+        (rel_path, rel_path)
+    )
+    return int(cursor.fetchone()['n'])
+
+
+def _apagar(caminho):
+    """Apaga o arquivo e, se for um original, as variantes dele; retorna os bytes liberados."""
+    apagar = [caminho]
+    if not eh_variante(os.path.basename(caminho)) and not caminho.endswith('.tmp'):
+        rel_path = os.path.relpath(caminho, STATIC_DIR).replace(os.sep, '/')
+        apagar += [c for c in (_absoluto(caminho_variante(rel_path, l)) for l in VARIANTES) if os.path.exists(c)]
+    liberados = 0
+    for arquivo in apagar:
+        liberados += os.path.getsize(arquivo)
+        os.remove(arquivo)
+    return liberados
+
+
+def _original_existe(caminho_da_variante):
+    """'<nome>-<largura>.webp' ainda tem o '<nome>.<ext>' ao lado?"""
+    prefixo = caminho_da_variante.rsplit('-', 1)[0]
+    return any(not eh_variante(os.path.basename(c)) for c in glob.glob(glob.escape(prefixo) + '.*'))
+
+
+def liberar_upload(cursor, rel_path, carencia=UPLOADS_CARENCIA):
+    """
+    Apaga o arquivo se nenhuma linha o referencia e ele é mais velho que a carência.
+    Chamar depois do commit (ou do rollback) de quem deixou de usá-lo. Retorna True se apagou.
+    """
+    if not rel_path:
+        return False
+    caminho = _absoluto(rel_path)
+    try:
+        if not os.path.exists(caminho) or time.time() - os.path.getmtime(caminho) < carencia:
+            return False
+        if referencias(cursor, rel_path):
+            return False
+        _apagar(caminho)
+        return True
+    except OSError as e:
+        print(f"Erro ao remover o arquivo {rel_path}: {e}")
+        return False
+
+
+# --------------------------------------------------------------------------------
+# VARREDURA
+# --------------------------------------------------------------------------------
+def varrer_orfaos(cursor, carencia=UPLOADS_CARENCIA, apagar=True):
+    """
+    Remove de uploads/ os arquivos sem referência no banco, as variantes sem original e os
+    temporários abandonados (todos mais velhos que a carência).
+    Retorna {'arquivos', 'referenciados', 'orfaos', 'bytes_liberados', 'bytes_economizados',
+    'erros'}; bytes_economizados é o que a deduplicação evita guardar (tamanho × usos extras).
+    """
+    cursor.execute("SELECT foto_path FROM estoque WHERE foto_path IS NOT NULL "
+                   "UNION ALL SELECT foto_path FROM kits WHERE foto_path IS NOT NULL")
+    usos = Counter(row['foto_path'].replace("\\", "/") for row in cursor.fetchall())
+
+    relatorio = {'arquivos': 0, 'referenciados': 0, 'orfaos': 0,
+                 'bytes_liberados': 0, 'bytes_economizados': 0, 'erros': 0}
+    limite = time.time() - carencia
+    for pasta, _, arquivos in os.walk(UPLOADS_DIR):
+        for arquivo in arquivos:
+            caminho = os.path.join(pasta, arquivo)
+            rel_path = os.path.relpath(caminho, STATIC_DIR).replace(os.sep, '/')
+            try:
+                if not os.path.exists(caminho):
+                    continue  # Variante já apagada junto com o original nesta varredura
+                if arquivo.endswith('.tmp'):
+                    orfao = True
+                elif eh_variante(arquivo):
+                    orfao = not _original_existe(caminho)
+                else:
+                    relatorio['arquivos'] += 1
+                    orfao = not usos[rel_path]
+                    if not orfao:
+                        relatorio['referenciados'] += 1
+                        relatorio['bytes_economizados'] += os.path.getsize(caminho) * (usos[rel_path] - 1)
+                if not orfao or os.path.getmtime(caminho) > limite:
+                    continue
+                relatorio['orfaos'] += 1
+                if apagar:
+                    relatorio['bytes_liberados'] += _apagar(caminho)
+            except OSError as e:
+                relatorio['erros'] += 1
+                print(f"Erro ao varrer {rel_path}: {e}")
+    return relatorio
+
+
+class VarredorUploads:
+    """Thread que roda varrer_orfaos() a cada `intervalo` segundos (vários processos podem rodá-la)."""
+
+    def __init__(self, intervalo=UPLOADS_VARREDURA_INTERVALO):
+        self.intervalo = intervalo
+        self.ultimo_relatorio = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, name="varredor-uploads", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self, timeout=None):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        from db import get_pool
+
+        while not self._parar.wait(self.intervalo):
+            try:
+                pool = get_pool()
+                cnx = pool.checkout()
+                cursor = cnx.cursor(dictionary=True)
+                try:
+                    self.ultimo_relatorio = varrer_orfaos(cursor)
+                finally:
+                    cursor.close()
+                    cnx.rollback()
+                    pool.checkin(cnx)
+                if self.ultimo_relatorio['orfaos']:
+                    print(f"Varredura de uploads: {self.ultimo_relatorio}")
+            except Exception as e:
+                print(f"Erro na varredura de uploads: {e}")
+
+
+def main(argv=None):
+    import argparse
+
+    from db import get_backend
+
+    parser = argparse.ArgumentParser(description="Remove uploads sem referência no banco.")
+    parser.add_argument('--simular', action='store_true', help="Só informa o que seria apagado.")
+    parser.add_argument('--carencia', type=float, default=UPLOADS_CARENCIA,
+                        help="Segundos de idade mínima para um arquivo ser apagado.")
+    args = parser.parse_args(argv)
+
+    cnx = get_backend().connect()
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        relatorio = varrer_orfaos(cursor, args.carencia, apagar=not args.simular)
+    finally:
+        cursor.close()
+        cnx.close()
+    print(f"{relatorio['arquivos']} arquivos, {relatorio['referenciados']} em uso, "
+          f"{relatorio['orfaos']} órfãos{' (simulação)' if args.simular else ''}; "
+          f"{relatorio['bytes_liberados'] / 1024:.1f} KiB liberados, "
+          f"{relatorio['bytes_economizados'] / 1024:.1f} KiB economizados pela deduplicação.")
+    return 1 if relatorio['erros'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+Verificação dos planos de execução das consultas mais quentes do sistema.
+
+Roda EXPLAIN em cada formato de consulta usado em produção e falha se algum deles
+fizer varredura completa de tabela. Com --semear N, insere N linhas sintéticas
+dentro de uma transação que é desfeita no final (nada é gravado no banco), para
+que o otimizador tenha volume suficiente para escolher os índices.
+
+Uso:
+    python verificar_indices.py              # usa os dados existentes
+    python verificar_indices.py --semear 5000
+    DB_BACKEND=sqlite python verificar_indices.py --semear 5000
+"""
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from db import get_backend
+
+# --------------------------------------------------------------------------------
+# FORMATOS DE CONSULTA (mesmos filtros/ordenações das rotas)
+# --------------------------------------------------------------------------------
+# (nome, sql, parâmetros)
+CONSULTAS = [
+    ("relatorio_eventos: período",
+     """SELECT e.id, e.nome_evento, e.data_evento, e.tipo_evento, e.status, e.valor_total,
+               c.nome as cliente_nome, e.status_pagamento
+        FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.data_evento >= %s AND e.data_evento <= %s
+        ORDER BY e.data_evento DESC""",
+     ('2024-03-01', '2024-03-31')),
+    ("relatorio_eventos: tipo de evento",
+     """SELECT e.id, e.nome_evento, e.data_evento, c.nome as cliente_nome
+        FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.tipo_evento = %s
+        ORDER BY e.data_evento DESC""",
+     ('Casamento',)),
+    ("relatorio_eventos: status de pagamento + período",
+     """SELECT e.id, e.nome_evento, e.data_evento, c.nome as cliente_nome
+        FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.data_evento >= %s AND e.data_evento <= %s AND e.status_pagamento = %s
+        ORDER BY e.data_evento DESC""",
+     ('2024-03-01', '2024-03-31', 'Parcial')),
+    ("relatorio_eventos: estatísticas por status",
+     "SELECT status, COUNT(*) as count FROM eventos e WHERE e.data_evento >= %s AND e.data_evento <= %s GROUP BY status",
+     ('2024-03-01', '2024-03-31')),
+    ("relatorio_eventos: tipos de evento (filtro)",
+     "SELECT DISTINCT tipo_evento FROM eventos WHERE tipo_evento IS NOT NULL ORDER BY tipo_evento",
+     ()),
+    ("fluxo_caixa: período",
+     "SELECT * FROM fluxo_caixa WHERE data >= %s AND data <= %s ORDER BY data DESC, id DESC",
+     ('2024-03-01', '2024-03-31')),
+    ("fluxo_caixa: tipo + período",
+     "SELECT SUM(valor) as total FROM fluxo_caixa WHERE tipo = 'Despesa' AND data >= %s AND data <= %s",
+     ('2024-03-01', '2024-03-31')),
+    ("index / dashboard: resumo",
+     "SELECT chave, valor FROM dashboard_stats WHERE chave IN (%s, %s, %s)",
+     ('total_clientes', 'total_itens_estoque', 'receita:2024-03')),
+    ("estatisticas: receita do mês (recálculo)",
+     "SELECT COALESCE(SUM(valor), 0) AS total FROM fluxo_caixa WHERE tipo = %s AND data >= %s AND data < %s",
+     ('Receita', '2024-03-01', '2024-04-01')),
+    ("index / dashboard: eventos do mês",
+     """SELECT e.nome_evento, e.data_evento, c.nome as cliente_nome, e.status FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.recolhimento_evento >= %s AND e.data_evento < %s ORDER BY e.data_evento""",
+     ('2024-03-01', '2024-04-01')),
+    ("dashboard: feed de atividades",
+     """SELECT id, tipo, id_referencia, descricao, data_log AS data_criacao FROM log_atividades
+        ORDER BY data_log DESC, id DESC LIMIT 11""",
+     ()),
+    ("api_atividades: página seguinte (cursor)",
+     """SELECT id, tipo, id_referencia, descricao, data_log AS data_criacao FROM log_atividades
+        WHERE data_log <= %s AND (data_log < %s OR (data_log = %s AND id < %s))
+        ORDER BY data_log DESC, id DESC LIMIT 11""",
+     ('2024-03-15 12:00:00', '2024-03-15 12:00:00', '2024-03-15 12:00:00', 500)),
+    ("orcamento_eventos: orçamentos mais recentes",
+     """SELECT o.*, c.nome as cliente_nome FROM orcamentos o JOIN clientes c ON o.cliente_id = c.id
+        ORDER BY o.created_at DESC LIMIT 50""",
+     ()),
+    ("ver_orcamento / aprovar_orcamento: itens do orçamento",
+     """SELECT oi.tipo, oi.nome, oi.quantidade, oi.valor_unitario, e.quantidade_estoque, k.status
+        FROM orcamento_itens oi
+        LEFT JOIN estoque e ON e.id = oi.material_id
+        LEFT JOIN kits k ON k.id = oi.kit_id
+        WHERE oi.orcamento_id = %s ORDER BY oi.posicao""",
+     (1,)),
+    ("orcamento_itens: orçamentos pendentes com o material",
+     """SELECT o.id, o.nome_evento FROM orcamento_itens oi JOIN orcamentos o ON o.id = oi.orcamento_id
+        WHERE oi.material_id = %s AND o.status = 'Pendente'""",
+     (1,)),
+    ("disponibilidade: reservas de aluguel/kits no período",
+     """SELECT mm.material_id, mm.kit_id, mm.quantidade, ki.material_id AS componente_id,
+               ki.quantidade AS componente_quantidade, e.data_evento, e.recolhimento_evento
+        FROM eventos e
+        JOIN montagem_materiais mm ON mm.evento_id = e.id
+        LEFT JOIN kits k ON k.id = mm.kit_id AND k.modelo = TRUE
+        LEFT JOIN kit_itens ki ON ki.kit_id = k.id
+        WHERE e.recolhimento_evento >= %s
+          AND (mm.material_id IN (%s, %s) OR ki.material_id IN (%s, %s) OR mm.kit_id IN (%s)) AND e.data_evento <= %s
+          AND e.status NOT IN ('Finalizado', 'Finalização Parcial')""",
+     ('2025-12-01 00:00:00', 1, 2, 1, 2, 1, '2025-12-03 00:00:00')),
+    ("movimentos_estoque: saldo do material na data",
+     """SELECT m.saldo_apos FROM movimentos_estoque m
+        WHERE m.material_id = %s AND m.criado_em <= %s
+        ORDER BY m.criado_em DESC, m.id DESC LIMIT 1""",
+     (1, '2025-12-31 23:59:59')),
+    ("movimentos_estoque: movimentos do material no período",
+     """SELECT id, quantidade, saldo_apos, motivo, evento_id, kit_id, criado_em FROM movimentos_estoque
+        WHERE material_id = %s AND criado_em >= %s AND criado_em <= %s
+        ORDER BY criado_em DESC, id DESC LIMIT 200""",
+     (1, '2025-12-01', '2025-12-31 23:59:59')),
+    ("api/estoque: próxima página",
+     """SELECT id, nome, quantidade_estoque FROM estoque WHERE id < %s ORDER BY id DESC LIMIT 51""",
+     (1000,)),
+    ("api/estoque: próxima página por tipo de material",
+     """SELECT id, nome, quantidade_estoque FROM estoque WHERE id < %s AND tipo_material = %s ORDER BY id DESC LIMIT 51""",
+     (1000, 'aluguel')),
+    ("api/estoque: busca por prefixo do nome",
+     """SELECT id, nome, quantidade_estoque FROM estoque WHERE nome >= %s AND nome LIKE %s ESCAPE '!' ORDER BY id DESC LIMIT 51""",
+     ('mat', 'mat%')),
+    ("controle_eventos: próxima página",
+     """SELECT e.id, e.nome_evento, e.data_evento, c.nome AS cliente_nome FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.data_evento <= %s AND (e.data_evento < %s OR (e.data_evento = %s AND e.id < %s))
+        ORDER BY e.data_evento DESC, e.id DESC LIMIT 51""",
+     ('2024-03-15 00:00:00', '2024-03-15 00:00:00', '2024-03-15 00:00:00', 1000)),
+    ("controle_eventos: página por status",
+     """SELECT e.id, e.nome_evento, e.data_evento, c.nome AS cliente_nome FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.status = %s ORDER BY e.data_evento DESC, e.id DESC LIMIT 51""",
+     ('Confirmado',)),
+    ("controle_eventos: página por cliente e período",
+     """SELECT e.id, e.nome_evento, e.data_evento, c.nome AS cliente_nome FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.cliente_id = %s AND e.data_evento >= %s AND e.data_evento < %s
+        ORDER BY e.data_evento DESC, e.id DESC LIMIT 51""",
+     (1, '2024-01-01', '2025-01-01')),
+    ("api/eventos/feed: eventos que cruzam a janela do calendário",
+     """SELECT e.id, e.nome_evento, e.data_evento, e.recolhimento_evento, e.status, c.nome AS cliente_nome
+        FROM eventos e JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.recolhimento_evento >= %s AND e.data_evento < %s ORDER BY e.data_evento, e.id""",
+     ('2024-02-26 00:00:00', '2024-04-08 00:00:00')),
+    ("controle_eventos: contagem por status",
+     """SELECT e.status, COUNT(*) AS n FROM eventos e WHERE e.status_pagamento = %s GROUP BY e.status""",
+     ('Pendente',)),
+]
+
+
+def planos_com_varredura(cursor, backend='mysql'):
+    """
+    Executa EXPLAIN em cada consulta de CONSULTAS e retorna [(nome, tabela, detalhe)]
+    para cada tabela lida por varredura completa.
+    - MySQL: linhas do EXPLAIN com type = ALL.
+    - SQLite: passos 'SCAN <tabela>' do EXPLAIN QUERY PLAN que não usam índice.
+    """
+    problemas = []
+    for nome, sql, params in CONSULTAS:
+        if backend == 'sqlite':
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            for linha in cursor.fetchall():
+                detalhe = linha['detail']
+                if detalhe.startswith('SCAN ') and 'INDEX' not in detalhe:
+                    problemas.append((nome, detalhe.split()[1], detalhe))
+        else:
+            cursor.execute("EXPLAIN " + sql, params)
+            for linha in cursor.fetchall():
+                if (linha.get('type') or '').upper() == 'ALL':
+                    problemas.append((nome, linha.get('table'), f"~{linha.get('rows')} linhas"))
+    return problemas
+
+
+def semear(cursor, n):
+    """Insere `n` eventos/lançamentos/logs/orçamentos (com um item cada) sintéticos espalhados por ~4 anos, e n/5 materiais."""
+    rnd = random.Random(42)
+    inicio = datetime(2022, 1, 1)
+    tipos_evento = ['Casamento', 'Aniversário', 'Corporativo', 'Formatura', 'Batizado']
+
+    n_clientes = max(50, n // 20)
+    cursor.executemany(
+        "INSERT INTO clientes (nome, email, cpf) VALUES (%s, %s, %s)",
+        [(f"Cliente Semente {i}", f"semente{i}-{uuid4().hex[:8]}@exemplo.com", f"{rnd.randrange(10**10, 10**11)}")
+         for i in range(n_clientes)]
+    )
+    cursor.execute("SELECT id FROM clientes")
+    cliente_ids = [row['id'] for row in cursor.fetchall()]
+
+    def quando():
+        return inicio + timedelta(days=rnd.randrange(0, 4 * 365), hours=rnd.randrange(8, 22))
+
+    cursor.executemany(
+        "INSERT INTO eventos (cliente_id, nome_evento, tipo_evento, data_evento, valor_total, status, status_pagamento) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        [(rnd.choice(cliente_ids), f"Evento {i}", rnd.choice(tipos_evento), quando(), rnd.randrange(500, 20000),
+          rnd.choice(['Confirmado', 'Finalizado', 'Pendente']), rnd.choice(['Pendente', 'Parcial', 'Total']))
+         for i in range(n)]
+    )
+    cursor.executemany(
+        "INSERT INTO fluxo_caixa (data, descricao, tipo, valor) VALUES (%s, %s, %s, %s)",
+        [(quando().date(), f"Lançamento {i}", rnd.choice(['Receita', 'Despesa']), rnd.randrange(10, 5000))
+         for i in range(n)]
+    )
+    cursor.executemany(
+        "INSERT INTO log_atividades (tipo, id_referencia, descricao, data_log) VALUES (%s, %s, %s, %s)",
+        [(rnd.choice(['MUDANCA_STATUS_EVENTO', 'EXCLUSAO', 'CADASTRO_PRODUTO']), i, f"Log {i}", quando())
+         for i in range(n)]
+    )
+    cursor.executemany(
+        "INSERT INTO orcamentos (cliente_id, nome_evento, data_evento, valor_total, itens_json, token, created_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        [(rnd.choice(cliente_ids), f"Orçamento {i}", quando(), rnd.randrange(500, 20000), json.dumps([]), str(uuid4()), quando())
+         for i in range(n)]
+    )
+    cursor.execute("INSERT INTO estoque (nome, tipo_material, unidade_medida, quantidade_estoque, preco_compra, preco_repasse) "
+                   "VALUES (%s, 'aluguel', 'unidade', 100, 10, 5)", (f"Material Semente {uuid4().hex[:8]}",))
+    material_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO estoque (nome, tipo_material, unidade_medida, quantidade_estoque, preco_compra, preco_repasse) "
+        "VALUES (%s, %s, %s, %s, 10, 5)",
+        [(f"material semente {i} {uuid4().hex[:8]}", rnd.choice(['descartavel', 'aluguel', 'venda']),
+          rnd.choice(['unidade', 'caixa', 'pacote']), rnd.randrange(0, 500)) for i in range(max(50, n // 5))]
+    )
+    cursor.execute("SELECT id FROM orcamentos o WHERE NOT EXISTS (SELECT 1 FROM orcamento_itens oi WHERE oi.orcamento_id = o.id)")
+    cursor.executemany(
+        "INSERT INTO orcamento_itens (orcamento_id, posicao, tipo, material_id, nome, quantidade, valor_unitario) "
+        "VALUES (%s, 0, 'produto', %s, 'Material Semente', %s, 5)",
+        [(row['id'], material_id, rnd.randrange(1, 20)) for row in cursor.fetchall()]
+    )
+    # Sem ANALYZE TABLE aqui: ele faz commit implícito e gravaria as linhas semeadas.
+    # As estimativas de faixa do InnoDB (index dives) já enxergam as linhas da transação.
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Confere com EXPLAIN se as consultas quentes usam índices.")
+    parser.add_argument('--semear', type=int, default=0, metavar='N',
+                        help="Insere N linhas sintéticas numa transação desfeita ao final.")
+    args = parser.parse_args(argv)
+
+    backend = get_backend()
+    cnx = backend.connect()
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        if args.semear:
+            semear(cursor, args.semear)
+        problemas = planos_com_varredura(cursor, backend.nome)
+    finally:
+        cnx.rollback()  # Nunca grava os dados semeados
+        cursor.close()
+        cnx.close()
+
+    for nome, tabela, detalhe in problemas:
+        print(f"VARREDURA COMPLETA: {nome} -> tabela '{tabela}' ({detalhe})")
+    if problemas:
+        return 1
+    print(f"OK: {len(CONSULTAS)} consultas usam índices.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Verificação de concorrência da reserva de estoque (reservas.py).
+
+Cria um produto com estoque S e N orçamentos pendentes para o mesmo período que pedem Q
+unidades cada, e aprova todos ao mesmo tempo a partir de T threads (cada uma com o seu cliente HTTP de
+teste, como navegadores diferentes abrindo o link do e-mail). Também dispara cada link
+duas vezes, para conferir que o mesmo orçamento não é aprovado em dobro. No final confere:
+  - aprovados == min(N, S // Q) e nenhum orçamento gerou mais de um evento;
+  - livre no período == S - aprovados * Q (nunca negativo). Para itens de aluguel (padrão)
+    o estoque não baixa e o que conta são as reservas do período; com --tipo-material
+    descartavel, conta a baixa em quantidade_estoque.
+
+Por padrão roda num banco SQLite temporário (criado e apagado aqui). Com
+--banco-configurado usa o banco do .env (DB_BACKEND etc.); os dados criados são
+removidos ao final.
+
+Uso:
+    python verificar_reservas.py
+    python verificar_reservas.py --orcamentos 60 --estoque 100 --quantidade 3 --threads 16
+    python verificar_reservas.py --banco-configurado
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+from uuid import uuid4
+
+from disponibilidade import disponibilidade_carrinho
+
+
+PERIODO = ('2030-01-01 18:00:00', '2030-01-02 10:00:00')
+
+
+def semear(cursor, orcamentos, estoque, quantidade, tipo_material):
+    """Cliente, produto e orçamentos pendentes (com itens em orcamento_itens); retorna (material_id, cliente_id, tokens)."""
+    marca = uuid4().hex[:8]
+    cursor.execute("INSERT INTO clientes (nome, email, cpf) VALUES (%s, %s, %s)",
+                   (f"Cliente Reserva {marca}", f"reserva-{marca}@exemplo.com", str(uuid4().int)[:11]))
+    cliente_id = cursor.lastrowid
+    cursor.execute("INSERT INTO estoque (nome, tipo_material, unidade_medida, quantidade_estoque, preco_compra, preco_repasse) "
+                   "VALUES (%s, %s, 'unidade', %s, 10, 5)", (f"Material Reserva {marca}", tipo_material, estoque))
+    material_id = cursor.lastrowid
+
+    tokens = []
+    for i in range(orcamentos):
+        token = str(uuid4())
+        cursor.execute(
+            "INSERT INTO orcamentos (cliente_id, nome_evento, data_evento, recolhimento_evento, valor_total, itens_json, token) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (cliente_id, f"Reserva {marca} {i}", PERIODO[0], PERIODO[1], quantidade * 5, f'[{{"id": {material_id}, "tipo": "produto", "quantidade": {quantidade}}}]', token)
+        )
+        cursor.execute(
+            "INSERT INTO orcamento_itens (orcamento_id, posicao, tipo, material_id, nome, quantidade, valor_unitario) "
+            "VALUES (%s, 0, 'produto', %s, %s, %s, 5)",
+            (cursor.lastrowid, material_id, f"Material Reserva {marca}", quantidade)
+        )
+        tokens.append(token)
+    return material_id, cliente_id, tokens
+
+
+def aprovar_em_paralelo(app, tokens, threads):
+    """Dispara GET /aprovar_orcamento/<token> (cada token duas vezes) a partir de `threads` threads."""
+    fila = [t for t in tokens for _ in range(2)]
+    lock = threading.Lock()
+    erros = []
+
+    def trabalhar():
+        cliente = app.test_client()
+        while True:
+            with lock:
+                if not fila:
+                    return
+                token = fila.pop()
+            try:
+                resposta = cliente.get(f"/aprovar_orcamento/{token}")
+                if resposta.status_code >= 500:
+                    erros.append(f"{token}: HTTP {resposta.status_code}")
+            except Exception as e:
+                erros.append(f"{token}: {e}")
+
+    trabalhadores = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    return erros
+
+
+def conferir(cursor, material_id, tokens, estoque, quantidade):
+    """Lista de problemas encontrados (vazia se a reserva se comportou)."""
+    in_clause = ', '.join(['%s'] * len(tokens))
+    cursor.execute(f"SELECT id, status FROM orcamentos WHERE token IN ({in_clause})", tuple(tokens))
+    orcamentos = cursor.fetchall()
+    ids = [o['id'] for o in orcamentos]
+    aprovados = sum(1 for o in orcamentos if str(o['status']).lower() == 'aprovado')
+
+    cursor.execute(f"SELECT orcamento_id, COUNT(*) AS n FROM eventos WHERE orcamento_id IN ({', '.join(['%s'] * len(ids))}) "
+                   "GROUP BY orcamento_id", tuple(ids))
+    eventos = {row['orcamento_id']: row['n'] for row in cursor.fetchall()}
+    item, = disponibilidade_carrinho(cursor, [{'id': material_id, 'tipo': 'produto', 'quantidade': quantidade}], *PERIODO)
+    saldo = item['livre']
+
+    esperado = min(len(tokens), estoque // quantidade)
+    problemas = []
+    if aprovados != esperado:
+        problemas.append(f"{aprovados} orçamentos aprovados; esperado {esperado}")
+    if sum(eventos.values()) != aprovados or any(n > 1 for n in eventos.values()):
+        problemas.append(f"{sum(eventos.values())} eventos para {aprovados} aprovações (algum orçamento virou mais de um evento)")
+    if saldo != estoque - aprovados * quantidade:
+        problemas.append(f"livre no período {saldo}; esperado {estoque - aprovados * quantidade}")
+    cursor.execute("SELECT quantidade_estoque FROM estoque WHERE id = %s", (material_id,))
+    if Decimal(cursor.fetchone()['quantidade_estoque']) < 0:
+        problemas.append("estoque negativo")
+    print(f"{len(tokens)} orçamentos, {aprovados} aprovados, {sum(eventos.values())} eventos, livre no período {saldo}")
+    return problemas
+
+
+def limpar(cursor, material_id, cliente_id):
+    cursor.execute("DELETE FROM eventos WHERE cliente_id = %s", (cliente_id,))
+    cursor.execute("DELETE FROM orcamentos WHERE cliente_id = %s", (cliente_id,))
+    cursor.execute("DELETE FROM estoque WHERE id = %s", (material_id,))
+    cursor.execute("DELETE FROM clientes WHERE id = %s", (cliente_id,))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Aprova orçamentos concorrentes e confere que o estoque não fica negativo.")
+    parser.add_argument('--orcamentos', type=int, default=40, help="Orçamentos pendentes criados.")
+    parser.add_argument('--estoque', type=int, default=50, help="Estoque inicial do produto.")
+    parser.add_argument('--quantidade', type=int, default=3, help="Unidades pedidas por orçamento.")
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--tipo-material', default='aluguel', choices=['aluguel', 'descartavel', 'venda'])
+    parser.add_argument('--banco-configurado', action='store_true',
+                        help="Usa o banco do .env em vez de um SQLite temporário.")
+    args = parser.parse_args(argv)
+
+    temporario = None
+    if not args.banco_configurado:
+        temporario = tempfile.mkdtemp(prefix='reservas-')
+        os.environ['DB_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(temporario, 'reservas.sqlite3')
+    os.environ['OUTBOX_WORKER'] = '0'
+
+    # Importado aqui: o app lê DB_BACKEND/SQLITE_PATH e aplica as migrações na importação
+    from app import app
+    from db import get_backend
+
+    backend = get_backend()
+    cnx = backend.connect()
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        material_id, cliente_id, tokens = semear(cursor, args.orcamentos, args.estoque, args.quantidade, args.tipo_material)
+        cnx.commit()
+
+        erros = aprovar_em_paralelo(app, tokens, args.threads)
+        cnx.commit()  # Encerra a transação de leitura para enxergar o que as threads gravaram
+        problemas = conferir(cursor, material_id, tokens, args.estoque, args.quantidade) + erros
+
+        if args.banco_configurado:
+            limpar(cursor, material_id, cliente_id)
+            cnx.commit()
+    finally:
+        cursor.close()
+        cnx.close()
+        if temporario:
+            shutil.rmtree(temporario, ignore_errors=True)
+
+    for problema in problemas:
+        print(f"FALHA: {problema}")
+    if problemas:
+        return 1
+    print("OK: nenhuma reserva além do estoque.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())